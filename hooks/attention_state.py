@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Attention State for Claude Code memory
+Splits attention into a shared, slowly decaying global baseline and one
+overlay per session, so concurrent sessions stop decaying each other's
+HOT files.
+
+  - baseline  ~/.claude/attn_state.json (same format as before)
+              decays by wall-clock time (half-life BASELINE_HALF_LIFE);
+              accesses raise it to at most BASELINE_BOOST, so another
+              session's work can make a file WARM for you, never HOT
+  - overlays  ~/.claude/attn_sessions/<session_id>.json
+              created lazily on a session's first prompt/tool call; decay
+              15% per prompt of *that* session (memory_search.DECAY_RATE)
+              and are removed by session_end.py (stale ones after
+              OVERLAY_MAX_AGE)
+
+A session sees max(overlay, baseline) per file. Hooks without a session id
+keep using the baseline alone, exactly as before.
+
+Saves go through state_store.py: what a hook changed (its decay and its
+boosts, tracked on the loaded dict) is merged into the file under its
+lock, so concurrent hooks never overwrite each other's updates.
+
+Not a hook itself — imported by memory_search.py, post_tool_use.py,
+precompact_save.py, session_start.py and session_end.py.
+"""
+import os
+import re
+import shutil
+import time
+
+import state_store
+
+ATTN_STATE = os.path.join(os.path.expanduser("~"), ".claude", "attn_state.json")
+ATTN_SESSIONS_DIR = os.path.join(os.path.expanduser("~"), ".claude", "attn_sessions")
+
+# Baseline halves every 6 hours of wall-clock time
+BASELINE_HALF_LIFE = 6 * 3600
+# Highest score an access writes into the baseline (WARM, below HOT)
+BASELINE_BOOST = 0.5
+# Overlays of sessions that never reached session_end are dropped after this
+OVERLAY_MAX_AGE = 2 * 86400
+# Scores below this are evicted
+MIN_SCORE = 0.01
+
+
+def _load(path):
+    state = state_store.load(path)
+    if isinstance(state, dict) and isinstance(state.get("scores"), dict):
+        return state
+    return {"scores": {}, "last_update": 0}
+
+
+def overlay_path(session_id, sessions_dir=None):
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", session_id)[:80]
+    return os.path.join(sessions_dir or ATTN_SESSIONS_DIR, f"{safe}.json")
+
+
+def load_baseline(path=None, now=None):
+    """Global baseline, decayed to `now` (pure function of time — nothing is written)."""
+    now = now or time.time()
+    state = _load(path or ATTN_STATE)
+    last = state.get("last_update") or now
+    factor = 0.5 ** (max(0.0, now - last) / BASELINE_HALF_LIFE)
+    if factor < 1.0:
+        for key in list(state["scores"]):
+            score = state["scores"][key].get("score", 0.0) * factor
+            if score < MIN_SCORE:
+                del state["scores"][key]
+            else:
+                state["scores"][key]["score"] = round(score, 4)
+    state["last_update"] = now
+    return state
+
+
+def save_baseline(state, path=None):
+    """Merge this process's boosts into the baseline (decayed to its own clock)."""
+    state.pop("dirty", None)
+    state_store.update(path or ATTN_STATE, "attention", half_life=BASELINE_HALF_LIFE,
+                       boosts=state.pop("boosts", {}), now=state.get("last_update"))
+
+
+def load_overlay(session_id, sessions_dir=None):
+    return _load(overlay_path(session_id, sessions_dir))
+
+
+def save_overlay(session_id, state, sessions_dir=None):
+    """Merge the overlay's pending decay and boosts into the session's file.
+
+    An overlay whose changes were not tracked (no "decay"/"boosts" keys) is
+    merged whole: every score can only raise the stored one.
+    """
+    if "decay" in state or "boosts" in state:
+        decay, boosts = state.pop("decay", None), state.pop("boosts", {})
+    else:
+        decay, boosts = None, state.get("scores", {})
+    state_store.update(overlay_path(session_id, sessions_dir), "attention",
+                       decay=decay, boosts=boosts, now=time.time())
+
+
+def merged(baseline, overlay):
+    """The session's view: per key, whichever of overlay/baseline is higher."""
+    scores = {k: dict(v) for k, v in baseline.get("scores", {}).items()}
+    for key, entry in overlay.get("scores", {}).items():
+        if entry.get("score", 0.0) >= scores.get(key, {}).get("score", 0.0):
+            scores[key] = dict(entry)
+    return {"scores": scores, "last_update": overlay.get("last_update", 0)}
+
+
+def boost(baseline, overlay, key, score, now):
+    """Record an access: full score in the overlay, capped contribution to the baseline."""
+    entry = {"score": score, "last_access": now}
+    overlay.setdefault("scores", {})[key] = entry
+    overlay.setdefault("boosts", {})[key] = dict(entry)
+    capped = min(score, BASELINE_BOOST)
+    if baseline.setdefault("scores", {}).get(key, {}).get("score", 0.0) < capped:
+        baseline["scores"][key] = {"score": capped, "last_access": now}
+        baseline.setdefault("boosts", {})[key] = {"score": capped, "last_access": now}
+        baseline["dirty"] = True
+
+
+def load_view(session_id, path=None, sessions_dir=None):
+    """Read-only merged view for a session (baseline alone without a session id)."""
+    baseline = load_baseline(path)
+    if not session_id:
+        return baseline
+    return merged(baseline, load_overlay(session_id, sessions_dir))
+
+
+def gc_overlays(session_id=None, sessions_dir=None, max_age=None, now=None):
+    """Delete this session's overlay and any overlay idle for max_age. Returns count."""
+    sessions_dir = sessions_dir or ATTN_SESSIONS_DIR
+    max_age = OVERLAY_MAX_AGE if max_age is None else max_age
+    now = now or time.time()
+    own = overlay_path(session_id, sessions_dir) if session_id else None
+    removed = 0
+    try:
+        names = os.listdir(sessions_dir)
+    except OSError:
+        return 0
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(sessions_dir, name)
+        try:
+            if path == own or now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                removed += 1
+            else:
+                continue
+        except OSError:
+            continue
+        # The overlay's lock sidecar and any leftover journal go with it
+        try:
+            os.remove(path + ".lock")
+        except OSError:
+            pass
+        shutil.rmtree(state_store.journal_dir(path), ignore_errors=True)
+    return removed
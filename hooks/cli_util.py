@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+CLI helpers for the memory tools
+Option parsing and summary statistics shared by the command-line tools
+(hook_loadtest.py, hook_replay.py, hook_profile.py, hook_metrics.py,
+memory_sync.py, session_history.py), so none of them has to import another
+tool for them.
+
+Not a hook itself — imported by the tools' main() functions.
+"""
+
+
+def percentile(values, p):
+    """Nearest-rank percentile (0.0 for no values)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def flag(args, name, default=None, cast=None):
+    """Value after `name` in a CLI argument list (both removed from it), else default."""
+    if name in args:
+        i = args.index(name)
+        if i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return cast(value) if cast else value
+    return default
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Co-Activation Graph for Claude Code memory
+Compiles coactivation_pairs.json into a compact CSR adjacency structure with
+integer file ids, and precomputes a k-step spreading-activation vector for
+every node.
+
+  - edge weight   w(a, b) = min(2, log2(count + 1))   (same as the old one-hop boost)
+  - hop 1         act(v)  = w(src, v)
+  - hop k+1       act(v) += HOP_DECAY * sum_u act_k(u) * w(u, v) / W(u)
+                  (W(u) = total edge weight of u, so busy hubs don't flood)
+  - per source    top SPREAD_TOP_K neighbours, total capped at MAX_BOOST
+
+Nodes are memory topic files only (MEMORY_DIR/*.md, not MEMORY.md): pairs
+with a repo file still count in coactivation_pairs.json but add no node.
+
+post_tool_use.py only records pairs and queues the memory files they touch
+in coactivation_graph.json.dirty; the Stop and SessionEnd hooks call
+rebuild_if_dirty(), which recompiles the graph once and recomputes only
+sources within SPREAD_STEPS hops of the queued files. At query time
+memory_search.py sums a handful of precomputed vectors — so
+related-but-unmentioned memories surface through multi-hop links, and no
+pair keys are rebuilt per candidate.
+
+Usage (full rebuild from coactivation_pairs.json):
+    python coactivation_graph.py
+"""
+import math
+import os
+import sys
+import time
+
+import state_codec
+import state_store
+
+COACTIVATION_LOG = os.path.join(os.path.expanduser("~"), ".claude", "coactivation_pairs.json")
+COACTIVATION_GRAPH = os.path.join(os.path.expanduser("~"), ".claude", "coactivation_graph.json")
+# UPDATE for your username (same pattern as memory_search.py)
+MEMORY_DIR = os.path.join(os.path.expanduser("~"), ".claude", "projects", "C--Users-yourname", "memory")
+
+GRAPH_VERSION = 1
+
+# Spreading activation parameters
+SPREAD_STEPS = 3
+HOP_DECAY = 0.5
+SPREAD_TOP_K = 32
+MIN_ACTIVATION = 0.05
+# Cap per source, matching the old one-hop boost ceiling
+MAX_BOOST = 2.0
+# Longest a rebuild waits for another one to finish before leaving it the work
+REBUILD_LOCK_TIMEOUT = 1.0
+
+
+def edge_weight(count):
+    return min(MAX_BOOST, math.log2(count + 1)) if count > 0 else 0.0
+
+
+def is_memory_node(name, memory_dir):
+    """True for a topic file directly in memory_dir (MEMORY.md itself excluded)."""
+    path = os.path.normpath(name)
+    return (path.endswith(".md") and os.path.basename(path) != "MEMORY.md"
+            and os.path.normcase(os.path.dirname(path)) == os.path.normcase(os.path.normpath(str(memory_dir))))
+
+
+def compile_csr(pairs, memory_dir=None):
+    """Build (nodes, indptr, indices, weights) from the "a||b" pair map.
+
+    With memory_dir, only pairs of two memory topic files become edges.
+    """
+    adjacency = {}
+    for key, info in pairs.items():
+        a, sep, b = key.partition("||")
+        w = edge_weight(info.get("count", 0))
+        if not sep or not a or not b or a == b or w <= 0:
+            continue
+        if memory_dir is not None and not (is_memory_node(a, memory_dir) and is_memory_node(b, memory_dir)):
+            continue
+        adjacency.setdefault(a, {})[b] = w
+        adjacency.setdefault(b, {})[a] = w
+
+    nodes = sorted(adjacency)
+    ids = {name: i for i, name in enumerate(nodes)}
+    indptr = [0]
+    indices = []
+    weights = []
+    for name in nodes:
+        for other, w in sorted(adjacency[name].items(), key=lambda kv: ids[kv[0]]):
+            indices.append(ids[other])
+            weights.append(round(w, 4))
+        indptr.append(len(indices))
+    return nodes, indptr, indices, weights
+
+
+def spread_from(src, indptr, indices, weights):
+    """k-step spreading activation from one node. Returns [(node_id, activation)]."""
+    def row(u):
+        return range(indptr[u], indptr[u + 1])
+
+    act = {}
+    frontier = {}
+    for j in row(src):
+        frontier[indices[j]] = weights[j]
+    for step in range(SPREAD_STEPS):
+        for v, a in frontier.items():
+            if v != src:
+                act[v] = act.get(v, 0.0) + a
+        if step == SPREAD_STEPS - 1:
+            break
+        nxt = {}
+        for u, a in frontier.items():
+            total = sum(weights[j] for j in row(u))
+            if total <= 0:
+                continue
+            for j in row(u):
+                v = indices[j]
+                nxt[v] = nxt.get(v, 0.0) + HOP_DECAY * a * weights[j] / total
+        frontier = {v: a for v, a in nxt.items() if a >= MIN_ACTIVATION / 4}
+
+    ranked = sorted(((v, min(MAX_BOOST, a)) for v, a in act.items() if a >= MIN_ACTIVATION),
+                    key=lambda x: (-x[1], x[0]))
+    return [(v, round(a, 4)) for v, a in ranked[:SPREAD_TOP_K]]
+
+
+def _within_hops(start_ids, indptr, indices, hops):
+    seen = set(start_ids)
+    frontier = set(start_ids)
+    for _ in range(hops):
+        nxt = set()
+        for u in frontier:
+            for j in range(indptr[u], indptr[u + 1]):
+                if indices[j] not in seen:
+                    nxt.add(indices[j])
+        seen |= nxt
+        frontier = nxt
+    return seen
+
+
+def load_graph(path=None):
+    graph = state_codec.load(path or COACTIVATION_GRAPH)
+    if isinstance(graph, dict) and graph.get("version") == GRAPH_VERSION:
+        return graph
+    return None
+
+
+def save_graph(graph, path=None):
+    state_codec.save(path or COACTIVATION_GRAPH, graph)
+
+
+def update_graph(pairs, touched=None, path=None, memory_dir=None):
+    """Recompile the CSR arrays and refresh spread vectors near the touched files.
+
+    touched=None recomputes every vector (full rebuild). Vectors of untouched
+    sources are carried over from the previous graph, remapped to the new ids.
+    """
+    nodes, indptr, indices, weights = compile_csr(pairs, memory_dir)
+    ids = {name: i for i, name in enumerate(nodes)}
+    old = load_graph(path) if touched is not None else None
+
+    if old is None:
+        affected = set(range(len(nodes)))
+    else:
+        start = [ids[name] for name in touched if name in ids]
+        affected = _within_hops(start, indptr, indices, SPREAD_STEPS)
+        old_ids = {name: i for i, name in enumerate(old["nodes"])}
+
+    spread_indptr = [0]
+    spread_indices = []
+    spread_values = []
+    for i, name in enumerate(nodes):
+        vector = None
+        if i not in affected and name in old_ids:
+            o = old_ids[name]
+            lo, hi = old["spread_indptr"][o], old["spread_indptr"][o + 1]
+            vector = []
+            for k in range(lo, hi):
+                other = old["nodes"][old["spread_indices"][k]]
+                if other in ids:
+                    vector.append((ids[other], old["spread_values"][k]))
+        if vector is None:
+            vector = spread_from(i, indptr, indices, weights)
+        for v, a in vector:
+            spread_indices.append(v)
+            spread_values.append(a)
+        spread_indptr.append(len(spread_indices))
+
+    graph = {
+        "version": GRAPH_VERSION,
+        "nodes": nodes,
+        "indptr": indptr,
+        "indices": indices,
+        "weights": weights,
+        "spread_indptr": spread_indptr,
+        "spread_indices": spread_indices,
+        "spread_values": spread_values,
+    }
+    save_graph(graph, path)
+    return graph
+
+
+def pair_neighbours(pairs, name, memory_dir):
+    """{memory topic file: edge weight} of the files paired with `name` in the raw pair map.
+
+    Seeds the spread for a repo file, which is never a graph node itself.
+    """
+    neighbours = {}
+    for key, info in pairs.items():
+        a, sep, b = key.partition("||")
+        other = b if a == name else a if b == name else None
+        if not sep or other is None or not is_memory_node(other, memory_dir):
+            continue
+        w = edge_weight(info.get("count", 0))
+        if w > 0:
+            neighbours[other] = max(neighbours.get(other, 0.0), w)
+    return neighbours
+
+
+def rebase(name, old_dir, new_dir):
+    """Map a path under another machine's memory dir onto new_dir; other paths pass through."""
+    old_dir = (old_dir or "").rstrip("/\\")
+    if not old_dir or not name.startswith(old_dir) or name[len(old_dir):len(old_dir) + 1] not in ("/", "\\"):
+        return name
+    return os.path.join(new_dir, *name[len(old_dir) + 1:].replace("\\", "/").split("/"))
+
+
+def rebase_pairs(pairs, old_dir, new_dir):
+    """The "a||b" pair map with both ends rebased from old_dir to new_dir."""
+    if not isinstance(pairs, dict) or not old_dir or old_dir == new_dir:
+        return pairs
+    rebased = {}
+    for key, info in pairs.items():
+        a, sep, b = key.partition("||")
+        rebased[f"{rebase(a, old_dir, new_dir)}||{rebase(b, old_dir, new_dir)}" if sep else key] = info
+    return rebased
+
+
+def rebase_graph(graph, old_dir, new_dir):
+    """Rename the graph's nodes from old_dir to new_dir. Ids, and so every array, stay valid."""
+    if isinstance(graph, dict) and old_dir and old_dir != new_dir:
+        graph["nodes"] = [rebase(name, old_dir, new_dir) for name in graph.get("nodes", [])]
+    return graph
+
+
+def dirty_path(path=None):
+    return (path or COACTIVATION_GRAPH) + ".dirty"
+
+
+def mark_dirty(touched, now=None, path=None):
+    """Queue files whose spread vectors are stale; the next rebuild_if_dirty() refreshes them."""
+    now = now or time.time()
+    state_store.update(dirty_path(path), "keep_max", values={name: now for name in touched})
+
+
+def rebuild_if_dirty(path=None, pairs_path=None, memory_dir=None):
+    """Fold the queued files into the graph. Returns the new graph, or None if nothing was done.
+
+    One rebuild at a time: if another is running, the queue is left for the next call.
+    """
+    path = path or COACTIVATION_GRAPH
+    if not state_store.load(dirty_path(path), {}):
+        return None
+    with state_store.locked(path, REBUILD_LOCK_TIMEOUT) as held:
+        if not held:
+            return None
+        queued = state_store.load(dirty_path(path), {})
+        if not queued:
+            return None
+        pairs = state_store.load(pairs_path or COACTIVATION_LOG, {})
+        if not isinstance(pairs, dict):
+            return None
+        graph = update_graph(pairs, set(queued), path, MEMORY_DIR if memory_dir is None else memory_dir)
+        # Entries queued meanwhile have newer timestamps and stay
+        state_store.update(dirty_path(path), "drop_seen", values=queued)
+    return graph
+
+
+def spread_boosts(graph, sources):
+    """Sum the precomputed activation vectors of `sources`: {node name: boost}."""
+    ids = graph.get("_ids")
+    if ids is None:
+        ids = graph["_ids"] = {name: i for i, name in enumerate(graph["nodes"])}
+    nodes = graph["nodes"]
+    boosts = {}
+    for name in sources:
+        i = ids.get(name)
+        if i is None:
+            continue
+        for k in range(graph["spread_indptr"][i], graph["spread_indptr"][i + 1]):
+            other = nodes[graph["spread_indices"][k]]
+            boosts[other] = boosts.get(other, 0.0) + graph["spread_values"][k]
+    return boosts
+
+
+def main():
+    pairs = state_codec.load(COACTIVATION_LOG, {})
+    graph = update_graph(pairs, memory_dir=MEMORY_DIR)
+    print(f"[coactivation-graph] {len(graph['nodes'])} nodes, {len(graph['indices']) // 2} edges")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
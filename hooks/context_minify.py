@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Context Minifier for injected memories
+Output-stage transformer used by memory_search.py and subagent_start.py
+just before topic files are written to stdout.
+
+Per file (cached by content hash, so the prompt path is a dict lookup):
+  - frontmatter reduced to the fields the model uses (description)
+  - trailing whitespace stripped, blank-line runs collapsed
+  - decorative markdown dropped (horizontal rules, closing #'s on headings);
+    a ===/--- line right under text is a setext heading underline and kept
+  - fenced code blocks left byte-for-byte intact
+
+Per injection (files injected together in one hook run):
+  - lines already emitted by an earlier file are replaced by a
+    back-reference, e.g. "[3 lines same as: Deploy Runbook]" — never
+    inside fenced code, where the line itself is what gets copied
+
+Not a hook itself — imported by the search hooks.
+"""
+import hashlib
+import os
+import re
+
+import state_codec
+
+try:
+    from memory_summaries import split_frontmatter
+except ImportError:
+    split_frontmatter = None
+
+MINIFY_CACHE = os.path.join(os.path.expanduser("~"), ".claude", "memory_minified.json")
+
+CACHE_VERSION = 2
+# Max cached bodies — oldest entries are dropped first
+MAX_CACHE_ENTRIES = 500
+
+# Frontmatter fields kept in the injected text (name is already in the header line)
+KEEP_FRONTMATTER = ("description",)
+
+# Lines shorter than this are never replaced by a back-reference
+# (short headings like "## Setup" legitimately repeat across files)
+MIN_DEDUP_LINE = 24
+
+DECORATIVE_LINE = re.compile(r"^\s*(?:[-*_]\s*){3,}$|^\s*=+\s*$")
+# Underline of a setext heading when it directly follows a text line
+SETEXT_UNDERLINE = re.compile(r"^ {0,3}(?:=+|-+)\s*$")
+HEADING_CLOSER = re.compile(r"^(#{1,6}\s.*?)\s+#+\s*$")
+
+
+def body_hash(text):
+    return hashlib.md5(text.encode("utf-8", errors="replace")).hexdigest()
+
+
+def minify_text(text):
+    """Single-file minification (no cross-file state)."""
+    meta = {}
+    if split_frontmatter is not None:
+        meta, text = split_frontmatter(text)
+
+    out = []
+    if meta:
+        for key in KEEP_FRONTMATTER:
+            if meta.get(key):
+                out.append(f"{key}: {meta[key]}")
+
+    in_code = False
+    blank = False
+    # Previous body line was paragraph text (a setext underline may follow)
+    after_text = False
+    for raw in text.split("\n"):
+        if raw.lstrip().startswith("```"):
+            in_code = not in_code
+            out.append(raw.rstrip())
+            blank = after_text = False
+            continue
+        if in_code:
+            out.append(raw)
+            continue
+
+        line = raw.rstrip()
+        if not line:
+            if not blank and out:
+                out.append("")
+            blank = True
+            after_text = False
+            continue
+        if DECORATIVE_LINE.match(line) and not (after_text and SETEXT_UNDERLINE.match(line)):
+            continue
+        m = HEADING_CLOSER.match(line)
+        if m:
+            line = m.group(1)
+        out.append(line)
+        blank = False
+        after_text = not line.lstrip().startswith("#")
+
+    while out and not out[-1]:
+        out.pop()
+    return "\n".join(out)
+
+
+def load_cache(path=None):
+    cache = state_codec.load(path or MINIFY_CACHE)
+    if isinstance(cache, dict) and cache.get("version") == CACHE_VERSION:
+        cache["dirty"] = False
+        return cache
+    return {"version": CACHE_VERSION, "bodies": {}, "dirty": False}
+
+
+def save_cache(cache, path=None):
+    """Persist the cache only if minify() added entries."""
+    if not cache.get("dirty"):
+        return
+    path = path or MINIFY_CACHE
+    bodies = cache["bodies"]
+    if len(bodies) > MAX_CACHE_ENTRIES:
+        for key in list(bodies)[:len(bodies) - MAX_CACHE_ENTRIES]:
+            del bodies[key]
+    state_codec.save(path, {"version": CACHE_VERSION, "bodies": bodies})
+    cache["dirty"] = False
+
+
+def minify(text, cache=None):
+    """Minify one body, using the content-hash cache when given."""
+    if cache is None:
+        return minify_text(text)
+    h = body_hash(text)
+    cached = cache["bodies"].get(h)
+    if cached is not None:
+        return cached
+    result = minify_text(text)
+    cache["bodies"][h] = result
+    cache["dirty"] = True
+    return result
+
+
+class Deduper:
+    """Replaces lines already emitted earlier in the same injection with back-references."""
+
+    def __init__(self):
+        self.seen = {}
+
+    def apply(self, text, label):
+        out = []
+        run_label = None
+        run_len = 0
+        lines = text.split("\n")
+        # Lines inside fenced code are kept verbatim and never referenced
+        fenced = []
+        in_code = False
+        for line in lines:
+            fence = line.lstrip().startswith("```")
+            fenced.append(in_code or fence)
+            if fence:
+                in_code = not in_code
+
+        def flush():
+            if run_len:
+                noun = "line" if run_len == 1 else "lines"
+                out.append(f"[{run_len} {noun} same as: {run_label}]")
+
+        for line, code in zip(lines, fenced):
+            key = line.strip()
+            owner = self.seen.get(key) if len(key) >= MIN_DEDUP_LINE and not code else None
+            if owner is not None and owner != label:
+                if owner != run_label:
+                    flush()
+                    run_label, run_len = owner, 0
+                run_len += 1
+                continue
+            flush()
+            run_label, run_len = None, 0
+            out.append(line)
+        flush()
+
+        for line, code in zip(lines, fenced):
+            key = line.strip()
+            if len(key) >= MIN_DEDUP_LINE and not code:
+                self.seen.setdefault(key, label)
+        return "\n".join(out)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Concurrent-Session Load Test for Claude Code memory hooks
+Simulates several sessions (and their subagents) hitting the hooks at
+once against a throwaway HOME, to measure contention on the shared state
+files and catch lost updates from concurrent read-modify-write.
+
+Each simulated session fires, at its own configurable rates (events/s,
+exponential inter-arrival):
+  - PostToolUse       post_tool_use.py — async like in Claude Code (the
+                      session does not wait), Read/Edit/Write on files from
+                      a per-session pool and a pool shared by all sessions
+  - UserPromptSubmit  memory_search.py — blocks the session
+  - Stop              stop_hook.py — blocks the session; a fresh decision is
+                      appended to the session's transcript first
+
+Reported:
+  - throughput (hook runs/s) and p50/p95/p99/max latency per hook
+  - file-lock wait: hooks that lock shared state append {"file", "wait_ms"}
+    lines to $CLAUDE_MEMORY_LOCK_LOG, which the harness sets and summarizes
+  - lost updates, found by checking the final state against what the events
+    guarantee:
+      file_tracking.jsonl   one line per PostToolUse
+      attn_state.json       every touched file present in the baseline
+      attn_sessions/        every session's files present in its overlay
+      coactivation_pairs    per pair, at least one increment for every event
+                            that started after another file's event finished
+      memory_hashes.json    the hash of every memory stop_hook saved
+      memories/index.jsonl  one line per saved memory file
+
+Usage:
+    python hook_loadtest.py [--sessions 8] [--duration 20] [--post-rate 4]
+                            [--prompt-rate 0.5] [--stop-rate 0.1] [--seed 1]
+"""
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import state_store
+import write_behind
+from cli_util import flag, percentile
+
+HOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Memory dir inside the throwaway HOME (same template as the hooks)
+MEMORY_SUBDIR = os.path.join(".claude", "projects", "C--Users-yourname", "memory")
+
+# Must match post_tool_use.COACTIVATION_WINDOW
+COACTIVATION_WINDOW = 120
+# Files per session pool and in the pool every session shares
+SESSION_FILES = 6
+SHARED_FILES = 4
+# Seconds before one hook run is abandoned
+HOOK_TIMEOUT = 30
+HERMETIC_UNSET = ["CLAUDE_MEMORY_RECORD", "MEMORY_SERVER_URL"]
+
+PROMPTS = [
+    "how do I roll back the deploy worker",
+    "why does the blender addon crash on export",
+    "what is our convention for release tags",
+    "remind me how the kiln controller PID is tuned",
+]
+
+SEED_MEMORY = {
+    "MEMORY.md": (
+        "**Deploy Runbook** | Active | deploy rollback worker release tags | [deploy-runbook.md](deploy-runbook.md)\n"
+        "**Blender MCP** | Active | blender addon export mesh crash | [blender-mcp.md](blender-mcp.md)\n"
+        "**Kiln** | Active | kiln controller pid tuning thermocouple | [kiln.md](kiln.md)\n"
+    ),
+    "deploy-runbook.md": "# Deploy Runbook\n\nRoll back the worker with `make rollback`. Tag releases vX.Y.Z.\n",
+    "blender-mcp.md": "# Blender MCP\n\nExport crashes when the mesh has loose vertices.\n",
+    "kiln.md": "# Kiln\n\nPID tuned with Ziegler-Nichols; thermocouple type K.\n",
+}
+
+
+def make_home():
+    home = tempfile.mkdtemp(prefix="hook-loadtest-")
+    memory_dir = os.path.join(home, MEMORY_SUBDIR)
+    os.makedirs(memory_dir)
+    for name, text in SEED_MEMORY.items():
+        with open(os.path.join(memory_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+    return home
+
+
+class LoadTest:
+    def __init__(self, sessions=8, duration=20.0, post_rate=4.0, prompt_rate=0.5, stop_rate=0.1,
+                 seed=1, hooks_dir=None, home=None):
+        self.sessions = sessions
+        self.duration = duration
+        self.rates = {"post_tool_use": post_rate, "memory_search": prompt_rate, "stop_hook": stop_rate}
+        self.seed = seed
+        self.hooks_dir = hooks_dir or HOOKS_DIR
+        self.home = home or make_home()
+        self.lock_log = os.path.join(self.home, "lock_waits.jsonl")
+        self.env = dict(os.environ, HOME=self.home, USERPROFILE=self.home, CLAUDE_MEMORY_LOCK_LOG=self.lock_log)
+        for name in HERMETIC_UNSET:
+            self.env.pop(name, None)
+        self.events = []
+        self.events_lock = threading.Lock()
+        self.async_pool = ThreadPoolExecutor(max_workers=max(4, sessions * 4))
+
+    def schedule(self, rng):
+        """[(offset_seconds, hook)] for one session, merged across event types."""
+        plan = []
+        for hook, rate in self.rates.items():
+            if rate <= 0:
+                continue
+            t = rng.expovariate(rate)
+            while t < self.duration:
+                plan.append((t, hook))
+                t += rng.expovariate(rate)
+        return sorted(plan)
+
+    def fire(self, session, hook, payload):
+        start = time.time()
+        try:
+            proc = subprocess.run([sys.executable, os.path.join(self.hooks_dir, hook + ".py")],
+                                  input=json.dumps(payload).encode("utf-8"), capture_output=True,
+                                  env=self.env, timeout=HOOK_TIMEOUT)
+            code = proc.returncode
+        except subprocess.TimeoutExpired:
+            code = "timeout"
+        end = time.time()
+        event = {"session": session, "hook": hook, "start": start, "end": end,
+                 "latency_ms": (end - start) * 1000, "code": code,
+                 "file": payload.get("tool_input", {}).get("file_path")}
+        with self.events_lock:
+            self.events.append(event)
+
+    def run_session(self, index, t0):
+        rng = random.Random(self.seed * 1000 + index)
+        session = f"load-{index}"
+        transcript = os.path.join(self.home, f"transcript-{index}.jsonl")
+        own = [f"/work/proj{index}/src/mod{i}.py" for i in range(SESSION_FILES)]
+        shared = [f"/work/shared/common{i}.py" for i in range(SHARED_FILES)]
+        stops = 0
+        for offset, hook in self.schedule(rng):
+            delay = t0 + offset - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            if hook == "post_tool_use":
+                path = rng.choice(shared if rng.random() < 0.3 else own)
+                payload = {"session_id": session, "tool_name": rng.choice(["Read", "Edit", "Write"]),
+                           "tool_input": {"file_path": path}}
+                self.async_pool.submit(self.fire, session, hook, payload)
+            elif hook == "memory_search":
+                self.fire(session, hook, {"session_id": session, "prompt": rng.choice(PROMPTS),
+                                          "cwd": f"/work/proj{index}"})
+            else:
+                stops += 1
+                with open(transcript, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"message": {"role": "user", "content": f"Which store for job {index}-{stops}?"}}) + "\n")
+                    f.write(json.dumps({"message": {"role": "assistant", "content": (
+                        f"We decided to use postgres for job {index}-{stops} instead of sqlite "
+                        f"because it handles concurrent writers; the reason we switched is lock contention.")}}) + "\n")
+                self.fire(session, hook, {"session_id": session, "transcript_path": transcript,
+                                          "stop_reason": "end_turn"})
+
+    def run(self):
+        t0 = time.time() + 0.2
+        threads = [threading.Thread(target=self.run_session, args=(i, t0)) for i in range(self.sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.async_pool.shutdown(wait=True)
+        # Hooks hand their writes to write_behind — let those land before checking
+        write_behind.wait_idle(os.path.join(self.home, ".claude", "write_behind"))
+        wall = max((e["end"] for e in self.events), default=t0) - t0
+        return self.report(max(wall, 1e-6))
+
+    # === Analysis ===
+
+    def _load(self, *parts, default=None):
+        """A state file as hooks see it — journaled updates (state_store.py) included."""
+        path = os.path.join(self.home, ".claude", *parts)
+        if not os.path.exists(path) and not os.path.isdir(state_store.journal_dir(path)):
+            return default
+        return state_store.load(path, default)
+
+    def lock_waits(self):
+        waits = {}
+        try:
+            with open(self.lock_log, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        waits.setdefault(os.path.basename(rec["file"]), []).append(float(rec["wait_ms"]))
+                    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                        continue
+        except OSError:
+            pass
+        return waits
+
+    def expected_pairs(self, posts):
+        """Lower bound on each co-activation pair count implied by event ordering."""
+        expected = {}
+        for k in posts:
+            others = {j["file"] for j in posts
+                      if j["file"] != k["file"] and j["end"] < k["start"]
+                      and k["start"] - j["end"] < COACTIVATION_WINDOW - 5}
+            for other in others:
+                a, b = k["file"], other
+                key = f"{a}||{b}" if a < b else f"{b}||{a}"
+                expected[key] = expected.get(key, 0) + 1
+        return expected
+
+    def lost_updates(self):
+        posts = [e for e in self.events if e["hook"] == "post_tool_use" and e["code"] == 0]
+        lost = {}
+
+        try:
+            with open(os.path.join(self.home, ".claude", "file_tracking.jsonl"), "rb") as f:
+                tracked = sum(1 for _ in f)
+        except OSError:
+            tracked = 0
+        if tracked < len(posts):
+            lost["file_tracking"] = len(posts) - tracked
+
+        touched = {e["file"] for e in posts}
+        baseline = (self._load("attn_state.json", default={}) or {}).get("scores", {})
+        missing = sorted(touched - set(baseline))
+        if missing:
+            lost["attn_baseline"] = len(missing)
+
+        overlay_missing = 0
+        for session in {e["session"] for e in posts}:
+            own = {e["file"] for e in posts if e["session"] == session}
+            overlay = (self._load("attn_sessions", f"{session}.json", default={}) or {}).get("scores", {})
+            overlay_missing += len(own - set(overlay))
+        if overlay_missing:
+            lost["attn_overlays"] = overlay_missing
+
+        pairs = self._load("coactivation_pairs.json", default={}) or {}
+        short = sum(max(0, n - pairs.get(key, {}).get("count", 0))
+                    for key, n in self.expected_pairs(posts).items())
+        if short:
+            lost["coactivation_counts"] = short
+
+        saved = []
+        mem_root = os.path.join(self.home, ".claude", "memories")
+        for dirpath, _, filenames in os.walk(mem_root):
+            for name in filenames:
+                if name.endswith(".json"):
+                    try:
+                        with open(os.path.join(dirpath, name), "r", encoding="utf-8") as f:
+                            saved.append(json.load(f).get("hash"))
+                    except (OSError, json.JSONDecodeError, AttributeError):
+                        continue
+        hashes = self._load("memory_hashes.json", default={}) or {}
+        missing_hashes = [h for h in saved if h and h not in hashes]
+        if missing_hashes:
+            lost["memory_hashes"] = len(missing_hashes)
+        try:
+            with open(os.path.join(mem_root, "index.jsonl"), "rb") as f:
+                indexed = sum(1 for _ in f)
+        except OSError:
+            indexed = 0
+        if indexed < len(saved):
+            lost["memories_index"] = len(saved) - indexed
+        return lost, {"posts": len(posts), "saved_memories": len(saved)}
+
+    def report(self, wall):
+        by_hook = {}
+        for e in self.events:
+            by_hook.setdefault(e["hook"], []).append(e["latency_ms"])
+        lost, counts = self.lost_updates()
+        waits = self.lock_waits()
+        return {
+            "sessions": self.sessions,
+            "wall_seconds": round(wall, 3),
+            "runs": len(self.events),
+            "throughput": round(len(self.events) / wall, 2),
+            "failures": sum(1 for e in self.events if e["code"] != 0),
+            "latency": {hook: {"n": len(v), "p50": percentile(v, 50), "p95": percentile(v, 95),
+                               "p99": percentile(v, 99), "max": max(v)} for hook, v in by_hook.items()},
+            "lock_wait": {name: {"n": len(v), "p95": percentile(v, 95), "max": max(v), "total": sum(v)}
+                          for name, v in waits.items()},
+            "lost_updates": lost,
+            "counts": counts,
+        }
+
+    def cleanup(self):
+        shutil.rmtree(self.home, ignore_errors=True)
+
+
+def format_report(r):
+    lines = [f"[loadtest] {r['sessions']} session(s), {r['runs']} hook run(s) in {r['wall_seconds']}s "
+             f"= {r['throughput']}/s, {r['failures']} failure(s)"]
+    for hook, s in sorted(r["latency"].items()):
+        lines.append(f"  {hook:<14} n={s['n']:<5} p50={s['p50']:.0f}ms p95={s['p95']:.0f}ms "
+                     f"p99={s['p99']:.0f}ms max={s['max']:.0f}ms")
+    if r["lock_wait"]:
+        for name, s in sorted(r["lock_wait"].items()):
+            lines.append(f"  lock {name:<24} n={s['n']:<5} p95={s['p95']:.1f}ms max={s['max']:.1f}ms "
+                         f"total={s['total']:.0f}ms")
+    else:
+        lines.append("  lock wait: none logged")
+    if r["lost_updates"]:
+        for name, n in sorted(r["lost_updates"].items()):
+            lines.append(f"  LOST {name}: {n}")
+    else:
+        lines.append("  lost updates: none detected")
+    return "\n".join(lines)
+
+
+def main():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__.strip())
+        sys.exit(0)
+    test = LoadTest(sessions=flag(args, "--sessions", 8, int), duration=flag(args, "--duration", 20.0, float),
+                    post_rate=flag(args, "--post-rate", 4.0, float),
+                    prompt_rate=flag(args, "--prompt-rate", 0.5, float),
+                    stop_rate=flag(args, "--stop-rate", 0.1, float), seed=flag(args, "--seed", 1, int))
+    try:
+        report = test.run()
+    finally:
+        if "--keep" not in args:
+            test.cleanup()
+    print(format_report(report))
+    if "--json" in args:
+        print(json.dumps(report, indent=2))
+    sys.exit(1 if report["lost_updates"] else 0)
+
+
+if __name__ == "__main__":
+    main()
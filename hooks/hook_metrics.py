@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Hook Metrics for Claude Code memory
+Every hook run appends one compact line to a rotating log, so the cost of
+each hook is visible without recording or replaying anything:
+
+  {"ts", "hook", "event", "ms", "cpu_ms", "exit", "bytes", "cache", "state"}
+
+  - ms        wall time from start() (right after the hook's imports) to exit
+  - cpu_ms    CPU time of the whole process, interpreter startup included
+  - exit      the exit path the hook marked ("injected", "no_match", ...),
+              "error:<Exception>" for an uncaught exception
+  - bytes     bytes written to stdout, i.e. injected into the context
+  - cache     hit/miss counts the hook reported (prefetch, minify, index)
+  - state     sizes of the shared state files, for growth trends
+
+On by default; CLAUDE_MEMORY_METRICS=0 turns it off. The cost per run is
+one atexit append of ~300 bytes plus a stat per state file. The log lives
+in ~/.claude/metrics/hooks.jsonl and rotates past MAX_LOG_BYTES, keeping
+ROTATE_KEEP old files. Only a hook run as its own script records, so
+tests and tools that import a hook (hook_replay --in-process) leave no
+trace.
+
+Usage:
+    python hook_metrics.py stats [--days N]   # latency, timeout share, growth
+"""
+import atexit
+import json
+import os
+import sys
+import time
+
+from cli_util import flag, percentile
+
+HOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+CLAUDE_DIR = os.path.join(os.path.expanduser("~"), ".claude")
+METRICS_DIR = os.path.join(CLAUDE_DIR, "metrics")
+METRICS_LOG = os.path.join(METRICS_DIR, "hooks.jsonl")
+
+# Rotate the log past this size; hooks.1.jsonl .. hooks.N.jsonl are kept
+MAX_LOG_BYTES = 1024 * 1024
+ROTATE_KEEP = 3
+
+# Event and timeout (seconds) of each hook, as registered in settings.json
+HOOKS = {
+    "memory_search": ("UserPromptSubmit", 5),
+    "voice_input": ("UserPromptSubmit", 2),
+    "subagent_start": ("SubagentStart", 5),
+    "session_start": ("SessionStart", 5),
+    "post_tool_use": ("PostToolUse", 3),
+    "mempalace_automine": ("PostToolUse", 5),
+    "precompact_save": ("PreCompact", 10),
+    "stop_hook": ("Stop", 10),
+    "session_end": ("SessionEnd", 10),
+}
+
+# Shared state files (relative to ~/.claude) whose size each record carries
+STATE_FILES = [
+    "attn_state.json", "memory_access_log.json", "coactivation_pairs.json",
+    "coactivation_graph.json", "memory_hashes.json", "pattern_tracker.json",
+    "memory_index.json", "memory_summaries.json", "memory_minified.json",
+    "file_tracking.jsonl", "transcript_cursors.json",
+]
+
+_run = None
+
+
+def is_hook_script(hook):
+    """Is `hook` the script this process runs, from this directory?"""
+    script = os.path.abspath(getattr(sys.modules.get("__main__"), "__file__", None) or "")
+    return os.path.dirname(script) == HOOKS_DIR and os.path.basename(script) == hook + ".py"
+
+
+def enabled(hook):
+    return os.environ.get("CLAUDE_MEMORY_METRICS", "1") != "0" and is_hook_script(hook)
+
+
+def start(hook):
+    """Begin timing this process's hook run; the record is written at exit.
+
+    Also starts hook_profile when CLAUDE_MEMORY_PROFILE is set.
+    """
+    global _run
+    if _run is not None or not is_hook_script(hook):
+        return
+    if os.environ.get("CLAUDE_MEMORY_PROFILE"):
+        try:
+            import hook_profile
+            hook_profile.start(hook)
+        except ImportError:
+            pass
+    if not enabled(hook):
+        return
+    _run = {"hook": hook, "t0": time.perf_counter(), "exit": "exit", "bytes": 0, "cache": {}}
+    previous = sys.excepthook
+
+    def excepthook(kind, value, tb):
+        mark("error:" + kind.__name__)
+        previous(kind, value, tb)
+
+    sys.excepthook = excepthook
+    atexit.register(_finish)
+
+
+def mark(exit_path):
+    """Name the path this run is leaving by (the last mark wins)."""
+    if _run is not None:
+        _run["exit"] = exit_path
+
+
+def add_bytes(n):
+    """Count n bytes written to stdout."""
+    if _run is not None:
+        _run["bytes"] += n
+
+
+def cache(name, hit):
+    """Count one lookup in cache `name` as a hit or a miss."""
+    if _run is not None:
+        counts = _run["cache"].setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+
+
+def state_sizes(claude_dir=None):
+    claude_dir = claude_dir or CLAUDE_DIR
+    sizes = {}
+    for name in STATE_FILES:
+        try:
+            sizes[name] = os.stat(os.path.join(claude_dir, name)).st_size
+        except OSError:
+            continue
+    return sizes
+
+
+def _finish():
+    run = _run
+    if run is None:
+        return
+    record = {
+        "ts": round(time.time(), 3),
+        "hook": run["hook"],
+        "event": HOOKS.get(run["hook"], ("", 0))[0],
+        "ms": round((time.perf_counter() - run["t0"]) * 1000, 2),
+        "cpu_ms": round(time.process_time() * 1000, 1),
+        "exit": run["exit"],
+        "bytes": run["bytes"],
+    }
+    if run["cache"]:
+        record["cache"] = run["cache"]
+    record["state"] = state_sizes()
+    write_record(record)
+
+
+def _rotated(path, n):
+    base, ext = os.path.splitext(path)
+    return f"{base}.{n}{ext}"
+
+
+def write_record(record, path=None):
+    path = path or METRICS_LOG
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            if os.path.getsize(path) > MAX_LOG_BYTES:
+                for n in range(ROTATE_KEEP - 1, 0, -1):
+                    if os.path.exists(_rotated(path, n)):
+                        os.replace(_rotated(path, n), _rotated(path, n + 1))
+                os.replace(path, _rotated(path, 1))
+        except OSError:
+            pass
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def load_records(path=None, since=0):
+    """Records from the log and its rotations, oldest first."""
+    path = path or METRICS_LOG
+    records = []
+    for p in [_rotated(path, n) for n in range(ROTATE_KEEP, 0, -1)] + [path]:
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(record, dict) and record.get("ts", 0) >= since:
+                        records.append(record)
+        except OSError:
+            continue
+    records.sort(key=lambda r: r.get("ts", 0))
+    return records
+
+
+def stats(records):
+    """Per-hook latency and timeout share, plus per-file state growth."""
+    by_hook = {}
+    for r in records:
+        by_hook.setdefault(r.get("hook", "?"), []).append(r)
+    hooks = {}
+    for hook, runs in by_hook.items():
+        ms = [r.get("ms", 0.0) for r in runs]
+        timeout = HOOKS.get(hook, ("", 0))[1]
+        exits, caches = {}, {}
+        for r in runs:
+            exits[r.get("exit", "?")] = exits.get(r.get("exit", "?"), 0) + 1
+            for name, (hit, miss) in r.get("cache", {}).items():
+                total = caches.setdefault(name, [0, 0])
+                total[0] += hit
+                total[1] += miss
+        s = {"n": len(runs), "p50": percentile(ms, 50), "p95": percentile(ms, 95),
+             "p99": percentile(ms, 99), "max": max(ms), "timeout": timeout,
+             "cpu_p50": percentile([r.get("cpu_ms", 0.0) for r in runs], 50),
+             "bytes_avg": sum(r.get("bytes", 0) for r in runs) / len(runs),
+             "exits": exits, "cache": caches}
+        if timeout:
+            s["budget_p95"] = s["p95"] / (timeout * 1000)
+            s["budget_p99"] = s["p99"] / (timeout * 1000)
+            s["over_half"] = sum(1 for v in ms if v > timeout * 500)
+        hooks[hook] = s
+
+    growth = {}
+    for r in records:
+        for name, size in r.get("state", {}).items():
+            g = growth.setdefault(name, {"first_ts": r["ts"], "first": size})
+            g["last_ts"], g["last"] = r["ts"], size
+    for g in growth.values():
+        days = (g["last_ts"] - g["first_ts"]) / 86400
+        g["per_day"] = (g["last"] - g["first"]) / days if days > 0 else 0.0
+    return {"hooks": hooks, "state": growth}
+
+
+def _kb(n):
+    return f"{n / 1024:.1f}KB"
+
+
+def format_stats(s):
+    lines = ["[hook-metrics] latency (ms) and share of the hook timeout"]
+    order = sorted(s["hooks"].items(), key=lambda kv: kv[1].get("budget_p95", 0), reverse=True)
+    for hook, h in order:
+        line = (f"  {hook:<18} n={h['n']:<5} p50={h['p50']:.0f} p95={h['p95']:.0f} "
+                f"p99={h['p99']:.0f} max={h['max']:.0f}")
+        if h["timeout"]:
+            line += (f"  p95={h['budget_p95']:.0%} p99={h['budget_p99']:.0%} of {h['timeout']}s"
+                     f" ({h['over_half']} run(s) >50%)")
+        lines.append(line)
+        exits = ", ".join(f"{k}={v}" for k, v in sorted(h["exits"].items(), key=lambda kv: -kv[1]))
+        lines.append(f"    exits: {exits}  injected avg {_kb(h['bytes_avg'])}  cpu p50={h['cpu_p50']:.0f}ms")
+        for name, (hit, miss) in sorted(h["cache"].items()):
+            lines.append(f"    cache {name}: {hit}/{hit + miss} hits")
+    if s["state"]:
+        lines.append("[hook-metrics] state files (first -> last, growth per day)")
+        for name, g in sorted(s["state"].items(), key=lambda kv: -kv[1]["last"]):
+            lines.append(f"  {name:<26} {_kb(g['first'])} -> {_kb(g['last'])}  {g['per_day'] / 1024:+.1f}KB/day")
+    return "\n".join(lines)
+
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] == "stats":
+        since = 0
+        try:
+            days = flag(args, "--days", cast=float)
+        except ValueError:
+            days = None
+        if days is not None:
+            since = time.time() - days * 86400
+        records = load_records(since=since)
+        print(format_stats(stats(records)) if records else "[hook-metrics] no records")
+    else:
+        print(__doc__.strip())
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
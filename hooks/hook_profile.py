@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Hook Profiler for Claude Code memory
+Opt-in per-invocation profiles of the hooks, for when hook_metrics.py
+shows a regression and timers are not enough.
+
+Off unless CLAUDE_MEMORY_PROFILE is set; hook_metrics.start() then starts
+the profiler for the rest of the hook's run:
+  - cprofile (or 1)  deterministic cProfile; every call is timed, so the
+                     hook runs noticeably slower while it is on
+  - sample           SIGPROF sampler (POSIX): every
+                     CLAUDE_MEMORY_PROFILE_INTERVAL seconds of CPU (default
+                     0.001) the Python stack is recorded; overhead stays
+                     small and the counts are collapsed stacks, ready for
+                     flamegraph.pl / speedscope
+
+One file per run in ~/.claude/profiles/ — <hook>-<time>-<pid>.prof
+(pstats) or .stacks (collapsed "frame;frame;frame count" lines). Only the
+newest MAX_PROFILES are kept.
+
+`report` merges any number of captures: top functions by own and
+cumulative time, and with --focus the split of one function's time over
+its callees (e.g. how much of stop_hook._run is score_category regex work
+and how much JSON I/O).
+
+Usage:
+    CLAUDE_MEMORY_PROFILE=sample python stop_hook.py < payload.json
+    python hook_profile.py list
+    python hook_profile.py report [--hook NAME] [--top N] [--focus FUNC] [--collapsed OUT]
+"""
+import atexit
+import io
+import os
+import sys
+import time
+
+from cli_util import flag
+
+PROFILE_ENV = "CLAUDE_MEMORY_PROFILE"
+INTERVAL_ENV = "CLAUDE_MEMORY_PROFILE_INTERVAL"
+PROFILES_DIR = os.path.join(os.path.expanduser("~"), ".claude", "profiles")
+# Captures kept on disk; the oldest beyond this are deleted after each write
+MAX_PROFILES = 200
+DEFAULT_INTERVAL = 0.001
+
+_active = None
+
+
+def mode():
+    """"cprofile", "sample" or None, from CLAUDE_MEMORY_PROFILE."""
+    value = os.environ.get(PROFILE_ENV, "").lower()
+    if value in ("1", "cprofile"):
+        return "cprofile"
+    if value == "sample":
+        return "sample"
+    return None
+
+
+def frame_label(code):
+    """"module:function" for a code object (packages by their directory name)."""
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    if module == "__init__":
+        module = os.path.basename(os.path.dirname(code.co_filename))
+    return f"{module}:{code.co_name}"
+
+
+class Sampler:
+    """Collapsed-stack sampler driven by SIGPROF (CPU-time interval timer)."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks = {}
+
+    def _sample(self, signum, frame):
+        labels = []
+        while frame is not None:
+            labels.append(frame_label(frame.f_code))
+            frame = frame.f_back
+        key = ";".join(reversed(labels))
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def start(self):
+        import signal
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        import signal
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for key, count in sorted(self.stacks.items()):
+                f.write(f"{key} {count}\n")
+
+
+def start(hook):
+    """Profile the rest of this hook run (no-op unless CLAUDE_MEMORY_PROFILE is set)."""
+    global _active
+    kind = mode()
+    if _active is not None or kind is None:
+        return
+    if kind == "sample":
+        try:
+            interval = float(os.environ.get(INTERVAL_ENV, DEFAULT_INTERVAL))
+        except ValueError:
+            interval = DEFAULT_INTERVAL
+        profiler = Sampler(interval)
+        try:
+            profiler.start()
+        except (AttributeError, ValueError, OSError):
+            return  # no SIGPROF here (Windows) or not the main thread
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    _active = (hook, kind, profiler)
+    atexit.register(_finish)
+
+
+def _finish():
+    global _active
+    if _active is None:
+        return
+    hook, kind, profiler = _active
+    _active = None
+    if kind == "sample":
+        profiler.stop()
+    else:
+        profiler.disable()
+    ext = ".stacks" if kind == "sample" else ".prof"
+    try:
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        path = os.path.join(PROFILES_DIR, f"{hook}-{time.time_ns():020d}-{os.getpid()}{ext}")
+        if kind == "sample":
+            profiler.dump(path)
+        else:
+            profiler.dump_stats(path)
+        prune()
+    except OSError:
+        pass
+
+
+def captures(hook=None, root=None):
+    """Capture paths, oldest first (optionally one hook's only)."""
+    root = root or PROFILES_DIR
+    try:
+        names = [n for n in os.listdir(root) if n.endswith((".prof", ".stacks"))]
+    except OSError:
+        return []
+    if hook:
+        names = [n for n in names if n.rsplit("-", 2)[0] == hook]
+    names.sort(key=lambda n: n.rsplit("-", 2)[1] if n.count("-") >= 2 else "")
+    return [os.path.join(root, n) for n in names]
+
+
+def prune(root=None, keep=None):
+    keep = MAX_PROFILES if keep is None else keep
+    paths = captures(root=root)
+    for path in paths[:max(0, len(paths) - keep)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_stacks(paths):
+    """Merged {collapsed stack: samples} of .stacks captures."""
+    merged = {}
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    key, _, count = line.rstrip("\n").rpartition(" ")
+                    if key and count.isdigit():
+                        merged[key] = merged.get(key, 0) + int(count)
+        except OSError:
+            continue
+    return merged
+
+
+def _matches(label, focus):
+    """Does frame label "module:function" match focus "module.function" (or "function")?"""
+    module, _, func = focus.rpartition(".")
+    return label == f"{module}:{func}" if module else label.endswith(":" + func)
+
+
+def stack_report(stacks, top=20, focus=None):
+    """(self, cumulative, focus split) sample counts per frame of merged stacks."""
+    own, cumulative, split = {}, {}, {}
+    for key, count in stacks.items():
+        frames = key.split(";")
+        own[frames[-1]] = own.get(frames[-1], 0) + count
+        for label in set(frames):
+            cumulative[label] = cumulative.get(label, 0) + count
+        if focus:
+            for i, label in enumerate(frames):
+                if _matches(label, focus):
+                    child = frames[i + 1] if i + 1 < len(frames) else "(self)"
+                    split[child] = split.get(child, 0) + count
+                    break
+
+    def ranked(d, limit=top):
+        return sorted(d.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+    return ranked(own), ranked(cumulative), ranked(split, None)
+
+
+def format_stack_report(stacks, top=20, focus=None):
+    total = sum(stacks.values())
+    if not total:
+        return "[hook-profile] no samples"
+    own, cumulative, split = stack_report(stacks, top, focus)
+    lines = [f"[hook-profile] {total} samples"]
+    for title, rows in (("own time", own), ("cumulative", cumulative)):
+        lines.append(f"  top functions by {title}:")
+        lines += [f"    {n / total:6.1%}  {n:>6}  {label}" for label, n in rows]
+    if focus:
+        focus_total = sum(n for _, n in split)
+        lines.append(f"  {focus}: {focus_total} samples, by callee:")
+        lines += [f"    {n / focus_total:6.1%}  {n:>6}  {label}" for label, n in split]
+    return "\n".join(lines)
+
+
+def format_pstats_report(paths, top=20, focus=None):
+    import pstats
+    out = io.StringIO()
+    stats = None
+    for path in paths:
+        try:
+            if stats is None:
+                stats = pstats.Stats(path, stream=out)
+            else:
+                stats.add(path)
+        except (OSError, TypeError, ValueError, EOFError):
+            continue
+    if stats is None:
+        return "[hook-profile] no cProfile captures"
+    out.write(f"[hook-profile] {len(paths)} cProfile capture(s)\n")
+    stats.strip_dirs()
+    stats.sort_stats("tottime").print_stats(top)
+    stats.sort_stats("cumulative").print_stats(top)
+    if focus:
+        # pstats matches a regex against "file:line(function)"
+        module, _, func = focus.rpartition(".")
+        pattern = rf"{module}\.py:\d+\({func}\)" if module else rf"\({func}\)"
+        stats.sort_stats("cumulative").print_callees(pattern)
+    return out.getvalue().rstrip()
+
+
+def main():
+    args = sys.argv[1:]
+    cmd = args[0] if args else ""
+    if cmd == "list":
+        for path in captures():
+            print(f"  {os.path.basename(path)}  {os.path.getsize(path)} bytes")
+    elif cmd == "report":
+        paths = captures(flag(args, "--hook"))
+        try:
+            top = int(flag(args, "--top", 20))
+        except ValueError:
+            top = 20
+        focus = flag(args, "--focus")
+        prof = [p for p in paths if p.endswith(".prof")]
+        sampled = [p for p in paths if p.endswith(".stacks")]
+        if not paths:
+            print("[hook-profile] no captures")
+        if prof:
+            print(format_pstats_report(prof, top, focus))
+        if sampled:
+            stacks = load_stacks(sampled)
+            print(format_stack_report(stacks, top, focus))
+            collapsed = flag(args, "--collapsed")
+            if collapsed:
+                with open(collapsed, "w", encoding="utf-8") as f:
+                    for key, count in sorted(stacks.items()):
+                        f.write(f"{key} {count}\n")
+                print(f"[hook-profile] collapsed stacks written to {collapsed}")
+    else:
+        print(__doc__.strip())
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Hook Input Recorder for Claude Code memory
+Opt-in capture of real workloads so scoring and storage changes can be
+replayed and compared (hook_replay.py).
+
+Off unless CLAUDE_MEMORY_RECORD=1 is set or the marker file
+~/.claude/recordings/.enabled exists (`python hook_replay.py record on`).
+When off, record() costs one environment lookup and one stat.
+
+Layout (~/.claude/recordings/<session_id>/):
+  - snapshot/      copy of the hook state as the session's first recorded
+                   event saw it: ~/.claude state files, memories/, sessions/,
+                   session_history/, attn_sessions/ and the memory dir
+                   (kept at its path relative to HOME)
+  - events.jsonl   one line per hook call: {seq, ts, hook, payload, transcript}
+  - transcripts/   copy of the transcript at the time of each Stop,
+                   PreCompact and SessionEnd call
+
+Not a hook itself — called by each lifecycle hook right after it parses
+its stdin payload.
+"""
+import json
+import os
+import re
+import shutil
+import time
+
+CLAUDE_DIR = os.path.join(os.path.expanduser("~"), ".claude")
+MEMORY_DIR = os.path.join(CLAUDE_DIR, "projects", "C--Users-yourname", "memory")
+RECORDINGS_DIR = os.path.join(CLAUDE_DIR, "recordings")
+ENABLED_MARKER = os.path.join(RECORDINGS_DIR, ".enabled")
+
+# Hooks whose transcript is read and therefore copied with the event
+TRANSCRIPT_HOOKS = {"stop_hook", "precompact_save", "session_end"}
+# Transcripts larger than this are not copied (replay then sees none)
+MAX_TRANSCRIPT_BYTES = 20 * 1024 * 1024
+# State directories under ~/.claude included in the snapshot
+SNAPSHOT_DIRS = ["memories", "sessions", "session_history", "attn_sessions"]
+SNAPSHOT_SUFFIXES = (".json", ".jsonl", ".txt", ".md")
+
+
+def recording_enabled():
+    return os.environ.get("CLAUDE_MEMORY_RECORD") == "1" or os.path.exists(ENABLED_MARKER)
+
+
+def session_dir(session_id):
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", session_id or "unknown")[:80]
+    return os.path.join(RECORDINGS_DIR, safe)
+
+
+def snapshot_state(dest, claude_dir=None, memory_dir=None):
+    """Copy the hook-visible state into dest, laid out as a HOME directory."""
+    claude_dir = claude_dir or CLAUDE_DIR
+    memory_dir = memory_dir or MEMORY_DIR
+    home = os.path.dirname(claude_dir)
+    dest_claude = os.path.join(dest, os.path.basename(claude_dir))
+    os.makedirs(dest_claude, exist_ok=True)
+    try:
+        names = os.listdir(claude_dir)
+    except OSError:
+        names = []
+    for name in names:
+        src = os.path.join(claude_dir, name)
+        if name.endswith(SNAPSHOT_SUFFIXES) and os.path.isfile(src):
+            shutil.copy2(src, os.path.join(dest_claude, name))
+    for name in SNAPSHOT_DIRS:
+        src = os.path.join(claude_dir, name)
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(dest_claude, name), dirs_exist_ok=True)
+    if os.path.isdir(memory_dir):
+        rel = os.path.relpath(memory_dir, home)
+        shutil.copytree(memory_dir, os.path.join(dest, rel), dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns("*.warm", "*.tmp"))
+
+
+def record(hook, payload):
+    """Append one hook call to its session's recording (no-op unless enabled)."""
+    if not recording_enabled():
+        return
+    try:
+        rec_dir = session_dir(payload.get("session_id", ""))
+        events = os.path.join(rec_dir, "events.jsonl")
+        if not os.path.exists(events):
+            snapshot_state(os.path.join(rec_dir, "snapshot"))
+        seq = 0
+        if os.path.exists(events):
+            with open(events, "rb") as f:
+                seq = sum(1 for _ in f)
+        transcript = None
+        src = payload.get("transcript_path", "")
+        if hook in TRANSCRIPT_HOOKS and src and os.path.isfile(src) \
+                and os.path.getsize(src) <= MAX_TRANSCRIPT_BYTES:
+            transcript = f"transcripts/{seq:05d}.jsonl"
+            os.makedirs(os.path.join(rec_dir, "transcripts"), exist_ok=True)
+            shutil.copyfile(src, os.path.join(rec_dir, transcript))
+        event = {"seq": seq, "ts": time.time(), "hook": hook, "payload": payload, "transcript": transcript}
+        with open(events, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+    except (OSError, TypeError, ValueError, AttributeError):
+        pass
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Hook Replay Runner for Claude Code memory
+Replays sessions captured by hook_recorder.py through the hooks, so a
+scoring or storage change can be measured against real workloads before
+it ships.
+
+Each replay starts from the session's state snapshot in a throwaway HOME
+and feeds the recorded payloads to the hooks in order (transcript paths
+point at the recorded copies). Two modes:
+  - subprocess (default): `python <hooks-dir>/<hook>.py` per event, the way
+    Claude Code runs them — latency includes interpreter startup
+  - --in-process: hooks are imported once and main() is called per event —
+    isolates the hooks' own work
+
+Reports per-hook latency (p50/p95/max), and with --against a second hooks
+directory (e.g. a checkout of the previous version) also diffs what each
+version injected per prompt (memory_search, subagent_start, session_start)
+and which memories stop_hook saved.
+
+Usage:
+    python hook_replay.py record on|off
+    python hook_replay.py list
+    python hook_replay.py replay <session-id|dir> [--hooks DIR] [--against DIR] [--in-process]
+"""
+import hashlib
+import importlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import hook_recorder
+import write_behind
+from cli_util import flag, percentile
+
+HOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+REPLAY_HOOKS = ["memory_search", "subagent_start", "stop_hook", "post_tool_use",
+                "precompact_save", "session_start", "session_end"]
+# Hooks whose output is an injection worth diffing
+RANKING_HOOKS = {"memory_search", "subagent_start", "session_start"}
+# Environment that would make a replay leave its sandbox
+HERMETIC_UNSET = ["CLAUDE_MEMORY_RECORD", "MEMORY_SERVER_URL"]
+# Seconds before a subprocess replay of one event is abandoned
+EVENT_TIMEOUT = 30
+
+INJECTION_LABELS = [
+    re.compile(r"^\[(Memory|TeamMemory|MemPalace): (.+?) \((?:score|similarity|working set)", re.M),
+    re.compile(r"^--- ()(.+?) \(relevance: ", re.M),
+]
+
+
+def load_events(rec_dir):
+    events = []
+    try:
+        with open(os.path.join(rec_dir, "events.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except OSError:
+        pass
+    return sorted(events, key=lambda e: e.get("seq", 0))
+
+
+def replay_payload(event, rec_dir):
+    """The recorded payload, pointed at the recorded transcript copy (or none)."""
+    payload = dict(event["payload"])
+    if event.get("transcript"):
+        payload["transcript_path"] = os.path.join(rec_dir, event["transcript"])
+    elif "transcript_path" in payload:
+        payload["transcript_path"] = ""
+    return payload
+
+
+def parse_injections(output):
+    """Ordered labels of the memory blocks in a hook's stdout."""
+    found = []
+    for pattern in INJECTION_LABELS:
+        for m in pattern.finditer(output):
+            found.append((m.start(), f"{m.group(1) or 'Subagent'}:{m.group(2)}"))
+    return [label for _, label in sorted(found)]
+
+
+def saved_memories(home):
+    """{"<category>:<hash>": preview} for every stop-hook memory under home."""
+    memories = {}
+    root = os.path.join(home, ".claude", "memories")
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(dirpath, name), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                content = entry.get("content", "")
+            except (OSError, json.JSONDecodeError, AttributeError):
+                continue
+            h = entry.get("hash") or hashlib.md5(content.encode("utf-8")).hexdigest()
+            memories[f"{entry.get('category', os.path.basename(dirpath))}:{h[:12]}"] = content[:80]
+    return memories
+
+
+def _hermetic_env(home):
+    env = dict(os.environ, HOME=home, USERPROFILE=home)
+    for name in HERMETIC_UNSET:
+        env.pop(name, None)
+    return env
+
+
+def _run_subprocess(hooks_dir, hook, payload, home):
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run([sys.executable, os.path.join(hooks_dir, hook + ".py")],
+                              input=json.dumps(payload).encode("utf-8"), capture_output=True,
+                              env=_hermetic_env(home), timeout=EVENT_TIMEOUT)
+        output = proc.stdout
+    except subprocess.TimeoutExpired:
+        output = b""
+    return (time.perf_counter() - start) * 1000, output.decode("utf-8", errors="replace")
+
+
+class InProcessHooks:
+    """Hook modules of one hooks dir, imported under a sandbox HOME."""
+
+    def __init__(self, hooks_dir, home):
+        self.hooks_dir = os.path.abspath(hooks_dir)
+        self.home = home
+        self.saved_env = {k: os.environ.get(k) for k in ["HOME", "USERPROFILE"] + HERMETIC_UNSET}
+        os.environ.update(_hermetic_env(home))
+        for name in HERMETIC_UNSET:
+            os.environ.pop(name, None)
+        self.saved_modules = self._purge()
+        sys.path.insert(0, self.hooks_dir)
+        self.modules = {}
+
+    def _purge(self):
+        """Drop cached hook modules so this hooks dir's versions get imported."""
+        names = {n[:-3] for n in os.listdir(self.hooks_dir) if n.endswith(".py")} - {"hook_replay"}
+        return {n: sys.modules.pop(n) for n in list(sys.modules) if n in names}
+
+    def run(self, hook, payload):
+        module = self.modules.get(hook)
+        if module is None:
+            module = self.modules[hook] = importlib.import_module(hook)
+        stdin, stdout = sys.stdin, sys.stdout
+        out = io.BytesIO()
+        fake_out = io.TextIOWrapper(out, encoding="utf-8")
+        sys.stdin = io.TextIOWrapper(io.BytesIO(json.dumps(payload).encode("utf-8")), encoding="utf-8")
+        sys.stdout = fake_out
+        start = time.perf_counter()
+        try:
+            module.main()
+        except SystemExit:
+            pass
+        except Exception:
+            pass  # a crashing hook is recorded like a failed subprocess: whatever it wrote
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            sys.stdin, sys.stdout = stdin, stdout
+        fake_out.flush()
+        return elapsed, out.getvalue().decode("utf-8", errors="replace")
+
+    def close(self):
+        self._purge()
+        sys.modules.update(self.saved_modules)
+        try:
+            sys.path.remove(self.hooks_dir)
+        except ValueError:
+            pass
+        for key, value in self.saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def replay(rec_dir, hooks_dir=None, in_process=False):
+    """Replay one recorded session. Returns {latency, injections, memories}."""
+    hooks_dir = hooks_dir or HOOKS_DIR
+    result = {"hooks_dir": hooks_dir, "latency": {}, "injections": [], "memories": {}}
+    home = tempfile.mkdtemp(prefix="hook-replay-")
+    runner = None
+    try:
+        snapshot = os.path.join(rec_dir, "snapshot")
+        if os.path.isdir(snapshot):
+            shutil.copytree(snapshot, home, dirs_exist_ok=True)
+        if in_process:
+            runner = InProcessHooks(hooks_dir, home)
+        for event in load_events(rec_dir):
+            hook = event.get("hook")
+            if hook not in REPLAY_HOOKS or not os.path.exists(os.path.join(hooks_dir, hook + ".py")):
+                continue
+            payload = replay_payload(event, rec_dir)
+            if runner:
+                elapsed, output = runner.run(hook, payload)
+            else:
+                elapsed, output = _run_subprocess(hooks_dir, hook, payload, home)
+            result["latency"].setdefault(hook, []).append(round(elapsed, 3))
+            if hook in RANKING_HOOKS:
+                result["injections"].append({"seq": event.get("seq"), "hook": hook,
+                                             "injected": parse_injections(output)})
+        write_behind.wait_idle(os.path.join(home, ".claude", "write_behind"))
+        result["memories"] = saved_memories(home)
+    finally:
+        if runner:
+            runner.close()
+        shutil.rmtree(home, ignore_errors=True)
+    return result
+
+
+def latency_summary(latency):
+    return {hook: {"n": len(v), "p50": percentile(v, 50), "p95": percentile(v, 95), "max": max(v)}
+            for hook, v in latency.items() if v}
+
+
+def diff_runs(base, other):
+    """Differences between two replays of the same recording."""
+    changed = []
+    for a, b in zip(base["injections"], other["injections"]):
+        if a["injected"] != b["injected"]:
+            changed.append({"seq": a["seq"], "hook": a["hook"], "base": a["injected"], "other": b["injected"]})
+    base_mem, other_mem = set(base["memories"]), set(other["memories"])
+    return {
+        "injections_compared": min(len(base["injections"]), len(other["injections"])),
+        "injections_changed": changed,
+        "memories_only_base": sorted(base_mem - other_mem),
+        "memories_only_other": sorted(other_mem - base_mem),
+    }
+
+
+def format_report(base, other=None):
+    lines = []
+    runs = [("base", base)] + ([("other", other)] if other else [])
+    for label, run in runs:
+        lines.append(f"[{label}] {run['hooks_dir']}")
+        for hook, s in sorted(latency_summary(run["latency"]).items()):
+            lines.append(f"  {hook:<16} n={s['n']:<4} p50={s['p50']:.1f}ms p95={s['p95']:.1f}ms max={s['max']:.1f}ms")
+        lines.append(f"  memories saved: {len(run['memories'])}")
+    if other:
+        d = diff_runs(base, other)
+        lines.append(f"injections: {len(d['injections_changed'])} of {d['injections_compared']} changed")
+        for c in d["injections_changed"][:20]:
+            lines.append(f"  #{c['seq']} {c['hook']}: {c['base']} -> {c['other']}")
+        for key in d["memories_only_base"]:
+            lines.append(f"  - memory {key}: {base['memories'][key]}")
+        for key in d["memories_only_other"]:
+            lines.append(f"  + memory {key}: {other['memories'][key]}")
+    return "\n".join(lines)
+
+
+def main():
+    args = sys.argv[1:]
+    cmd = args[0] if args else ""
+    args = args[1:]
+    if cmd == "record" and args and args[0] in ("on", "off"):
+        if args[0] == "on":
+            os.makedirs(hook_recorder.RECORDINGS_DIR, exist_ok=True)
+            open(hook_recorder.ENABLED_MARKER, "a").close()
+        else:
+            try:
+                os.remove(hook_recorder.ENABLED_MARKER)
+            except OSError:
+                pass
+        print(f"[hook-replay] recording {args[0]}")
+    elif cmd == "list":
+        try:
+            names = sorted(os.listdir(hook_recorder.RECORDINGS_DIR))
+        except OSError:
+            names = []
+        for name in names:
+            path = os.path.join(hook_recorder.RECORDINGS_DIR, name)
+            if os.path.isdir(path):
+                print(f"  {name}  {len(load_events(path))} event(s)")
+    elif cmd == "replay" and args:
+        in_process = "--in-process" in args
+        if in_process:
+            args.remove("--in-process")
+        hooks_dir, against = flag(args, "--hooks"), flag(args, "--against")
+        rec_dir = args[0] if os.path.isdir(args[0]) else hook_recorder.session_dir(args[0])
+        base = replay(rec_dir, hooks_dir, in_process)
+        other = replay(rec_dir, against, in_process) if against else None
+        print(format_report(base, other))
+    else:
+        print(__doc__.strip())
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
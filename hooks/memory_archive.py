@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Cold-Tier Memory Archive for Claude Code
+Moves memories nobody has touched for a while out of the hot paths and into
+a compressed, indexed archive pack.
+
+Candidates:
+  - topic files in MEMORY_DIR not accessed for ARCHIVE_AFTER_DAYS (going by
+    memory_access_log.json, falling back to mtime), not warm in attn_state.json
+    and not linked from MEMORY.md (an indexed file stays where the hooks read it)
+  - stop-hook JSON memories in ~/.claude/memories/<category>/ older than
+    ARCHIVE_AFTER_DAYS (also dropped from memories/index.jsonl and the
+    memories/<category>/index.jsonl partitions)
+
+Layout (~/.claude/memory_archive/):
+  - archive.pack        — append-only; each member is an independently
+                          compressed gzip (or zstd, if installed) segment
+  - archive_index.json  — offset table: key -> offset, length, codec,
+                          original path + keywords for archive search
+
+Archived memories stay reachable through an explicit archive search; a
+strong hit (score >= ARCHIVE_RESTORE_SCORE) restores the file transparently.
+Every hook that reads a topic file for a MEMORY.md entry (memory_search,
+subagent_start, the working-set restore, telegram_memory_search) restores
+it first when it is missing and archived.
+
+The pack and archive_index.json change only under archive_index.json's
+state_store lock, and the memories/ JSONL indexes only under
+memories/index.jsonl's (also taken by stop_hook.py when it appends).
+Restores mark pack bytes dead; the pack is compacted by archive_cold()
+(SessionEnd, after the hook has returned), never on the prompt path.
+
+Usage:
+    python memory_archive.py archive [--days N] [--dry-run]
+    python memory_archive.py search "query words"
+    python memory_archive.py restore <key>
+    python memory_archive.py list
+"""
+import contextlib
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import state_codec
+import state_store
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MEMORY_DIR = os.path.join(os.path.expanduser("~"), ".claude", "projects", "C--Users-yourname", "memory")
+MEMORIES_DIR = os.path.join(os.path.expanduser("~"), ".claude", "memories")
+ACCESS_LOG = os.path.join(os.path.expanduser("~"), ".claude", "memory_access_log.json")
+ATTN_STATE = os.path.join(os.path.expanduser("~"), ".claude", "attn_state.json")
+ARCHIVE_DIR = os.path.join(os.path.expanduser("~"), ".claude", "memory_archive")
+ARCHIVE_PACK = os.path.join(ARCHIVE_DIR, "archive.pack")
+ARCHIVE_INDEX = os.path.join(ARCHIVE_DIR, "archive_index.json")
+
+INDEX_VERSION = 1
+
+# Memories idle for this many days move to the archive
+ARCHIVE_AFTER_DAYS = 90
+# Files with attention at or above this are never archived (WARM or HOT)
+ATTENTION_FLOOR = 0.25
+# Archive-search score at which a hit is restored automatically
+ARCHIVE_RESTORE_SCORE = 8
+# Rewrite the pack when this fraction of it belongs to restored members
+COMPACT_DEAD_RATIO = 0.5
+# Keywords stored per member for archive search
+MAX_MEMBER_KEYWORDS = 40
+# Lock wait for archiving and compaction (background, off the prompt path)
+ARCHIVE_LOCK_TIMEOUT = 2.0
+
+
+def load_json(path, default=None):
+    if default is None:
+        default = {}
+    return state_codec.load(path, default)
+
+
+def save_json(path, data):
+    state_codec.save(path, data)
+
+
+def load_index():
+    index = load_json(ARCHIVE_INDEX, {})
+    if index.get("version") != INDEX_VERSION:
+        index = {"version": INDEX_VERSION, "members": {}, "dead_bytes": 0}
+    return index
+
+
+def _compress(data):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "gzip", gzip.compress(data, compresslevel=9)
+
+
+def _decompress(codec, blob):
+    if codec == "zstd":
+        if zstandard is None:
+            raise OSError("archive member is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+def _keywords(text):
+    counts = {}
+    for w in re.findall(r"[a-z0-9][a-z0-9_-]{2,}", text.lower()):
+        counts[w] = counts.get(w, 0) + 1
+    ranked = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+    return [w for w, _ in ranked[:MAX_MEMBER_KEYWORDS]]
+
+
+def _append_member(data):
+    """Append one compressed segment to the pack. Returns (offset, length, codec)."""
+    codec, blob = _compress(data)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with open(ARCHIVE_PACK, "ab") as f:
+        f.seek(0, os.SEEK_END)
+        offset = f.tell()
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    return offset, len(blob), codec
+
+
+def read_member(meta):
+    """Random-access read of one member via the offset table."""
+    with open(ARCHIVE_PACK, "rb") as f:
+        f.seek(meta["offset"])
+        blob = f.read(meta["length"])
+    return _decompress(meta["codec"], blob)
+
+
+def _attention(filename, attn_state):
+    scores = attn_state.get("scores", {})
+    for key in (filename, os.path.join(MEMORY_DIR, filename)):
+        if key in scores:
+            return scores[key].get("score", 0.0)
+    return 0.0
+
+
+def json_index_path():
+    """memories/index.jsonl — its lock guards the consolidated index and the partitions."""
+    return os.path.join(MEMORIES_DIR, "index.jsonl")
+
+
+def indexed_topics():
+    """Topic files MEMORY.md links to."""
+    try:
+        with open(os.path.join(MEMORY_DIR, "MEMORY.md"), "r", encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        return set()
+    return {os.path.basename(link) for link in re.findall(r"\]\(([^)\s]+\.md)\)", text)}
+
+
+def find_candidates(days=None, now=None):
+    """List (key, path, kind, category) of memories idle for longer than `days`."""
+    days = ARCHIVE_AFTER_DAYS if days is None else days
+    now = now or time.time()
+    cutoff = now - days * 86400
+    access_log = load_json(ACCESS_LOG)
+    attn_state = load_json(ATTN_STATE, {"scores": {}})
+    candidates = []
+    indexed = indexed_topics()
+
+    try:
+        names = sorted(os.listdir(MEMORY_DIR))
+    except OSError:
+        names = []
+    for name in names:
+        if not name.endswith(".md") or name == "MEMORY.md" or name in indexed:
+            continue
+        path = os.path.join(MEMORY_DIR, name)
+        try:
+            last = access_log.get(name) or os.path.getmtime(path)
+        except OSError:
+            continue
+        if last < cutoff and _attention(name, attn_state) < ATTENTION_FLOOR:
+            candidates.append((f"topic:{name}", path, "topic", ""))
+
+    mem_root = Path(MEMORIES_DIR)
+    if mem_root.is_dir():
+        for cat_dir in sorted(p for p in mem_root.iterdir() if p.is_dir()):
+            for path in sorted(cat_dir.glob("*.json")):
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        candidates.append((f"memory:{cat_dir.name}/{path.name}", str(path), "memory", cat_dir.name))
+                except OSError:
+                    continue
+    return candidates
+
+
+def _index_lock(needed, timeout):
+    """The memories/index.jsonl lock when `needed`, else a no-op that counts as held."""
+    if not needed:
+        return contextlib.nullcontext(True)
+    return state_store.locked(json_index_path(), timeout)
+
+
+def _rewrite_jsonl_indexes(hashes):
+    """Remove archived JSON memories from the hot indexes (consolidated + per-category).
+
+    Callers hold the memories/index.jsonl lock.
+    """
+    index_paths = [json_index_path()]
+    index_paths += [str(p) for p in sorted(Path(MEMORIES_DIR).glob("*/index.jsonl"))]
+    for index_path in index_paths:
+        if not os.path.exists(index_path):
+            continue
+        kept = []
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        if json.loads(line).get("hash") in hashes:
+                            continue
+                    except json.JSONDecodeError:
+                        pass
+                    if line.strip():
+                        kept.append(line.rstrip("\n"))
+            tmp = index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("\n".join(kept) + "\n" if kept else "")
+            os.replace(tmp, index_path)
+        except OSError:
+            pass
+
+
+def archive_cold(days=None, dry_run=False, now=None):
+    """Move idle memories into the pack, then compact it. Returns the list of archived keys."""
+    candidates = find_candidates(days, now)
+    if dry_run or not candidates:
+        return [key for key, _, _, _ in candidates]
+
+    # Lock order: archive index, then memories/index.jsonl (as in restore)
+    with state_store.locked(ARCHIVE_INDEX, ARCHIVE_LOCK_TIMEOUT) as held, \
+            _index_lock(any(kind == "memory" for _, _, kind, _ in candidates), ARCHIVE_LOCK_TIMEOUT) as index_held:
+        if not held:
+            return []
+        if not index_held:
+            # Their index lines could not be dropped safely: JSON memories stay hot this time
+            candidates = [c for c in candidates if c[2] != "memory"]
+        index = load_index()
+        archived = []
+        dropped_hashes = set()
+        for key, path, kind, category in candidates:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                offset, length, codec = _append_member(data)
+            except OSError:
+                continue
+            text = data.decode("utf-8", errors="replace")
+            if kind == "memory":
+                try:
+                    entry = json.loads(text)
+                except json.JSONDecodeError:
+                    entry = {}
+                if entry.get("hash"):
+                    dropped_hashes.add(entry["hash"])
+                name = f"{category}: {entry.get('content', '')[:60]}"
+                body = entry.get("content", "")
+            else:
+                name = os.path.basename(path)[:-3]
+                body = text
+            index["members"][key] = {
+                "kind": kind,
+                "category": category,
+                "path": path,
+                "offset": offset,
+                "length": length,
+                "codec": codec,
+                "archived_at": time.time(),
+                "name": name,
+                "keywords": _keywords(name.replace("-", " ") + " " + body),
+                "preview": body[:200],
+            }
+            archived.append((key, path))
+
+        # Only delete originals once the offset table that points at them is on disk
+        save_json(ARCHIVE_INDEX, index)
+        for _, path in archived:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if dropped_hashes:
+            _rewrite_jsonl_indexes(dropped_hashes)
+    compact()
+    return [key for key, _ in archived]
+
+
+def restore(key, timeout=None):
+    """Write an archived member back to its original location. Returns the path or None.
+
+    Gives up (None) if the archive lock — or, for a JSON memory, the
+    memories/index.jsonl lock — stays busy past `timeout`
+    (state_store.LOCK_TIMEOUT); the member stays archived for the next try.
+    """
+    with state_store.locked(ARCHIVE_INDEX, timeout) as held:
+        if not held:
+            return None
+        index = load_index()
+        meta = index["members"].get(key)
+        if not meta:
+            return None
+        with _index_lock(meta["kind"] == "memory", timeout) as index_held:
+            if not index_held:
+                return None
+            try:
+                data = read_member(meta)
+                os.makedirs(os.path.dirname(meta["path"]), exist_ok=True)
+                with open(meta["path"], "wb") as f:
+                    f.write(data)
+            except OSError:
+                return None
+
+            if meta["kind"] == "memory":
+                try:
+                    entry = json.loads(data.decode("utf-8", errors="replace"))
+                    line = json.dumps(entry, ensure_ascii=False) + "\n"
+                    index_paths = [json_index_path()]
+                    if os.path.exists(os.path.join(MEMORIES_DIR, ".partitioned")):
+                        index_paths.append(os.path.join(MEMORIES_DIR, meta["category"], "index.jsonl"))
+                    for index_path in index_paths:
+                        with open(index_path, "a", encoding="utf-8") as idx:
+                            idx.write(line)
+                except (OSError, json.JSONDecodeError):
+                    pass
+
+        del index["members"][key]
+        index["dead_bytes"] = index.get("dead_bytes", 0) + meta["length"]
+        save_json(ARCHIVE_INDEX, index)
+    return meta["path"]
+
+
+def restore_topic(filename):
+    """Hook path: restore an archived topic file if there is one."""
+    if not os.path.exists(ARCHIVE_INDEX):
+        return None
+    return restore(f"topic:{filename}")
+
+
+def compact():
+    """Rewrite the pack without restored members once enough of it is dead."""
+    with state_store.locked(ARCHIVE_INDEX, ARCHIVE_LOCK_TIMEOUT) as held:
+        if not held:
+            return False
+        index = load_index()
+        try:
+            size = os.path.getsize(ARCHIVE_PACK)
+        except OSError:
+            return False
+        if size == 0 or index.get("dead_bytes", 0) / size < COMPACT_DEAD_RATIO:
+            return False
+
+        tmp = ARCHIVE_PACK + ".tmp"
+        try:
+            with open(ARCHIVE_PACK, "rb") as src, open(tmp, "wb") as dst:
+                for meta in sorted(index["members"].values(), key=lambda m: m["offset"]):
+                    src.seek(meta["offset"])
+                    blob = src.read(meta["length"])
+                    meta["offset"] = dst.tell()
+                    dst.write(blob)
+            os.replace(tmp, ARCHIVE_PACK)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+        index["dead_bytes"] = 0
+        save_json(ARCHIVE_INDEX, index)
+    return True
+
+
+def search_archive(words, limit=5, auto_restore=True):
+    """Explicit archive search. Returns [(score, key, meta, restored_path)].
+
+    Scoring mirrors memory_search: exact keyword = 3, partial = 1, name = 2.
+    Hits at or above ARCHIVE_RESTORE_SCORE are restored when auto_restore is set.
+    """
+    index = load_index()
+    hits = []
+    for key, meta in index["members"].items():
+        keywords = set(meta.get("keywords", []))
+        name_lower = meta.get("name", "").lower()
+        score = 0
+        for word in words:
+            if word in keywords:
+                score += 3
+            elif any(word in kw for kw in keywords):
+                score += 1
+            if word in name_lower:
+                score += 2
+        if score > 0:
+            hits.append((score, key, meta))
+    hits.sort(key=lambda h: (-h[0], h[1]))
+
+    results = []
+    for score, key, meta in hits[:limit]:
+        restored = None
+        if auto_restore and score >= ARCHIVE_RESTORE_SCORE:
+            restored = restore(key)
+        results.append((score, key, meta, restored))
+    return results
+
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] not in ("archive", "search", "restore", "list"):
+        print(__doc__.strip().split("Usage:")[1], file=sys.stderr)
+        sys.exit(1)
+    cmd = args[0]
+
+    if cmd == "archive":
+        days = None
+        if "--days" in args:
+            days = float(args[args.index("--days") + 1])
+        keys = archive_cold(days, dry_run="--dry-run" in args)
+        verb = "would archive" if "--dry-run" in args else "archived"
+        print(f"[memory-archive] {verb} {len(keys)} memories")
+        for key in keys:
+            print(f"  {key}")
+    elif cmd == "search":
+        words = {w for w in re.findall(r"[a-z0-9][a-z0-9_-]*", " ".join(args[1:]).lower()) if len(w) >= 3}
+        for score, key, meta, restored in search_archive(words):
+            status = f"restored -> {restored}" if restored else "archived"
+            print(f"[{score}] {key} ({status})\n    {meta.get('preview', '')[:150]!r}")
+    elif cmd == "restore":
+        for key in args[1:]:
+            path = restore(key)
+            print(f"{key}: {'restored -> ' + path if path else 'not in archive'}")
+    else:
+        for key, meta in sorted(load_index()["members"].items()):
+            when = time.strftime("%Y-%m-%d", time.localtime(meta["archived_at"]))
+            print(f"{key}  ({meta['codec']}, {meta['length']} bytes, archived {when})")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
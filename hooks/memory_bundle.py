@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Memory Bundle for Claude Code
+Packs a whole memory set into one file so a new machine is ready to query
+right after unpacking, instead of rebuilding every index on its first
+prompts and re-mining the MemPalace palace file by file.
+
+Bundle layout:
+  - fixed header   MAGIC (8 bytes) | format version (u16) | header length (u32)
+  - JSON header    {version, created, memory_dir, members: [{path, offset,
+                   length, size, codec, sha256, mtime_ns}]}
+  - member data    each member stored raw or zlib-compressed, whichever is
+                   smaller; offsets are relative to the end of the header
+
+Members (logical path -> location):
+  - memory/<name>.md                  topic files + MEMORY.md
+  - memories/...                      stop-hook JSON memories + index.jsonl files
+  - index/memory_index.json           compiled keyword index (+ builder state)
+  - index/memory_summaries.json       cached summaries
+  - index/memory_minified.json        minified bodies
+  - index/coactivation_graph.json     compiled co-activation graph
+  - state/coactivation_pairs.json     raw co-activation pairs
+  - embeddings/palace.jsonl           MemPalace drawers with their embeddings
+                                      (optional; needs chromadb)
+
+Import memory-maps the bundle and writes each member into place with its
+original mtime. The builder state and summary cache go by mtime and content
+hash, so they match the unpacked files and nothing is re-read. Palace
+drawers are upserted with their stored embeddings, so nothing is re-embedded.
+Drawer source_file paths, co-activation graph nodes and pair keys are
+rewritten from the exporting machine's memory dir to this one's.
+
+Usage:
+    python memory_bundle.py export memory.bundle [--embeddings]
+    python memory_bundle.py import memory.bundle [--no-embeddings]
+    python memory_bundle.py info memory.bundle
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+
+import coactivation_graph
+import state_codec
+
+CLAUDE_DIR = os.path.join(os.path.expanduser("~"), ".claude")
+MEMORY_DIR = os.path.join(CLAUDE_DIR, "projects", "C--Users-yourname", "memory")
+PALACE_PATH = os.path.join(os.path.expanduser("~"), ".mempalace", "palace")
+PALACE_COLLECTION = "mempalace_drawers"
+
+MAGIC = b"CMBUNDLE"
+BUNDLE_VERSION = 1
+_PREFIX = struct.Struct(">8sHI")
+
+# Members under ~/.claude by logical path
+INDEX_FILES = {
+    "index/memory_index.json": "memory_index.json",
+    "index/memory_index_state.json": "memory_index_state.json",
+    "index/memory_summaries.json": "memory_summaries.json",
+    "index/memory_minified.json": "memory_minified.json",
+    "index/coactivation_graph.json": "coactivation_graph.json",
+    "state/coactivation_pairs.json": "coactivation_pairs.json",
+}
+# Members keyed by absolute memory-dir paths, rebased to this machine on import
+REBASED_MEMBERS = {
+    "index/coactivation_graph.json": coactivation_graph.rebase_graph,
+    "state/coactivation_pairs.json": coactivation_graph.rebase_pairs,
+}
+EMBEDDINGS_MEMBER = "embeddings/palace.jsonl"
+# Drawers fetched per ChromaDB call
+PALACE_BATCH = 500
+
+
+class BundleError(ValueError):
+    pass
+
+
+def locate(path, claude_dir, memory_dir):
+    """Filesystem location of a logical member path (None for embeddings)."""
+    kind, _, rest = path.partition("/")
+    if not rest or ".." in rest.split("/"):
+        raise BundleError(f"bad member path: {path}")
+    if kind == "memory" and "/" not in rest:
+        return os.path.join(memory_dir, rest)
+    if kind == "memories":
+        return os.path.join(claude_dir, "memories", *rest.split("/"))
+    if path in INDEX_FILES:
+        return os.path.join(claude_dir, INDEX_FILES[path])
+    if path == EMBEDDINGS_MEMBER:
+        return None
+    raise BundleError(f"bad member path: {path}")
+
+
+def _collect(claude_dir, memory_dir):
+    """[(logical path, filesystem path)] of everything that goes in a bundle."""
+    members = []
+    try:
+        for name in sorted(os.listdir(memory_dir)):
+            if name.endswith(".md"):
+                members.append(("memory/" + name, os.path.join(memory_dir, name)))
+    except OSError:
+        pass
+    memories = os.path.join(claude_dir, "memories")
+    for dirpath, dirnames, filenames in os.walk(memories):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith((".json", ".jsonl")) or name == ".partitioned":
+                full = os.path.join(dirpath, name)
+                members.append(("memories/" + os.path.relpath(full, memories).replace(os.sep, "/"), full))
+    for logical, name in INDEX_FILES.items():
+        full = os.path.join(claude_dir, name)
+        if os.path.exists(full):
+            members.append((logical, full))
+    return members
+
+
+def export_palace(palace_path=None):
+    """MemPalace drawers with embeddings as JSONL bytes, or None without chromadb/palace."""
+    try:
+        import chromadb
+        client = chromadb.PersistentClient(path=palace_path or PALACE_PATH)
+        col = client.get_collection(PALACE_COLLECTION)
+        lines = []
+        offset = 0
+        while True:
+            batch = col.get(include=["embeddings", "documents", "metadatas"],
+                            limit=PALACE_BATCH, offset=offset)
+            ids = batch.get("ids") or []
+            if not ids:
+                break
+            for i, drawer_id in enumerate(ids):
+                lines.append(json.dumps({
+                    "id": drawer_id,
+                    "embedding": [float(x) for x in batch["embeddings"][i]],
+                    "document": batch["documents"][i],
+                    "metadata": batch["metadatas"][i],
+                }, ensure_ascii=False))
+            offset += len(ids)
+        return ("\n".join(lines) + "\n").encode("utf-8") if lines else None
+    except Exception:
+        return None
+
+
+def import_palace(data, memory_dir, source_dir, palace_path=None):
+    """Upsert exported drawers with their stored embeddings. Returns drawer count."""
+    try:
+        import chromadb
+        client = chromadb.PersistentClient(path=palace_path or PALACE_PATH)
+        col = client.get_or_create_collection(PALACE_COLLECTION)
+    except Exception:
+        return 0
+    drawers = [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+    for d in drawers:
+        src = d["metadata"].get("source_file", "")
+        if source_dir and src.startswith(source_dir):
+            d["metadata"]["source_file"] = os.path.join(memory_dir, os.path.basename(src))
+    try:
+        for i in range(0, len(drawers), PALACE_BATCH):
+            batch = drawers[i:i + PALACE_BATCH]
+            col.upsert(ids=[d["id"] for d in batch], embeddings=[d["embedding"] for d in batch],
+                       documents=[d["document"] for d in batch], metadatas=[d["metadata"] for d in batch])
+    except Exception:
+        return 0
+    return len(drawers)
+
+
+def export_bundle(out_path, claude_dir=None, memory_dir=None, embeddings=False, palace_path=None):
+    """Write a bundle. Returns its header."""
+    claude_dir = claude_dir or CLAUDE_DIR
+    memory_dir = memory_dir or MEMORY_DIR
+    sources = [(logical, full, None) for logical, full in _collect(claude_dir, memory_dir)]
+    if embeddings:
+        palace = export_palace(palace_path)
+        if palace:
+            sources.append((EMBEDDINGS_MEMBER, None, palace))
+
+    members = []
+    blobs = []
+    offset = 0
+    for logical, full, data in sources:
+        mtime_ns = time.time_ns()
+        if data is None:
+            try:
+                with open(full, "rb") as f:
+                    data = f.read()
+                mtime_ns = os.stat(full).st_mtime_ns
+            except OSError:
+                continue
+        packed = zlib.compress(data, 6)
+        codec = "zlib" if len(packed) < len(data) else "raw"
+        blob = packed if codec == "zlib" else data
+        members.append({"path": logical, "offset": offset, "length": len(blob), "size": len(data),
+                        "codec": codec, "sha256": hashlib.sha256(data).hexdigest(), "mtime_ns": mtime_ns})
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = {"version": BUNDLE_VERSION, "created": time.time(), "memory_dir": memory_dir, "members": members}
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, BUNDLE_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, out_path)
+    return header
+
+
+class Bundle:
+    """A memory-mapped bundle: header plus lazy access to members."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise BundleError("empty bundle")
+        if len(self.map) < _PREFIX.size:
+            self.close()
+            raise BundleError("truncated bundle")
+        magic, version, header_len = _PREFIX.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise BundleError("not a memory bundle")
+        if version > BUNDLE_VERSION:
+            self.close()
+            raise BundleError(f"bundle format v{version} is newer than this tool (v{BUNDLE_VERSION})")
+        start = _PREFIX.size
+        self.header = json.loads(self.map[start:start + header_len].decode("utf-8"))
+        self.data_start = start + header_len
+
+    def read(self, member):
+        lo = self.data_start + member["offset"]
+        blob = self.map[lo:lo + member["length"]]
+        try:
+            data = zlib.decompress(blob) if member["codec"] == "zlib" else blob
+        except zlib.error:
+            raise BundleError(f"corrupt member: {member['path']}")
+        if hashlib.sha256(data).hexdigest() != member["sha256"]:
+            raise BundleError(f"checksum mismatch: {member['path']}")
+        return data
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def rebase_member(data, rebase, source_dir, memory_dir):
+    """Member bytes with source_dir paths moved under memory_dir (unchanged if undecodable)."""
+    try:
+        return state_codec.dumps(rebase(state_codec.loads(data), source_dir, memory_dir))
+    except state_codec.CodecError:
+        return data
+
+
+def import_bundle(path, claude_dir=None, memory_dir=None, embeddings=True, palace_path=None):
+    """Unpack a bundle into place. Returns {"files": n, "drawers": n}."""
+    claude_dir = claude_dir or CLAUDE_DIR
+    memory_dir = memory_dir or MEMORY_DIR
+    stats = {"files": 0, "drawers": 0}
+    with Bundle(path) as bundle:
+        source_dir = bundle.header.get("memory_dir", "")
+        for member in bundle.header["members"]:
+            dest = locate(member["path"], claude_dir, memory_dir)
+            if dest is None:
+                if embeddings:
+                    stats["drawers"] = import_palace(bundle.read(member), memory_dir, source_dir, palace_path)
+                continue
+            data = bundle.read(member)
+            rebase = REBASED_MEMBERS.get(member["path"])
+            if rebase and source_dir and source_dir != memory_dir:
+                data = rebase_member(data, rebase, source_dir, memory_dir)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            tmp = dest + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.utime(tmp, ns=(member["mtime_ns"], member["mtime_ns"]))
+            os.replace(tmp, dest)
+            stats["files"] += 1
+    return stats
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ("export", "import", "info"):
+        print(__doc__.strip())
+        sys.exit(0)
+    cmd, path = args[0], args[1]
+    try:
+        if cmd == "export":
+            header = export_bundle(path, embeddings="--embeddings" in args)
+            total = sum(m["size"] for m in header["members"])
+            print(f"[memory-bundle] {len(header['members'])} member(s), {total} bytes -> "
+                  f"{os.path.getsize(path)} bytes in {path}")
+        elif cmd == "import":
+            stats = import_bundle(path, embeddings="--no-embeddings" not in args)
+            print(f"[memory-bundle] unpacked {stats['files']} file(s), {stats['drawers']} palace drawer(s)")
+        else:
+            with Bundle(path) as bundle:
+                header = bundle.header
+            print(f"[memory-bundle] format v{header['version']}, created "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(header['created']))}")
+            for m in header["members"]:
+                print(f"  {m['size']:>9}  {m['codec']:<4}  {m['path']}")
+    except (OSError, BundleError) as e:
+        print(f"[memory-bundle] {e}")
+        sys.exit(1)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Compiled Memory Index Builder for Claude Code
+Generates the machine index memory_search.py scores against, straight from
+the topic files — MEMORY.md stays a human-written document and is never
+modified.
+
+Per topic file:
+  - name, description, type from the frontmatter (falls back to the # title)
+  - keywords = name words + the top TF-IDF terms of description + body,
+    weighed against the rest of the corpus (so words every file shares,
+    like "project" or "notes", drop out)
+  - prior, the learned usefulness multiplier from memory_priors.py (only
+    present once the batch job has scored the file)
+  - wing, via mempalace_automine.classify_wing — files are grouped into one
+    partition per wing, each with its keyword vocabulary, so the search hook
+    can route a prompt to the partitions that matter
+
+Incremental: only files whose mtime/size changed are re-read, and only
+files whose content hash changed are re-tokenized. Per-file term counts
+live in a separate state file so the compiled index loaded on every prompt
+stays small.
+
+Runs from mempalace_automine.py on Write/Edit of a memory file, or:
+    python memory_index_builder.py           # incremental
+    python memory_index_builder.py --force   # rebuild everything
+
+Exits 0 always.
+"""
+import hashlib
+import math
+import os
+import re
+import sys
+
+import state_codec
+import state_store
+
+try:
+    from memory_summaries import split_frontmatter
+except ImportError:
+    split_frontmatter = None
+
+try:
+    from mempalace_automine import classify_wing
+except ImportError:
+    classify_wing = None
+
+MEMORY_DIR = os.path.join(os.path.expanduser("~"), ".claude", "projects", "C--Users-yourname", "memory")
+COMPILED_INDEX = os.path.join(os.path.expanduser("~"), ".claude", "memory_index.json")
+BUILDER_STATE = os.path.join(os.path.expanduser("~"), ".claude", "memory_index_state.json")
+MEMORY_PRIORS = os.path.join(os.path.expanduser("~"), ".claude", "memory_priors.json")
+
+INDEX_VERSION = 2
+# Longest a build or priors update waits for another writer of the compiled index
+INDEX_LOCK_TIMEOUT = 1.0
+
+# Partition used when wing classification is unavailable
+DEFAULT_WING = "wing_infrastructure"
+
+# Salient body keywords kept per file (name words are always kept on top)
+MAX_KEYWORDS = 12
+# Description terms count this many times when ranking (it is a curated summary)
+DESCRIPTION_WEIGHT = 3
+
+STOP_WORDS = {"the", "and", "for", "are", "but", "not", "you", "all", "can", "had",
+              "her", "was", "one", "our", "out", "has", "have", "been", "some", "them",
+              "than", "its", "over", "also", "back", "into", "then", "what", "when",
+              "how", "who", "why", "where", "which", "this", "that", "with", "from",
+              "does", "did", "will", "would", "could", "should", "about", "just",
+              "like", "use", "used", "using", "need", "want", "set", "get", "let",
+              "see", "try", "make", "know", "take", "come", "give", "tell", "find",
+              "there", "their", "they", "these", "those", "each", "only", "more",
+              "http", "https", "www", "com", "md"}
+
+
+def load_json(path, default=None):
+    if default is None:
+        default = {}
+    return state_codec.load(path, default)
+
+
+def save_json(path, data):
+    state_codec.save(path, data)
+
+
+def tokenize(text):
+    return [w for w in re.findall(r"[a-z0-9]+", text.lower())
+            if len(w) >= 3 and not w.isdigit() and w not in STOP_WORDS]
+
+
+def read_topic(filepath):
+    """Parse one topic file into (meta, term_counts, content_hash)."""
+    with open(filepath, "r", encoding="utf-8", errors="replace") as f:
+        content = f.read()
+    meta, body = split_frontmatter(content) if split_frontmatter else ({}, content)
+    title = re.search(r"^#\s+(.+)$", body, re.MULTILINE)
+    stem = os.path.basename(filepath)[:-3]
+    info = {
+        "name": meta.get("name") or (title.group(1).strip() if title else stem),
+        "description": meta.get("description", ""),
+        "type": meta.get("type", ""),
+        "wing": classify_wing(os.path.basename(filepath), content) if classify_wing else DEFAULT_WING,
+    }
+    counts = {}
+    for w in tokenize(body):
+        counts[w] = counts.get(w, 0) + 1
+    for w in tokenize(info["description"]):
+        counts[w] = counts.get(w, 0) + DESCRIPTION_WEIGHT
+    h = hashlib.md5(content.encode("utf-8", errors="replace")).hexdigest()
+    return info, counts, h
+
+
+def rank_keywords(state):
+    """TF-IDF keyword selection over the stored term counts (no file I/O)."""
+    docs = state["files"]
+    n_docs = len(docs)
+    df = {}
+    for doc in docs.values():
+        for term in doc["terms"]:
+            df[term] = df.get(term, 0) + 1
+
+    keywords = {}
+    for fname, doc in docs.items():
+        total = sum(doc["terms"].values()) or 1
+        scored = []
+        for term, count in doc["terms"].items():
+            idf = math.log((n_docs + 1) / (df[term] + 1)) + 1.0
+            scored.append((count / total * idf, term))
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        name_words = tokenize(doc["name"] + " " + fname[:-3].replace("-", " ").replace("_", " "))
+        kws = list(dict.fromkeys(name_words))
+        for _, term in scored:
+            if len(kws) >= MAX_KEYWORDS + len(name_words):
+                break
+            if term not in kws:
+                kws.append(term)
+        keywords[fname] = kws
+    return keywords
+
+
+def build_index(memory_dir=None, force=False):
+    """Incrementally rebuild the compiled index. Returns number of files re-read.
+
+    Holds the compiled index's lock throughout. If another build or priors
+    update holds it past INDEX_LOCK_TIMEOUT nothing is saved, and the next
+    build picks the changes up from the unchanged builder state.
+    """
+    with state_store.locked(COMPILED_INDEX, INDEX_LOCK_TIMEOUT) as held:
+        if not held:
+            return 0
+        return _build_index(memory_dir or MEMORY_DIR, force)
+
+
+def _build_index(memory_dir, force):
+    state = load_json(BUILDER_STATE, {})
+    if state.get("version") != INDEX_VERSION or force:
+        state = {"version": INDEX_VERSION, "files": {}}
+
+    try:
+        names = sorted(os.listdir(memory_dir))
+    except OSError:
+        names = []
+
+    present = set()
+    changed = 0
+    for name in names:
+        if not name.endswith(".md") or name == "MEMORY.md":
+            continue
+        present.add(name)
+        path = os.path.join(memory_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        doc = state["files"].get(name)
+        if doc and doc["mtime"] == st.st_mtime and doc["size"] == st.st_size:
+            continue
+        try:
+            info, counts, h = read_topic(path)
+        except OSError:
+            continue
+        changed += 1
+        if doc and doc["hash"] == h:
+            doc.update(mtime=st.st_mtime, size=st.st_size)
+            continue
+        state["files"][name] = dict(info, terms=counts, hash=h, mtime=st.st_mtime, size=st.st_size)
+
+    removed = set(state["files"]) - present
+    for name in removed:
+        del state["files"][name]
+
+    if changed or removed or force or not os.path.exists(COMPILED_INDEX):
+        keywords = rank_keywords(state)
+        priors = load_json(MEMORY_PRIORS, {}).get("priors", {})
+        compiled = {"version": INDEX_VERSION, "files": {}, "partitions": {}}
+        for fname, doc in sorted(state["files"].items()):
+            compiled["files"][fname] = {
+                "name": doc["name"],
+                "description": doc["description"],
+                "type": doc["type"],
+                "wing": doc["wing"],
+                "keywords": keywords[fname],
+            }
+            if fname in priors:
+                compiled["files"][fname]["prior"] = priors[fname]
+            part = compiled["partitions"].setdefault(doc["wing"], {"files": [], "vocab": set()})
+            part["files"].append(fname)
+            part["vocab"].update(keywords[fname])
+        for part in compiled["partitions"].values():
+            part["vocab"] = sorted(part["vocab"])
+        save_json(COMPILED_INDEX, compiled)
+        save_json(BUILDER_STATE, state)
+    return changed
+
+
+def apply_priors(priors, path=None):
+    """Write learned priors into an existing compiled index (memory_priors.py).
+
+    Skipped if the index stays locked: the next build reads MEMORY_PRIORS itself.
+    """
+    path = path or COMPILED_INDEX
+    with state_store.locked(path, INDEX_LOCK_TIMEOUT) as held:
+        if not held:
+            return
+        compiled = load_json(path, {})
+        if compiled.get("version") != INDEX_VERSION:
+            return
+        for fname, info in compiled.get("files", {}).items():
+            if fname in priors:
+                info["prior"] = priors[fname]
+            else:
+                info.pop("prior", None)
+        save_json(path, compiled)
+
+
+_loaded = {}
+
+
+def _load_index(path):
+    """Read the compiled index once per process (memoized on path + mtime)."""
+    path = path or COMPILED_INDEX
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {}
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _loaded.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    index = load_json(path, {})
+    if index.get("version") != INDEX_VERSION:
+        index = {}
+    _loaded[path] = (stamp, index)
+    return index
+
+
+def load_compiled(path=None):
+    """Prompt-path loader: {filename: entry} or {} if the index was never built."""
+    return _load_index(path).get("files", {})
+
+
+def load_partitions(path=None):
+    """Prompt-path loader: {wing: {"files": [...], "vocab": [...]}}."""
+    return _load_index(path).get("partitions", {})
+
+
+def main():
+    changed = build_index(force="--force" in sys.argv[1:])
+    print(f"[memory-index] {changed} file(s) re-indexed")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
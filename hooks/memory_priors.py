@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Learned Importance Priors for Claude Code memory
+Offline batch job that learns which topic files are actually useful once
+injected, and which just cost tokens.
+
+Joins:
+  - injections  — memory_access_log.json (last injection time per file) and
+                  memory_search_result.txt (the latest prompt's injected files)
+  - usage       — Read/Edit/Write events in file_tracking.jsonl on the same
+                  file (its full path under MEMORY_DIR, not just the name)
+                  within USE_WINDOW seconds after the injection
+
+Per file it accumulates injected/used counts (memory_priors.json) and turns
+them into a smoothed usefulness ratio against the corpus-wide use rate:
+
+    rate  = (used + PRIOR_STRENGTH * base) / (injected + PRIOR_STRENGTH)
+    prior = clamp(rate / base, MIN_PRIOR, MAX_PRIOR)
+
+The priors are written into the compiled index (memory_index.json), where
+memory_search.py's score_entry multiplies them into the importance weight —
+no extra work on the prompt path.
+
+Runs from session_end.py (before file_tracking.jsonl is pruned), or:
+    python memory_priors.py
+
+Exits 0 always.
+"""
+import json
+import os
+import sys
+import time
+
+import state_codec
+
+try:
+    import memory_index_builder
+except ImportError:
+    memory_index_builder = None
+
+RESULT_FILE = os.path.join(os.path.expanduser("~"), ".claude", "memory_search_result.txt")
+ACCESS_LOG = os.path.join(os.path.expanduser("~"), ".claude", "memory_access_log.json")
+FILE_TRACKING = os.path.join(os.path.expanduser("~"), ".claude", "file_tracking.jsonl")
+MEMORY_PRIORS = os.path.join(os.path.expanduser("~"), ".claude", "memory_priors.json")
+# UPDATE for your username (same pattern as memory_search.py)
+MEMORY_DIR = os.path.join(os.path.expanduser("~"), ".claude", "projects", "C--Users-yourname", "memory")
+
+PRIORS_VERSION = 1
+
+# A Read/Edit/Write this soon after an injection counts as using it
+USE_WINDOW = 600
+# Pseudo-observations pulling sparse files toward the corpus rate
+PRIOR_STRENGTH = 5
+# Assumed use rate until enough injections have been observed
+DEFAULT_BASE_RATE = 0.3
+MIN_OBSERVATIONS = 20
+# Multiplier range applied to the importance weight
+MIN_PRIOR = 0.5
+MAX_PRIOR = 1.5
+
+USE_TOOLS = {"Read", "Edit", "Write"}
+
+
+def load_json(path, default=None):
+    if default is None:
+        default = {}
+    return state_codec.load(path, default)
+
+
+def save_json(path, data):
+    state_codec.save(path, data)
+
+
+def load_state():
+    state = load_json(MEMORY_PRIORS, {})
+    if state.get("version") != PRIORS_VERSION:
+        state = {"version": PRIORS_VERSION, "files": {}, "priors": {}}
+    return state
+
+
+def collect_injections():
+    """Latest known injection per topic file: {filename: timestamp}."""
+    injections = {}
+    for fname, ts in load_json(ACCESS_LOG).items():
+        if fname.endswith(".md") and isinstance(ts, (int, float)):
+            injections[fname] = ts
+    try:
+        ts = os.path.getmtime(RESULT_FILE)
+        with open(RESULT_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.strip().split("|")
+                if len(parts) >= 3:
+                    fname = os.path.basename(parts[1].replace(".warm", ""))
+                    injections[fname] = max(injections.get(fname, 0), ts)
+    except OSError:
+        pass
+    return injections
+
+
+def collect_uses(filenames):
+    """Timestamps of Read/Edit/Write events per topic file: {filename: [ts, ...]}.
+
+    An event counts only when its path is the topic file itself, so editing
+    some repo's README.md is not a use of a README.md memory.
+    """
+    memory_dir = os.path.normcase(os.path.normpath(MEMORY_DIR))
+    uses = {}
+    try:
+        with open(FILE_TRACKING, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if event.get("tool") not in USE_TOOLS:
+                    continue
+                path = os.path.normpath(event.get("file_path", ""))
+                fname = os.path.basename(path)
+                if fname in filenames and os.path.normcase(os.path.dirname(path)) == memory_dir:
+                    uses.setdefault(fname, []).append(event.get("timestamp", 0))
+    except OSError:
+        pass
+    return uses
+
+
+def compute_priors(files):
+    """Smoothed usefulness multiplier per file from the accumulated counts."""
+    injected = sum(doc["injected"] for doc in files.values())
+    used = sum(doc["used"] for doc in files.values())
+    base = used / injected if injected >= MIN_OBSERVATIONS and used else DEFAULT_BASE_RATE
+    priors = {}
+    for fname, doc in files.items():
+        rate = (doc["used"] + PRIOR_STRENGTH * base) / (doc["injected"] + PRIOR_STRENGTH)
+        priors[fname] = round(max(MIN_PRIOR, min(MAX_PRIOR, rate / base)), 3)
+    return priors
+
+
+def update_priors(now=None):
+    """Fold new injections into the counts and publish priors. Returns the priors."""
+    now = now or time.time()
+    state = load_state()
+    injections = collect_injections()
+    uses = collect_uses(set(injections))
+
+    for fname, ts in injections.items():
+        doc = state["files"].setdefault(fname, {"injected": 0, "used": 0, "last_injection": 0})
+        # Each injection is counted once, after its use window has closed
+        if ts <= doc["last_injection"] + 1 or now - ts < USE_WINDOW:
+            continue
+        doc["injected"] += 1
+        if any(ts <= t <= ts + USE_WINDOW for t in uses.get(fname, ())):
+            doc["used"] += 1
+        doc["last_injection"] = ts
+
+    state["priors"] = compute_priors(state["files"])
+    save_json(MEMORY_PRIORS, state)
+    if memory_index_builder is not None:
+        memory_index_builder.apply_priors(state["priors"])
+    return state["priors"]
+
+
+def main():
+    priors = update_priors()
+    low = sorted((p, f) for f, p in priors.items())[:5]
+    print(f"[memory-priors] {len(priors)} file(s) scored")
+    for p, f in low:
+        print(f"  {p:.2f}  {f}")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
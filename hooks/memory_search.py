@@ -6,36 +6,140 @@ keyword index and injects relevant topic files into Claude's context.
 
 Scoring combines FIVE signals:
   1. Keyword match score (0-15+) — exact match=3, partial=2, name=2
-  2. Importance weight (1-10, default 5) — set per entry in MEMORY.md
+  2. Importance weight (1-10, default 5) — set per entry in MEMORY.md, times
+     the learned usefulness prior from memory_priors.py
   3. Recency boost — files accessed recently score higher
   4. Attention score (0.0-1.0) — decays 15% per turn, boosted by file access
   5. Co-activation boost — files frequently accessed together warm each other
+     (multi-hop, via the precomputed spreading-activation vectors in
+     coactivation_graph.json; falls back to one-hop pairs if it's missing)
+
+Attention is per session (attention_state.py): the 15% per-prompt decay and
+the boosts apply to this session's overlay, on top of a shared baseline that
+decays by wall-clock time — so a busy session no longer cools another's
+HOT files.
 
 Injection tiers (from claude-cognitive):
   - HOT (attention > 0.8): Full file content injected
   - WARM (attention 0.25-0.8): First section only (up to first ## heading)
   - COLD (attention < 0.25): Skipped entirely
 
+When memory_summaries.py has cached summaries for a large file, each tier
+degrades to the long / short / headline summary to stay within a per-prompt
+character budget (no summarization happens on the prompt path).
+
+Topic files moved to the cold tier (memory_archive.py) are restored
+transparently when their MEMORY.md entry makes the top results.
+
+Retrieval is partitioned by MemPalace wing (memory_index_builder.py stores
+one keyword vocabulary per wing). A cheap router picks the wings the prompt
+points at; only those entries are scored and only those wings are queried
+in ChromaDB. Prompts that hit no partition fall back to searching all.
+Stop-hook JSON memories are read from their per-category index partitions.
+
+Prompts with a time phrase ("yesterday", "last tuesday", "3 days ago";
+"today" and weekdays only with a qualifier) also query the session
+history (session_history.py) for that window.
+
+PostToolUse leaves a prefetch list (memory_prefetch.json) of memory files the
+co-activation graph links to whatever the agent is touching. Those files
+join the candidates with their co-activation boost, and their WARM section
+comes ready-made from the list instead of being re-read.
+
+Injected bodies pass through context_minify.py: frontmatter trimmed,
+whitespace collapsed, and lines repeated across the injected files replaced
+by back-references.
+
+Team memory: with MEMORY_SERVER_URL set (see memory_server.py), the prompt
+is also sent to the shared server in a background thread while local
+scoring runs. Remote hits are merged with local ones by score (top 3
+overall, local copy wins on the same file) and injected as [TeamMemory]
+blocks. The server gets REMOTE_TIMEOUT seconds; if it is slow or down the
+prompt proceeds with local results only.
+
+Bookkeeping — memory_search_result.txt, .warm files, the access log, the
+minify cache and the attention saves — is queued on a write_behind.Batch
+and applied after stdout is released, so the prompt does not wait on it.
+
 Exits 0 always (never blocks the prompt).
 """
 import json
 import sys
 import os
 import re
+import threading
 import time
 from pathlib import Path
 
+import hook_metrics
+import state_codec
+import state_store
+import write_behind
+
+try:
+    import hook_recorder
+except ImportError:
+    hook_recorder = None
+
+try:
+    import memory_summaries
+except ImportError:
+    memory_summaries = None
+
+try:
+    import context_minify
+except ImportError:
+    context_minify = None
+
+try:
+    import memory_archive
+except ImportError:
+    memory_archive = None
+
+try:
+    import memory_index_builder
+except ImportError:
+    memory_index_builder = None
+
+try:
+    import coactivation_graph
+except ImportError:
+    coactivation_graph = None
+
+try:
+    import attention_state
+except ImportError:
+    attention_state = None
+
+try:
+    import session_history
+except ImportError:
+    session_history = None
+
+try:
+    from mempalace_automine import classify_wing
+except ImportError:
+    classify_wing = None
+
 MEMORY_DIR = os.path.join(os.path.expanduser("~"), ".claude", "projects", "C--Users-yourname", "memory")
 MEMORY_INDEX = os.path.join(MEMORY_DIR, "MEMORY.md")
 RESULT_FILE = os.path.join(os.path.expanduser("~"), ".claude", "memory_search_result.txt")
 ACCESS_LOG = os.path.join(os.path.expanduser("~"), ".claude", "memory_access_log.json")
 ATTN_STATE = os.path.join(os.path.expanduser("~"), ".claude", "attn_state.json")
+ATTN_SESSIONS_DIR = os.path.join(os.path.expanduser("~"), ".claude", "attn_sessions")
 COACTIVATION_LOG = os.path.join(os.path.expanduser("~"), ".claude", "coactivation_pairs.json")
+COACTIVATION_GRAPH = os.path.join(os.path.expanduser("~"), ".claude", "coactivation_graph.json")
+SUMMARY_CACHE = os.path.join(os.path.expanduser("~"), ".claude", "memory_summaries.json")
+MINIFY_CACHE = os.path.join(os.path.expanduser("~"), ".claude", "memory_minified.json")
+COMPILED_INDEX = os.path.join(os.path.expanduser("~"), ".claude", "memory_index.json")
+PREFETCH_FILE = os.path.join(os.path.expanduser("~"), ".claude", "memory_prefetch.json")
 
 # Stop-hook JSON memories (constraint/decision entries)
 JSON_MEMORIES_INDEX = os.path.join(os.path.expanduser("~"), ".claude", "memories", "index.jsonl")
 # Only surface these categories (most actionable for retrieval)
 JSON_SEARCH_CATEGORIES = {"constraint", "decision"}
+# Written by stop_hook.py once index.jsonl is split into <category>/index.jsonl
+JSON_PARTITION_MARKER = os.path.join(os.path.dirname(JSON_MEMORIES_INDEX), ".partitioned")
 # Search all entries (no time limit — older constraints/decisions remain relevant)
 
 # MemPalace fallback config
@@ -51,11 +155,55 @@ DECAY_RATE = 0.15
 HOT_THRESHOLD = 0.8
 WARM_THRESHOLD = 0.25
 
+# Total characters of topic-file content injected per prompt (only enforced
+# for files that have cached summaries — see memory_summaries.py)
+INJECT_CHAR_BUDGET = 12000
+# Keyword score at which a large COLD-tier file is still preferred in full
+STRONG_SCORE = 12
+
+# Prompt words that point at a wing even when no partition keyword matches
+PARTITION_HINTS = {
+    "wing_personal": {"personal", "profile", "myself", "background"},
+    "wing_feedback": {"prefer", "preference", "preferences", "feedback", "convention",
+                      "conventions", "style", "always", "never", "correction"},
+    "wing_sessions": {"session", "sessions", "yesterday", "earlier", "resume",
+                      "continue", "last", "previous"},
+    "wing_meta": {"memory", "memories", "hook", "hooks", "workflow", "decay"},
+}
+
+# Session-history records surfaced for a prompt with a time phrase
+HISTORY_RESULTS = 2
+
+# Prefetch hints older than this are ignored (seconds)
+PREFETCH_TTL = 900
+
+# Shared team memory server (memory_server.py); empty disables client mode
+MEMORY_SERVER_URL = os.environ.get("MEMORY_SERVER_URL", "").rstrip("/")
+MEMORY_SERVER_TOKEN = os.environ.get("MEMORY_SERVER_TOKEN", "")
+# Seconds the prompt waits for the server before going local-only
+REMOTE_TIMEOUT = 0.8
+
 # Significant short words preserved in keyword matching (not filtered by len>=3)
 SIGNIFICANT_SHORT_KW = {"x", "ai", "3d", "db", "ui", "ci", "cd", "ip", "os", "vm",
                         "tts", "gpu", "api", "cli", "dns", "ssl", "ssh", "stl", "csv",
                         "pdf", "llm", "rtx", "cnc", "pop", "mac", "mcp", "aws"}
 
+# Common English stop words that add noise to keyword matching
+PROMPT_STOP_WORDS = {"the", "and", "for", "are", "but", "not", "you", "all", "can", "had",
+                     "her", "was", "one", "our", "out", "has", "have", "been", "some", "them",
+                     "than", "its", "over", "also", "back", "into", "then", "what", "when",
+                     "how", "who", "why", "where", "which", "this", "that", "with", "from",
+                     "does", "did", "will", "would", "could", "should", "about", "just",
+                     "like", "use", "used", "using", "need", "want", "set", "get", "let",
+                     "see", "try", "make", "know", "take", "come", "give", "tell", "find"}
+
+# URL patterns -> keywords injected into the query
+URL_KEYWORD_MAP = {
+    r"x\.com/|twitter\.com/": {"x-research", "twitter", "tweet", "bookmarks"},
+    r"github\.com/": {"github", "repo", "pull", "issue"},
+    r"reddit\.com/": {"reddit", "research"},
+}
+
 # Recency decay windows
 RECENCY_WINDOWS = [
     (3600, 3.0),       # Last hour: +3
@@ -67,24 +215,11 @@ RECENCY_WINDOWS = [
 def load_json(path, default=None):
     if default is None:
         default = {}
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError, OSError):
-        return default
+    return state_codec.load(path, default)
 
 
 def save_json(path, data):
-    tmp = path + ".tmp"
-    try:
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-        os.replace(tmp, path)
-    except OSError:
-        try:
-            os.remove(tmp)
-        except OSError:
-            pass
+    state_codec.save(path, data)
 
 
 def recency_score(filename, access_log):
@@ -98,23 +233,24 @@ def recency_score(filename, access_log):
     return 0
 
 
-def get_attention_score(filename, attn_state):
+def get_attention_score(filename, attn_state, memory_dir=None):
     """Get the current attention score for a file (0.0-1.0)."""
     scores = attn_state.get("scores", {})
     # Check both full path and just the filename
-    full_path = os.path.join(MEMORY_DIR, filename)
+    full_path = os.path.join(memory_dir or MEMORY_DIR, filename)
     for key in (filename, full_path):
         if key in scores:
             return scores[key].get("score", 0.0)
     return 0.0
 
 
-def get_coactivation_boost(filename, matched_files, pairs):
+def get_coactivation_boost(filename, matched_files, pairs, memory_dir=None):
     """Get co-activation boost from files that are already matched."""
     boost = 0.0
-    full_path = os.path.join(MEMORY_DIR, filename)
+    memory_dir = memory_dir or MEMORY_DIR
+    full_path = os.path.join(memory_dir, filename)
     for other_file in matched_files:
-        other_full = os.path.join(MEMORY_DIR, other_file)
+        other_full = os.path.join(memory_dir, other_file)
         # Check both orderings of the pair key
         for a, b in [(full_path, other_full), (filename, other_file)]:
             key_ab = f"{a}||{b}"
@@ -129,8 +265,21 @@ def get_coactivation_boost(filename, matched_files, pairs):
     return boost
 
 
+def graph_coactivation_boosts(matched_files, graph, memory_dir=None):
+    """Multi-hop co-activation boosts from the precomputed graph: {node name: boost}.
+
+    Each preliminary match contributes its spreading-activation vector under
+    either key form post_tool_use may have recorded (full path or filename).
+    """
+    sources = []
+    for other_file in matched_files:
+        sources.append(os.path.join(memory_dir or MEMORY_DIR, other_file))
+        sources.append(other_file)
+    return coactivation_graph.spread_boosts(graph, sources)
+
+
 def decay_all_scores(attn_state):
-    """Apply 15% decay to all attention scores."""
+    """Apply 15% decay to all attention scores (recorded for the locked save)."""
     scores = attn_state.get("scores", {})
     for key in list(scores.keys()):
         old_score = scores[key].get("score", 0.0)
@@ -141,9 +290,45 @@ def decay_all_scores(attn_state):
         else:
             scores[key]["score"] = round(new_score, 4)
     attn_state["scores"] = scores
+    attn_state["decay"] = attn_state.get("decay", 1.0) * (1 - DECAY_RATE)
     return attn_state
 
 
+def load_attention(session_id):
+    """(attn_state view, baseline, overlay) for this prompt, already decayed.
+
+    Without a session id (or attention_state.py) this is the legacy single
+    map: overlay is None and the whole map decays per prompt.
+    """
+    if attention_state is None or not session_id:
+        attn_state = decay_all_scores(state_store.load(ATTN_STATE, {"scores": {}, "last_update": 0}))
+        return attn_state, attn_state, None
+    baseline = attention_state.load_baseline(ATTN_STATE)
+    overlay = decay_all_scores(attention_state.load_overlay(session_id, ATTN_SESSIONS_DIR))
+    return attention_state.merged(baseline, overlay), baseline, overlay
+
+
+def save_attention(attn_state, baseline, overlay, session_id, batch=None):
+    """Persist the overlay every prompt; the shared baseline only when a boost raised it.
+
+    Only this prompt's decay and boosts are written, merged under the state
+    lock (state_store.py) with whatever other hooks saved meanwhile. With a
+    write_behind.Batch the saves are queued on it instead of done now.
+    """
+    deferred = batch is not None
+    batch = batch if deferred else write_behind.Batch()
+    if overlay is None:
+        batch.update(ATTN_STATE, "attention", decay=attn_state.pop("decay", None),
+                     boosts=attn_state.pop("boosts", {}), now=time.time())
+    else:
+        batch.call("attention_state", "save_overlay", session_id=session_id,
+                   state=overlay, sessions_dir=ATTN_SESSIONS_DIR)
+        if baseline.get("dirty"):
+            batch.call("attention_state", "save_baseline", state=baseline, path=ATTN_STATE)
+    if not deferred:
+        write_behind.run_ops(batch.ops)
+
+
 def parse_index(index_path):
     """Parse the Project Index section of MEMORY.md into entries."""
     entries = []
@@ -210,19 +395,112 @@ def parse_index(index_path):
             "importance": 5,
             "keywords": all_keywords,
             "file": filename,
+            "source": "dash",
         })
         matched_files.add(filename)
 
     return entries
 
 
-def score_entry(entry, words, access_log, attn_state, coact_pairs, already_matched):
-    """Score an entry against the user's message.
+def load_entries(index_path, compiled_path=None):
+    """MEMORY.md entries merged with the compiled machine index.
 
-    Final score = (keyword_score * importance_mult) + recency + attention + coactivation
+    Table rows keep their hand-curated keywords. Dash-list rows swap their
+    every-description-word keywords for the compiled TF-IDF keywords (plus
+    their title words), and topic files MEMORY.md doesn't mention at all
+    are added from the compiled index. See memory_index_builder.py.
+    """
+    entries = parse_index(index_path)
+    if memory_index_builder is None:
+        return entries
+    compiled = memory_index_builder.load_compiled(compiled_path or COMPILED_INDEX)
+    if not compiled:
+        return entries
+
+    listed = set()
+    for entry in entries:
+        listed.add(entry["file"])
+        info = compiled.get(entry["file"])
+        if info and entry.get("source") == "dash":
+            title_words = [w.lower() for w in re.findall(r"[a-zA-Z0-9_-]+", entry["name"])
+                           if len(w) >= 3 or w.lower() in SIGNIFICANT_SHORT_KW]
+            entry["keywords"] = list(dict.fromkeys(info["keywords"] + title_words))
+        if info:
+            entry["wing"] = info.get("wing")
+            if "prior" in info:
+                entry["prior"] = info["prior"]
+
+    for fname, info in sorted(compiled.items()):
+        if fname in listed:
+            continue
+        entries.append({
+            "name": info["name"],
+            "status": "Active",
+            "importance": 5,
+            "keywords": list(info["keywords"]),
+            "file": fname,
+            "source": "compiled",
+            "wing": info.get("wing"),
+            "prior": info.get("prior", 1.0),
+        })
+    return entries
+
+
+def entry_wing(entry):
+    """Wing of an entry: compiled wing, else classified from the filename."""
+    if entry.get("wing"):
+        return entry["wing"]
+    if classify_wing is None:
+        return None
+    entry["wing"] = classify_wing(entry["file"])
+    return entry["wing"]
+
+
+def route_partitions(words, entries, partitions):
+    """Pick the wings a prompt is likely about. Returns a set, or None for "all".
+
+    A wing is selected when a prompt word is in its keyword vocabulary (the
+    compiled partition vocab plus hand-curated keywords of MEMORY.md rows)
+    or in its PARTITION_HINTS. Only set lookups — no per-entry scoring.
     """
-    keyword_score = 0
-    match_count = 0  # Track how many distinct query words match
+    vocab = {wing: set(part.get("vocab", ())) for wing, part in partitions.items()}
+    for entry in entries:
+        if entry.get("source") != "compiled":
+            wing = entry_wing(entry)
+            if wing:
+                vocab.setdefault(wing, set()).update(entry["keywords"])
+    if len(vocab) < 2:
+        return None
+
+    selected = set()
+    for wing, terms in vocab.items():
+        if words & terms or words & PARTITION_HINTS.get(wing, set()):
+            selected.add(wing)
+    return selected or None
+
+
+def select_candidates(entries, wings, access_log, attn_state, keep=(), words=None):
+    """Entries in the routed wings, plus anything still warm, recently used, or in `keep`.
+
+    Routing matches whole words only, so with `words` given and no routed
+    entry matching one by score_entry's rules (partial keywords, name,
+    filename), the routing is dropped and every entry is scored.
+    """
+    if wings is None:
+        return entries
+    routed = [e for e in entries if entry_wing(e) in wings or entry_wing(e) is None]
+    if words is not None and not any(keyword_score(e, words)[0] for e in routed):
+        return entries
+    return [e for e in entries
+            if entry_wing(e) in wings or entry_wing(e) is None or e["file"] in keep
+            or get_attention_score(e["file"], attn_state) >= WARM_THRESHOLD
+            or recency_score(e["file"], access_log) > 0]
+
+
+def keyword_score(entry, words):
+    """(keyword score, distinct matching words) of an entry: keywords, name and filename."""
+    score = 0
+    match_count = 0
     name_lower = entry["name"].lower()
     keywords = entry["keywords"]
     file_lower = entry["file"].lower().replace(".md", "").replace("-", " ").replace("_", " ")
@@ -230,35 +508,126 @@ def score_entry(entry, words, access_log, attn_state, coact_pairs, already_match
     for word in words:
         word_matched = False
         if word in keywords:
-            keyword_score += 3
+            score += 3
             word_matched = True
         elif any(word in kw or kw in word for kw in keywords):
-            keyword_score += 2
+            score += 2
             word_matched = True
         if word in name_lower:
-            keyword_score += 2
+            score += 2
             word_matched = True
         # Check if word matches part of the filename
         if len(word) >= 4 and word in file_lower:
-            keyword_score += 2
+            score += 2
             word_matched = True
         if word_matched:
             match_count += 1
+    return score, match_count
+
+
+def score_entry(entry, words, access_log, attn_state, coact_pairs, already_matched, coact_boosts=None,
+                memory_dir=None):
+    """Score an entry against the user's message.
+
+    Final score = (keyword_score * importance_mult) + recency + attention + coactivation
+
+    importance_mult includes the learned usefulness prior from the compiled
+    index (memory_priors.py), 1.0 when the file has not been scored yet.
+
+    coact_boosts, when given, is a precomputed {node name: boost} map from
+    graph_coactivation_boosts() and replaces the per-pair lookup. memory_dir
+    (default MEMORY_DIR) is the root full-path keys are resolved against.
+    """
+    # match_count: how many distinct query words match
+    score, match_count = keyword_score(entry, words)
 
     # Multi-word match bonus: more distinct matching words = stronger signal
     if match_count >= 3:
-        keyword_score += (match_count - 2) * 2  # +2 per word beyond 2 matches
+        score += (match_count - 2) * 2  # +2 per word beyond 2 matches
 
-    importance_mult = entry["importance"] / 5.0
-    weighted_keyword = keyword_score * importance_mult
+    importance_mult = entry["importance"] / 5.0 * entry.get("prior", 1.0)
+    weighted_keyword = score * importance_mult
     recency = recency_score(entry["file"], access_log)
-    attention = get_attention_score(entry["file"], attn_state) * 3.0  # Scale to match other signals
-    coact = get_coactivation_boost(entry["file"], already_matched, coact_pairs)
+    attention = get_attention_score(entry["file"], attn_state, memory_dir) * 3.0  # Scale to match other signals
+    if coact_boosts is not None:
+        coact = (coact_boosts.get(entry["file"], 0.0)
+                 + coact_boosts.get(os.path.join(memory_dir or MEMORY_DIR, entry["file"]), 0.0))
+    else:
+        coact = get_coactivation_boost(entry["file"], already_matched, coact_pairs, memory_dir)
 
     final_score = weighted_keyword + recency + attention + coact
     return final_score
 
 
+def load_prefetch(session_id="", path=None, now=None):
+    """This session's fresh PostToolUse prefetch hints: {filename: {boost, mtime, size, section, ...}}."""
+    hints = state_store.load(path or PREFETCH_FILE).get(session_id)
+    if not isinstance(hints, dict) or (now or time.time()) - hints.get("ts", 0) > PREFETCH_TTL:
+        return {}
+    return hints.get("files", {})
+
+
+def prefetched_section(full_path, hint):
+    """The hint's pre-extracted section, if the file is unchanged since it was taken."""
+    if not hint:
+        return None
+    try:
+        st = os.stat(full_path)
+    except OSError:
+        return None
+    if st.st_mtime != hint.get("mtime") or st.st_size != hint.get("size"):
+        return None
+    return hint.get("section") or None
+
+
+def prompt_words(prompt):
+    """Query words of a prompt: content words, hyphenated compounds, URL-implied keywords."""
+    prompt_lower = prompt.lower()
+    words = set(re.findall(r"[a-z0-9]+", prompt_lower))
+    words = {w for w in words if (len(w) >= 3 or w in SIGNIFICANT_SHORT_KW) and w not in PROMPT_STOP_WORDS}
+    # Also add hyphenated compounds from the original prompt (e.g., "x-research", "pipeline-consolidation")
+    compounds = set(re.findall(r"[a-z0-9]+-[a-z0-9]+(?:-[a-z0-9]+)*", prompt_lower))
+    words.update(compounds)
+
+    # URL pattern detection — inject domain-specific keywords so memory matches reliably
+    # This ensures that e.g. an x.com URL always surfaces x-research-setup.md
+    for url_pattern, inject_kw in URL_KEYWORD_MAP.items():
+        if re.search(url_pattern, prompt_lower):
+            words.update(inject_kw)
+    return words
+
+
+def rank_entries(entries, words, access_log, attn_state, graph=None, coact_pairs=None, bonus=None,
+                 memory_dir=None):
+    """Two-pass scoring. Returns [(score, entry)] with score >= 4, best first.
+
+    Pass 1 scores keywords without co-activation; its top 5 matches then
+    seed the co-activation boosts of pass 2. bonus adds a flat per-file
+    amount (prefetch hints).
+    """
+    # Pass 1: score without co-activation
+    preliminary = []
+    for entry in entries:
+        s = score_entry(entry, words, access_log, attn_state, {}, [], memory_dir=memory_dir)
+        if s >= 2:  # Lower threshold for preliminary pass
+            preliminary.append((s, entry))
+    preliminary.sort(key=lambda x: x[0], reverse=True)
+    already_matched = [e["file"] for _, e in preliminary[:5]]
+
+    # Pass 2: re-score with co-activation from preliminary matches
+    coact_boosts = graph_coactivation_boosts(already_matched, graph, memory_dir) if graph else None
+    scored = []
+    for entry in entries:
+        s = score_entry(entry, words, access_log, attn_state, coact_pairs or {}, already_matched, coact_boosts,
+                        memory_dir)
+        if bonus and entry["file"] in bonus:
+            s += bonus[entry["file"]]
+        if s >= 4:
+            scored.append((s, entry))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return scored
+
+
 def extract_first_section(filepath, max_chars=2000):
     """For WARM tier: extract content up to the first ## heading (or max_chars)."""
     try:
@@ -282,18 +651,114 @@ def extract_first_section(filepath, max_chars=2000):
     return section[:max_chars]
 
 
+def choose_injection(full_path, score, attention, summary_cache, remaining, hint=None):
+    """Pick how much of a topic file to inject. Returns (level, text, cost).
+
+    Without a cached summary this is the classic tier rule: HOT and COLD get
+    the full file, WARM the first section. With one, the tier's preferred
+    level degrades through long -> short -> headline summaries until it fits
+    the remaining character budget. text is None for "full". A prefetch
+    hint supplies the first section without reading the file.
+    """
+    if attention >= HOT_THRESHOLD:
+        ladder = ["full", "long", "short", "headline"]
+    elif attention >= WARM_THRESHOLD:
+        ladder = ["section", "short", "headline"]
+    elif score >= STRONG_SCORE:
+        ladder = ["full", "long", "short", "headline"]
+    else:
+        ladder = ["long", "full", "short", "headline"]
+
+    summarized = (memory_summaries is not None and summary_cache
+                  and memory_summaries.get_summary(full_path, "headline", summary_cache) is not None)
+    if not summarized:
+        if ladder[0] == "section":
+            section = prefetched_section(full_path, hint) or extract_first_section(full_path)
+            if section:
+                return "section", section, len(section)
+        try:
+            size = os.path.getsize(full_path)
+        except OSError:
+            size = 0
+        return "full", None, size
+
+    choice = None
+    for level in ladder:
+        if level == "full":
+            try:
+                text, cost = None, os.path.getsize(full_path)
+            except OSError:
+                continue
+        elif level == "section":
+            text = prefetched_section(full_path, hint) or extract_first_section(full_path)
+            cost = len(text)
+        else:
+            text = memory_summaries.get_summary(full_path, level, summary_cache)
+            cost = len(text) if text else 0
+        if level != "full" and not text:
+            continue
+        choice = (level, text, cost)
+        if cost <= remaining:
+            break
+    return choice or ("full", None, 0)
+
+
+def render_body(label, content, deduper, minify_cache):
+    """Output stage: minify a body and back-reference lines already injected."""
+    if context_minify is None or deduper is None:
+        return content
+    known = len(minify_cache["bodies"]) if minify_cache else 0
+    body = context_minify.minify(content, minify_cache)
+    if minify_cache:
+        hook_metrics.cache("minify", len(minify_cache["bodies"]) == known)
+    return deduper.apply(body, label)
+
+
+def emit(data):
+    """Write bytes to stdout (Claude Code injects them), counted for hook_metrics."""
+    sys.stdout.buffer.write(data)
+    hook_metrics.add_bytes(len(data))
+
+
+def json_index_paths():
+    """Index files to scan: the category partitions if present, else the consolidated log."""
+    if os.path.exists(JSON_PARTITION_MARKER):
+        mem_dir = os.path.dirname(JSON_MEMORIES_INDEX)
+        return [os.path.join(mem_dir, cat, "index.jsonl") for cat in sorted(JSON_SEARCH_CATEGORIES)]
+    return [JSON_MEMORIES_INDEX]
+
+
 def search_json_memories(words, max_results=2):
     """Search stop-hook JSON memories (constraint/decision) for keyword matches.
 
     Returns list of (score, category, content, timestamp) tuples.
     Only searches recent entries from actionable categories.
     """
-    if not os.path.exists(JSON_MEMORIES_INDEX):
-        return []
+    results = []
+    for index_path in json_index_paths():
+        if os.path.exists(index_path):
+            results.extend(_search_json_index(index_path, words))
+
+    results.sort(key=lambda x: x[0], reverse=True)
+    # Deduplicate by content similarity (take highest-scoring of similar entries)
+    seen_snippets = set()
+    deduped = []
+    for score, cat, content, ts in results:
+        # Use first 100 chars as dedup key
+        key = content[:100].lower().strip()
+        if key not in seen_snippets:
+            seen_snippets.add(key)
+            deduped.append((score, cat, content, ts))
+        if len(deduped) >= max_results:
+            break
 
+    return deduped
+
+
+def _search_json_index(index_path, words):
     results = []
     try:
-        with open(JSON_MEMORIES_INDEX, "r", encoding="utf-8") as f:
+        with open(index_path, "r", encoding="utf-8") as f:
             for line in f:
                 line = line.strip()
                 if not line:
@@ -329,36 +794,50 @@ def search_json_memories(words, max_results=2):
                     results.append((score, cat, entry.get("content", ""), entry.get("timestamp", "")))
     except OSError:
         return []
+    return results
 
-    results.sort(key=lambda x: x[0], reverse=True)
-    # Deduplicate by content similarity (take highest-scoring of similar entries)
-    seen_snippets = set()
-    deduped = []
-    for score, cat, content, ts in results:
-        # Use first 100 chars as dedup key
-        key = content[:100].lower().strip()
-        if key not in seen_snippets:
-            seen_snippets.add(key)
-            deduped.append((score, cat, content, ts))
-        if len(deduped) >= max_results:
-            break
 
-    return deduped
+def wing_filter(wings):
+    """ChromaDB `where` clause restricting a query to the routed wings."""
+    if not wings:
+        return None
+    if len(wings) == 1:
+        return {"wing": next(iter(wings))}
+    return {"wing": {"$in": sorted(wings)}}
+
+
+def search_session_history(prompt, words, cwd="", limit=HISTORY_RESULTS):
+    """Session-history records for a prompt that names a time window, else []."""
+    if session_history is None:
+        return []
+    window = session_history.parse_time_phrase(prompt)
+    if window is None:
+        return []
+    try:
+        return session_history.query(window[0], window[1], words, cwd=cwd, limit=limit)
+    except (OSError, ValueError, KeyError):
+        return []
 
 
-def mempalace_semantic_search(query, limit=3):
+def mempalace_semantic_search(query, limit=3, wings=None):
     """Fallback: semantic search via MemPalace ChromaDB when keyword scoring is weak.
 
+    wings restricts the query to those partitions (None searches every wing).
     Returns list of (score, source_file, wing, room, content_preview) tuples.
     """
     try:
         import chromadb
         client = chromadb.PersistentClient(path=PALACE_PATH)
         col = client.get_collection(PALACE_COLLECTION)
+        kwargs = {}
+        where = wing_filter(wings)
+        if where:
+            kwargs["where"] = where
         results = col.query(
             query_texts=[query],
             n_results=limit * 2,  # Over-fetch to filter
             include=["metadatas", "documents", "distances"],
+            **kwargs,
         )
     except Exception:
         return []
@@ -396,7 +875,57 @@ def mempalace_semantic_search(query, limit=3):
     return hits
 
 
+def remote_search(prompt, limit=3, url=None, timeout=None):
+    """Query the team memory server. Returns its result dicts, or [] on any failure."""
+    url = url or MEMORY_SERVER_URL
+    if not url:
+        return []
+    import http.client
+    import urllib.request
+    headers = {"Content-Type": "application/json"}
+    if MEMORY_SERVER_TOKEN:
+        headers["X-Memory-Token"] = MEMORY_SERVER_TOKEN
+    body = json.dumps({"query": prompt, "limit": limit}).encode("utf-8")
+    try:
+        req = urllib.request.Request(url + "/search", data=body, headers=headers, method="POST")
+        with urllib.request.urlopen(req, timeout=timeout or REMOTE_TIMEOUT) as resp:
+            results = json.loads(resp.read().decode("utf-8")).get("results", [])
+    except (OSError, ValueError, AttributeError, http.client.HTTPException):
+        return []
+    return [r for r in results if isinstance(r, dict) and r.get("file") and r.get("content")
+            and isinstance(r.get("score", 0), (int, float))]
+
+
+def start_remote_search(prompt, limit=3):
+    """Run remote_search in a daemon thread. Returns a function that waits at
+    most REMOTE_TIMEOUT (from the start) and yields the hits, or []."""
+    if not MEMORY_SERVER_URL:
+        return lambda: []
+    box = []
+    deadline = time.time() + REMOTE_TIMEOUT
+    worker = threading.Thread(target=lambda: box.extend(remote_search(prompt, limit)), daemon=True)
+    worker.start()
+
+    def result():
+        worker.join(max(0.0, deadline - time.time()))
+        return [] if worker.is_alive() else list(box)
+    return result
+
+
+def merge_remote(top, remote_hits, limit=3):
+    """Merge local (score, entry) and remote hits by score. Returns (local, remote)
+    within limit overall; a remote hit on a file already found locally is dropped."""
+    local_files = {entry["file"] for _, entry in top}
+    pool = [(score, 0, entry) for score, entry in top]
+    pool += [(float(hit.get("score", 0)), 1, hit) for hit in remote_hits if hit["file"] not in local_files]
+    pool.sort(key=lambda x: x[0], reverse=True)
+    pool = pool[:limit]
+    return ([(s, e) for s, src, e in pool if src == 0],
+            [h for _, src, h in pool if src == 1])
+
+
 def main():
+    hook_metrics.start("memory_search")
     # Clear previous results
     try:
         os.remove(RESULT_FILE)
@@ -406,88 +935,86 @@ def main():
     try:
         data = json.load(sys.stdin)
     except (json.JSONDecodeError, EOFError):
+        hook_metrics.mark("bad_payload")
         sys.exit(0)
 
+    if hook_recorder is not None:
+        hook_recorder.record("memory_search", data)
+
     prompt = data.get("prompt", "").strip()
     if not prompt or len(prompt) < 3:
+        hook_metrics.mark("short_prompt")
         sys.exit(0)
 
-    entries = parse_index(MEMORY_INDEX)
-    if not entries:
-        sys.exit(0)
-
-    # Common English stop words that add noise to keyword matching
-    STOP_WORDS = {"the", "and", "for", "are", "but", "not", "you", "all", "can", "had",
-                  "her", "was", "one", "our", "out", "has", "have", "been", "some", "them",
-                  "than", "its", "over", "also", "back", "into", "then", "what", "when",
-                  "how", "who", "why", "where", "which", "this", "that", "with", "from",
-                  "does", "did", "will", "would", "could", "should", "about", "just",
-                  "like", "use", "used", "using", "need", "want", "set", "get", "let",
-                  "see", "try", "make", "know", "take", "come", "give", "tell", "find"}
-    words = set(re.findall(r"[a-z0-9]+", prompt.lower()))
-    words = {w for w in words if (len(w) >= 3 or w in SIGNIFICANT_SHORT_KW) and w not in STOP_WORDS}
-    # Also add hyphenated compounds from the original prompt (e.g., "x-research", "pipeline-consolidation")
-    compounds = set(re.findall(r"[a-z0-9]+-[a-z0-9]+(?:-[a-z0-9]+)*", prompt.lower()))
-    words.update(compounds)
+    # Team server query overlaps with local scoring
+    remote_result = start_remote_search(prompt)
 
-    # URL pattern detection — inject domain-specific keywords so memory matches reliably
-    # This ensures that e.g. an x.com URL always surfaces x-research-setup.md
-    URL_KEYWORD_MAP = {
-        r"x\.com/|twitter\.com/": {"x-research", "twitter", "tweet", "bookmarks"},
-        r"github\.com/": {"github", "repo", "pull", "issue"},
-        r"reddit\.com/": {"reddit", "research"},
-    }
-    prompt_lower = prompt.lower()
-    for url_pattern, inject_kw in URL_KEYWORD_MAP.items():
-        if re.search(url_pattern, prompt_lower):
-            words.update(inject_kw)
+    entries = load_entries(MEMORY_INDEX)
+    if not entries and not MEMORY_SERVER_URL:
+        hook_metrics.mark("no_index")
+        sys.exit(0)
 
+    words = prompt_words(prompt)
     if not words:
+        hook_metrics.mark("no_words")
         sys.exit(0)
 
-    # Load all state
-    access_log = load_json(ACCESS_LOG)
-    attn_state = load_json(ATTN_STATE, {"scores": {}, "last_update": 0})
-    coact_pairs = load_json(COACTIVATION_LOG)
-
-    # Decay all attention scores on each prompt (15% per turn)
-    attn_state = decay_all_scores(attn_state)
-
-    # Two-pass scoring: first pass gets keyword matches, second adds co-activation
-    # Pass 1: score without co-activation
-    preliminary = []
-    for entry in entries:
-        s = score_entry(entry, words, access_log, attn_state, {}, [])
-        if s >= 2:  # Lower threshold for preliminary pass
-            preliminary.append((s, entry))
-    preliminary.sort(key=lambda x: x[0], reverse=True)
-    already_matched = [e["file"] for _, e in preliminary[:5]]
-
-    # Pass 2: re-score with co-activation from preliminary matches
-    scored = []
-    for entry in entries:
-        s = score_entry(entry, words, access_log, attn_state, coact_pairs, already_matched)
-        if s >= 4:
-            scored.append((s, entry))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
+    # Load all state; writes are queued on `deferred` until the output is out
+    deferred = write_behind.Batch()
+    access_log = state_store.load(ACCESS_LOG)
+    session_id = data.get("session_id", "")
+    # Decay this session's attention on each prompt (15% per turn)
+    attn_state, baseline, overlay = load_attention(session_id)
+    graph = coactivation_graph.load_graph(COACTIVATION_GRAPH) if coactivation_graph else None
+    # The compiled graph replaces the raw pair map — skip parsing it when we have one
+    coact_pairs = {} if graph else load_json(COACTIVATION_LOG)
+
+    # Route to the wings the prompt points at and score only those entries
+    partitions = memory_index_builder.load_partitions(COMPILED_INDEX) if memory_index_builder else {}
+    hook_metrics.cache("index", bool(partitions))
+    wings = route_partitions(words, entries, partitions)
+    prefetch = load_prefetch(session_id)
+    entries = select_candidates(entries, wings, access_log, attn_state, keep=prefetch, words=words)
+
+    # Two-pass scoring with co-activation; prefetched files add their boost
+    bonus = {fname: hint.get("boost", 0.0) for fname, hint in prefetch.items()}
+    scored = rank_entries(entries, words, access_log, attn_state, graph, coact_pairs, bonus)
     best_keyword_score = scored[0][0] if scored else 0
 
     # MemPalace fallback: when keyword scoring is weak, try semantic search
     mempalace_hits = []
     if best_keyword_score < MEMPALACE_FALLBACK_THRESHOLD:
-        mempalace_hits = mempalace_semantic_search(prompt, limit=2)
+        mempalace_hits = mempalace_semantic_search(prompt, limit=2, wings=wings)
 
-    if not scored and not mempalace_hits:
+    # Session history for time-scoped questions ("what was I doing last tuesday")
+    history = search_session_history(prompt, words, data.get("cwd", ""))
+
+    top, remote_hits = merge_remote(scored[:3], remote_result())
+
+    if not top and not remote_hits and not mempalace_hits and not history:
         # Save decayed attention state even if no matches
-        save_json(ATTN_STATE, attn_state)
+        save_attention(attn_state, baseline, overlay, session_id, deferred)
+        hook_metrics.mark("no_match")
+        deferred.finish()
         sys.exit(0)
 
-    top = scored[:3]
+    summary_cache = memory_summaries.load_cache(SUMMARY_CACHE) if memory_summaries else {}
+    remaining = INJECT_CHAR_BUDGET
+
+    if context_minify is not None:
+        minify_cache = context_minify.load_cache(MINIFY_CACHE)
+        deduper = context_minify.Deduper()
+    else:
+        minify_cache, deduper = None, None
 
     lines = []
+    accessed = {}
+    warm_texts = {}
     for score, entry in top:
         full_path = os.path.join(MEMORY_DIR, entry["file"])
+        if not os.path.exists(full_path) and memory_archive is not None:
+            # Hit on a cold-tier memory: restore it from the archive pack
+            memory_archive.restore_topic(entry["file"])
         if os.path.exists(full_path):
             # Determine injection tier based on attention score
             attention = get_attention_score(entry["file"], attn_state)
@@ -499,35 +1026,36 @@ def main():
                 "last_access": time.time(),
             }
             attn_state["scores"] = attn_scores
-
-            if attention >= HOT_THRESHOLD:
-                # HOT: full content — use existing format
+            attn_state.setdefault("boosts", {})[entry["file"]] = dict(attn_scores[entry["file"]])
+            if overlay is not None:
+                attention_state.boost(baseline, overlay, entry["file"],
+                                      attn_scores[entry["file"]]["score"], time.time())
+
+            hook_metrics.cache("prefetch", entry["file"] in prefetch)
+            level, text, cost = choose_injection(full_path, score, attention, summary_cache, remaining,
+                                                 prefetch.get(entry["file"]))
+            remaining -= cost
+
+            if level == "full":
+                # HOT, or COLD but scored above threshold on keywords alone — full content
                 lines.append(f"{entry['name']}|{full_path}|{score:.1f}")
-            elif attention >= WARM_THRESHOLD:
-                # WARM: first section only — write truncated version to temp
-                section = extract_first_section(full_path)
-                if section:
-                    warm_path = full_path + ".warm"
-                    try:
-                        with open(warm_path, "w", encoding="utf-8") as f:
-                            f.write(section + f"\n\n<!-- WARM tier: showing first section only. Score: {score:.1f}, Attention: {attention:.2f} -->\n")
-                        lines.append(f"{entry['name']}|{warm_path}|{score:.1f}")
-                    except OSError:
-                        lines.append(f"{entry['name']}|{full_path}|{score:.1f}")
-                else:
-                    lines.append(f"{entry['name']}|{full_path}|{score:.1f}")
             else:
-                # COLD but still scored above threshold — include full
-                # (this handles the case where keyword score alone is high enough)
-                lines.append(f"{entry['name']}|{full_path}|{score:.1f}")
+                # WARM section or cached summary — write truncated version to temp
+                if level == "section":
+                    note = f"WARM tier: showing first section only. Score: {score:.1f}, Attention: {attention:.2f}"
+                else:
+                    note = f"Summary ({level}) of {full_path}. Score: {score:.1f}, Attention: {attention:.2f}"
+                warm_path = full_path + ".warm"
+                warm_texts[warm_path] = (text, f"\n\n<!-- {note} -->\n")
+                deferred.write_text(warm_path, text + warm_texts[warm_path][1])
+                lines.append(f"{entry['name']}|{warm_path}|{score:.1f}")
 
             # Update access log
-            access_log[entry["file"]] = time.time()
+            access_log[entry["file"]] = accessed[entry["file"]] = time.time()
 
     if lines:
-        with open(RESULT_FILE, "w", encoding="utf-8") as f:
-            f.write("\n".join(lines))
-        save_json(ACCESS_LOG, access_log)
+        deferred.write_text(RESULT_FILE, "\n".join(lines))
+        deferred.update(ACCESS_LOG, "keep_max", values=accessed)
 
         # Output matched memory files to stdout so Claude Code injects them into context.
         # Each matched file's content is printed with a header showing relevance score.
@@ -539,14 +1067,28 @@ def main():
                 # Strip .warm suffix for display
                 display_path = fpath.replace(".warm", "")
                 try:
-                    content = open(fpath, "r", encoding="utf-8").read()
+                    # The WARM note changes every prompt — it joins after the cached minify
+                    content, note = warm_texts.get(fpath) or (open(fpath, "r", encoding="utf-8").read(), "")
+                    content = render_body(name, content, deduper, minify_cache) + note.rstrip("\n")
                     injected.append(f"[Memory: {name} (score={score})] {display_path}\n{content}")
                 except OSError:
                     pass
         if injected:
             output = "\n---\n".join(injected)
-            sys.stdout.buffer.write(output.encode("utf-8", errors="replace"))
-            sys.stdout.buffer.write(b"\n")
+            emit(output.encode("utf-8", errors="replace"))
+            emit(b"\n")
+
+    # === Team memory server results ===
+    if remote_hits:
+        remote_parts = []
+        for hit in remote_hits:
+            content = render_body(hit.get("name", hit["file"]), hit["content"], deduper, minify_cache)
+            remote_parts.append(f"[TeamMemory: {hit.get('name', hit['file'])} (score={float(hit.get('score', 0)):.1f})] "
+                                f"{hit['file']}\n{content}")
+        if lines:
+            emit(b"\n---\n")
+        emit("\n---\n".join(remote_parts).encode("utf-8", errors="replace"))
+        emit(b"\n")
 
     # === MemPalace semantic fallback results ===
     if mempalace_hits:
@@ -556,6 +1098,7 @@ def main():
             if os.path.exists(source_file) and source_file.endswith(".md"):
                 try:
                     content = open(source_file, "r", encoding="utf-8").read()
+                    content = render_body(room, content, deduper, minify_cache)
                     mp_parts.append(
                         f"[MemPalace: {room} in {wing} (similarity={similarity:.2f})] {source_file}\n{content}"
                     )
@@ -569,9 +1112,16 @@ def main():
                 )
         if mp_parts:
             mp_output = "\n---\n".join(mp_parts)
-            sys.stdout.buffer.write(b"\n---\n")
-            sys.stdout.buffer.write(mp_output.encode("utf-8", errors="replace"))
-            sys.stdout.buffer.write(b"\n")
+            emit(b"\n---\n")
+            emit(mp_output.encode("utf-8", errors="replace"))
+            emit(b"\n")
+
+    # === Session history results ===
+    if history:
+        history_parts = [f"[SessionHistory] {session_history.format_record(r)}" for r in history]
+        emit(b"\n---\n")
+        emit("\n---\n".join(history_parts).encode("utf-8", errors="replace"))
+        emit(b"\n")
 
     # === Search stop-hook JSON memories (constraint/decision) ===
     json_matches = search_json_memories(words)
@@ -582,12 +1132,18 @@ def main():
                 f"[StopHook {cat} (score={score}, ts={ts[:10]})] {content}"
             )
         json_output = "\n---\n".join(json_parts)
-        sys.stdout.buffer.write(b"\n---\n")
-        sys.stdout.buffer.write(json_output.encode("utf-8", errors="replace"))
-        sys.stdout.buffer.write(b"\n")
-
-    # Persist decayed attention state
-    save_json(ATTN_STATE, attn_state)
+        emit(b"\n---\n")
+        emit(json_output.encode("utf-8", errors="replace"))
+        emit(b"\n")
+
+    if context_minify is not None and minify_cache.get("dirty"):
+        deferred.call("context_minify", "save_cache", cache=minify_cache, path=MINIFY_CACHE)
+
+    # Persist decayed attention state, then hand every write to write_behind
+    # so the hook ends as soon as the context above is out
+    save_attention(attn_state, baseline, overlay, session_id, deferred)
+    hook_metrics.mark("injected")
+    deferred.finish()
 
     sys.exit(0)
 
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Shared Team Memory Server for Claude Code
+Hosts one memory corpus (runbooks, constraints, decisions) behind a small
+HTTP/JSON API so every engineer's memory_search.py can query it without
+copying MEMORY.md around.
+
+Endpoints (JSON in, JSON out):
+  POST /search         {"query": "...", "limit": 3, "record": false}
+                       -> {"results": [{"name", "file", "score", "level", "content"}]}
+  GET  /file?name=X.md -> {"name", "content"}
+  POST /record-access  {"files": ["X.md", ...]} -> {"recorded": N}
+  GET  /health         -> {"ok": true, "entries": N}
+
+Requests are served concurrently (ThreadingHTTPServer). Scoring is the same
+engine as memory_search.py (keywords, importance, priors, recency, multi-hop
+co-activation), resolved against the server's own memory dir. There is no
+per-user attention; an optional shared attention state (attention_path)
+takes its place in scoring and in picking each result's injection tier,
+which degrades through the cached summaries like the hook does. Rendered
+results are kept in an in-process LRU keyed by query words, and dropped
+whenever MEMORY.md, the compiled index, the graph, the summary cache, the
+attention state or the access log changes.
+
+If MEMORY_SERVER_TOKEN is set, requests must send it in X-Memory-Token.
+
+Usage:
+    python memory_server.py [--host 127.0.0.1] [--port 8765] [--attention attn_state.json]
+
+Clients: set MEMORY_SERVER_URL=http://host:8765 for memory_search.py.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import memory_search
+
+MEMORY_DIR = memory_search.MEMORY_DIR
+MEMORY_INDEX = memory_search.MEMORY_INDEX
+COMPILED_INDEX = memory_search.COMPILED_INDEX
+COACTIVATION_GRAPH = memory_search.COACTIVATION_GRAPH
+SUMMARY_CACHE = memory_search.SUMMARY_CACHE
+# The server keeps its own access log (team-wide recency)
+SERVER_ACCESS_LOG = os.path.join(os.path.expanduser("~"), ".claude", "memory_server_access.json")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Rendered search results kept in memory
+LRU_SIZE = 256
+# Largest accepted request body
+MAX_BODY = 64 * 1024
+# Most results a single search may ask for
+MAX_LIMIT = 10
+
+
+class LRUCache:
+    """Thread-safe LRU of rendered results."""
+
+    def __init__(self, size=LRU_SIZE):
+        self.size = size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class MemoryService:
+    """The retrieval engine shared by all request threads."""
+
+    def __init__(self, memory_dir=None, index_path=None, compiled_path=None,
+                 graph_path=None, access_log_path=None, summary_cache_path=None, attention_path=None):
+        self.memory_dir = memory_dir or MEMORY_DIR
+        self.index_path = index_path or os.path.join(self.memory_dir, "MEMORY.md")
+        self.compiled_path = compiled_path or COMPILED_INDEX
+        self.graph_path = graph_path or COACTIVATION_GRAPH
+        self.access_log_path = access_log_path or SERVER_ACCESS_LOG
+        self.summary_cache_path = summary_cache_path or SUMMARY_CACHE
+        # Shared attention state (attn_state.json format); None scores without attention
+        self.attention_path = attention_path
+        self.cache = LRUCache()
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.entries = []
+        self.graph = None
+        self.summary_cache = {}
+        self.attn_state = {"scores": {}}
+        self.access_log = memory_search.load_json(self.access_log_path)
+        self.access_generation = 0
+
+    def _stamp(self):
+        stamp = []
+        for path in (self.index_path, self.compiled_path, self.graph_path, self.summary_cache_path,
+                     self.attention_path):
+            if path is None:
+                stamp.append(None)
+                continue
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def refresh(self):
+        """Reload the corpus if any of its files changed. Returns the corpus stamp."""
+        stamp = self._stamp()
+        with self.lock:
+            if stamp != self.stamp:
+                self.entries = memory_search.load_entries(self.index_path, self.compiled_path)
+                graph = None
+                if memory_search.coactivation_graph is not None:
+                    graph = memory_search.coactivation_graph.load_graph(self.graph_path)
+                self.graph = graph
+                if memory_search.memory_summaries is not None:
+                    self.summary_cache = memory_search.memory_summaries.load_cache(self.summary_cache_path)
+                if self.attention_path:
+                    self.attn_state = memory_search.load_json(self.attention_path, {"scores": {}})
+                self.stamp = stamp
+                self.cache.clear()
+        return stamp
+
+    def _render(self, entry, score, attn_state, summary_cache):
+        full_path = os.path.join(self.memory_dir, entry["file"])
+        attention = memory_search.get_attention_score(entry["file"], attn_state, self.memory_dir)
+        level, text, _ = memory_search.choose_injection(full_path, score, attention, summary_cache,
+                                                        memory_search.INJECT_CHAR_BUDGET)
+        if text is None:
+            try:
+                with open(full_path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            except OSError:
+                return None
+        if memory_search.context_minify is not None:
+            text = memory_search.context_minify.minify(text)
+        return {"name": entry["name"], "file": entry["file"], "score": round(score, 2),
+                "level": level, "content": text}
+
+    def search(self, query, limit=3, record=False):
+        stamp = self.refresh()
+        words = memory_search.prompt_words(query)
+        if not words:
+            return []
+        limit = max(1, min(MAX_LIMIT, int(limit)))
+        key = (tuple(sorted(words)), limit, stamp, self.access_generation)
+        results = self.cache.get(key)
+        if results is None:
+            with self.lock:
+                entries, graph, access_log = self.entries, self.graph, dict(self.access_log)
+                attn_state, summary_cache = self.attn_state, self.summary_cache
+            scored = memory_search.rank_entries(entries, words, access_log, attn_state, graph,
+                                                memory_dir=self.memory_dir)
+            results = []
+            for score, entry in scored:
+                rendered = self._render(entry, score, attn_state, summary_cache)
+                if rendered:
+                    results.append(rendered)
+                if len(results) >= limit:
+                    break
+            self.cache.put(key, results)
+        if record and results:
+            self.record_access([r["file"] for r in results])
+        return results
+
+    def get_file(self, name):
+        name = os.path.basename(name or "")
+        if not name.endswith(".md"):
+            return None
+        try:
+            with open(os.path.join(self.memory_dir, name), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def record_access(self, files):
+        now = time.time()
+        with self.lock:
+            count = 0
+            for fname in files:
+                fname = os.path.basename(str(fname))
+                if fname.endswith(".md"):
+                    self.access_log[fname] = now
+                    count += 1
+            if count:
+                self.access_generation += 1
+                memory_search.save_json(self.access_log_path, self.access_log)
+        return count
+
+
+class MemoryRequestHandler(BaseHTTPRequestHandler):
+    service = None
+    token = None
+
+    def log_message(self, format, *args):
+        pass  # quiet — hooks poll this a lot
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        if self.token and self.headers.get("X-Memory-Token") != self.token:
+            self._send(401, {"error": "unauthorized"})
+            return False
+        return True
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_BODY:
+            return None
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return None
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self.service.refresh()
+            self._send(200, {"ok": True, "entries": len(self.service.entries)})
+        elif url.path == "/file":
+            name = parse_qs(url.query).get("name", [""])[0]
+            content = self.service.get_file(name)
+            if content is None:
+                self._send(404, {"error": "not found"})
+            else:
+                self._send(200, {"name": os.path.basename(name), "content": content})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        body = self._body()
+        if not isinstance(body, dict):
+            self._send(400, {"error": "expected a JSON object"})
+            return
+        path = urlparse(self.path).path
+        try:
+            if path == "/search":
+                results = self.service.search(str(body.get("query", "")), body.get("limit", 3),
+                                              bool(body.get("record")))
+                self._send(200, {"results": results})
+            elif path == "/record-access":
+                files = body.get("files", [])
+                self._send(200, {"recorded": self.service.record_access(files if isinstance(files, list) else [])})
+            else:
+                self._send(404, {"error": "not found"})
+        except (TypeError, ValueError) as e:
+            self._send(400, {"error": str(e)})
+
+
+def make_server(service=None, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None):
+    """Build (not start) a server. port=0 picks a free port (see server.server_address)."""
+    handler = type("Handler", (MemoryRequestHandler,), {
+        "service": service or MemoryService(),
+        "token": token if token is not None else os.environ.get("MEMORY_SERVER_TOKEN") or None,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    args = sys.argv[1:]
+    host, port = DEFAULT_HOST, DEFAULT_PORT
+    if "--host" in args:
+        host = args[args.index("--host") + 1]
+    if "--port" in args:
+        port = int(args[args.index("--port") + 1])
+    attention = args[args.index("--attention") + 1] if "--attention" in args else None
+    server = make_server(MemoryService(attention_path=attention), host=host, port=port)
+    print(f"[memory-server] serving {MEMORY_DIR} on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
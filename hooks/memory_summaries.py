@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Topic-File Summarizer for Claude Code memory
+Builds deterministic extractive summaries of every topic file at several
+lengths so the search hooks can inject a summary instead of a whole runbook.
+
+Levels (max characters):
+  - headline (160)  — name + description, or title + first sentence
+  - short    (500)  — top-ranked sentences, no structure
+  - long     (1500) — top-ranked sentences grouped under their ## headings
+
+Summaries are keyed by content hash and cached on disk. The prompt path
+(memory_search.py) only does a stat + dict lookup — it never summarizes.
+
+Runs from mempalace_automine.py on Write/Edit of a memory file, or as a
+maintenance pass:
+    python memory_summaries.py           # summarize new/changed files
+    python memory_summaries.py --force   # rebuild every summary
+
+Exits 0 always.
+"""
+import hashlib
+import os
+import re
+import sys
+
+import state_codec
+
+MEMORY_DIR = os.path.join(os.path.expanduser("~"), ".claude", "projects", "C--Users-yourname", "memory")
+SUMMARY_CACHE = os.path.join(os.path.expanduser("~"), ".claude", "memory_summaries.json")
+
+CACHE_VERSION = 1
+
+# Summary levels, shortest first: level -> max characters
+SUMMARY_LEVELS = {
+    "headline": 160,
+    "short": 500,
+    "long": 1500,
+}
+
+# Files smaller than this are always injected as-is — a summary would not save much
+MIN_SUMMARY_SIZE = 2000
+
+# Words that carry no topical signal when ranking sentences
+STOP_WORDS = {"the", "and", "for", "are", "but", "not", "you", "all", "can", "had",
+              "her", "was", "one", "our", "out", "has", "have", "been", "some", "them",
+              "than", "its", "over", "also", "back", "into", "then", "what", "when",
+              "how", "who", "why", "where", "which", "this", "that", "with", "from",
+              "does", "did", "will", "would", "could", "should", "about", "just",
+              "like", "use", "used", "using", "need", "want", "set", "get", "let",
+              "see", "try", "make", "know", "take", "come", "give", "tell", "find",
+              "there", "their", "they", "these", "those", "each", "only", "more"}
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9`\"'(\[])")
+
+
+def content_hash(content):
+    """MD5 of the raw file content (cache key)."""
+    return hashlib.md5(content.encode("utf-8", errors="replace")).hexdigest()
+
+
+def split_frontmatter(content):
+    """Split a topic file into (frontmatter dict, body).
+
+    Frontmatter is the `---` delimited block at the top of the file. Nested
+    keys (e.g. `metadata:` / `  type: project`) are flattened to their leaf name.
+    """
+    if not content.startswith("---"):
+        return {}, content
+    end = content.find("\n---", 3)
+    if end == -1:
+        return {}, content
+
+    meta = {}
+    for line in content[3:end].splitlines():
+        m = re.match(r"^\s*([A-Za-z_][\w-]*)\s*:\s*(.*)$", line)
+        if m and m.group(2).strip():
+            meta[m.group(1).lower()] = m.group(2).strip().strip("\"'")
+    body = content[end + 4:]
+    return meta, body.lstrip("\n")
+
+
+def _terms(text):
+    return [w for w in re.findall(r"[a-z0-9][a-z0-9_-]+", text.lower())
+            if len(w) >= 3 and w not in STOP_WORDS]
+
+
+def _units(body):
+    """Split a markdown body into (heading, text, position) sentence units.
+
+    Fenced code blocks and table rows are skipped — they summarize badly.
+    """
+    units = []
+    heading = ""
+    in_code = False
+    pos = 0
+    for raw in body.splitlines():
+        line = raw.strip()
+        if line.startswith("```"):
+            in_code = not in_code
+            continue
+        if in_code or not line or line.startswith("|") or re.match(r"^[-*_=]{3,}$", line):
+            continue
+        if line.startswith("#"):
+            heading = line.lstrip("#").strip()
+            continue
+        line = re.sub(r"^(?:[-*+]|\d+\.)\s+", "", line)
+        for sent in SENTENCE_SPLIT.split(line):
+            sent = sent.strip()
+            if len(sent) >= 8:
+                units.append((heading, sent, pos))
+                pos += 1
+    return units
+
+
+def _rank(units, title):
+    """Score each unit by term frequency, heading overlap and position. Deterministic."""
+    tf = {}
+    for _, sent, _ in units:
+        for w in _terms(sent):
+            tf[w] = tf.get(w, 0) + 1
+    title_terms = set(_terms(title))
+
+    ranked = []
+    seen_headings = set()
+    for heading, sent, pos in units:
+        terms = set(_terms(sent))
+        if not terms:
+            continue
+        s = sum(tf[w] for w in terms) / (len(terms) ** 0.5)
+        heading_terms = set(_terms(heading)) | title_terms
+        s += 2.0 * len(terms & heading_terms)
+        if heading not in seen_headings:
+            # First sentence of a section usually states what the section is about
+            s += 3.0
+            seen_headings.add(heading)
+        s += 2.0 / (1 + pos)
+        ranked.append((round(s, 6), pos, heading, sent))
+    ranked.sort(key=lambda x: (-x[0], x[1]))
+    return ranked
+
+
+def _select(ranked, budget, with_headings, title=""):
+    """Greedy pick of top-ranked units under a char budget, emitted in document order."""
+    chosen = []
+    total = 0
+    for s, pos, heading, sent in ranked:
+        cost = len(sent) + 3
+        if with_headings and heading and heading != title and heading not in {h for _, h, _ in chosen}:
+            cost += len(heading) + 5
+        if total + cost > budget:
+            continue
+        chosen.append((pos, heading, sent))
+        total += cost
+    chosen.sort()
+
+    lines = []
+    current = None
+    for _, heading, sent in chosen:
+        if with_headings and heading and heading != title and heading != current:
+            lines.append(f"## {heading}")
+            current = heading
+        lines.append(f"- {sent}")
+    return "\n".join(lines)
+
+
+def summarize(content):
+    """Build {level: text} extractive summaries for one topic file."""
+    meta, body = split_frontmatter(content)
+    title_match = re.search(r"^#\s+(.+)$", body, re.MULTILINE)
+    title = meta.get("name") or (title_match.group(1).strip() if title_match else "")
+    units = _units(body)
+    ranked = _rank(units, title)
+
+    if meta.get("description"):
+        headline = f"{title} — {meta['description']}" if title else meta["description"]
+    elif units:
+        headline = f"{title} — {units[0][1]}" if title else units[0][1]
+    else:
+        headline = title
+    limit = SUMMARY_LEVELS["headline"]
+    if len(headline) > limit:
+        headline = headline[:limit - 3].rstrip() + "..."
+
+    summaries = {"headline": headline}
+    for level in ("short", "long"):
+        text = _select(ranked, SUMMARY_LEVELS[level] - len(title) - 3, with_headings=(level == "long"), title=title)
+        summaries[level] = f"# {title}\n{text}" if title else text
+    return summaries
+
+
+def load_cache(path=None):
+    cache = state_codec.load(path or SUMMARY_CACHE)
+    if isinstance(cache, dict) and cache.get("version") == CACHE_VERSION:
+        return cache
+    return {"version": CACHE_VERSION, "files": {}, "summaries": {}}
+
+
+def save_cache(cache, path=None):
+    state_codec.save(path or SUMMARY_CACHE, cache)
+
+
+def update_file(filepath, cache, force=False):
+    """Summarize one topic file into the cache. Returns True if new summaries were built."""
+    try:
+        st = os.stat(filepath)
+        with open(filepath, "r", encoding="utf-8", errors="replace") as f:
+            content = f.read()
+    except OSError:
+        return False
+
+    h = content_hash(content)
+    cache["files"][os.path.basename(filepath)] = {
+        "hash": h,
+        "mtime": st.st_mtime,
+        "size": st.st_size,
+    }
+    if h in cache["summaries"] and not force:
+        return False
+    if st.st_size < MIN_SUMMARY_SIZE:
+        cache["summaries"].pop(h, None)
+        return False
+    cache["summaries"][h] = summarize(content)
+    return True
+
+
+def build_all(memory_dir=None, force=False):
+    """Maintenance pass: summarize new/changed files and drop stale cache entries."""
+    memory_dir = memory_dir or MEMORY_DIR
+    cache = load_cache()
+    built = 0
+    present = set()
+    try:
+        names = sorted(os.listdir(memory_dir))
+    except OSError:
+        names = []
+    for name in names:
+        if not name.endswith(".md") or name == "MEMORY.md":
+            continue
+        present.add(name)
+        filepath = os.path.join(memory_dir, name)
+        known = cache["files"].get(name)
+        if known and not force:
+            try:
+                st = os.stat(filepath)
+                if st.st_mtime == known["mtime"] and st.st_size == known["size"]:
+                    continue
+            except OSError:
+                continue
+        if update_file(filepath, cache, force=force):
+            built += 1
+
+    cache["files"] = {k: v for k, v in cache["files"].items() if k in present}
+    live = {v["hash"] for v in cache["files"].values()}
+    cache["summaries"] = {k: v for k, v in cache["summaries"].items() if k in live}
+    save_cache(cache)
+    return built
+
+
+def get_summary(filepath, level, cache):
+    """Prompt-path lookup: return the cached summary, or None if missing/stale.
+
+    Only a stat — a file whose mtime/size no longer match the cache is treated
+    as unsummarized rather than re-hashed.
+    """
+    known = cache.get("files", {}).get(os.path.basename(filepath))
+    if not known:
+        return None
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    if st.st_mtime != known["mtime"] or st.st_size != known["size"]:
+        return None
+    return cache.get("summaries", {}).get(known["hash"], {}).get(level)
+
+
+def main():
+    force = "--force" in sys.argv[1:]
+    built = build_all(force=force)
+    print(f"[memory-summaries] {built} file(s) summarized")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,10 @@ files into the MemPalace ChromaDB palace with correct wing assignment.
 For NEW files: mines into palace with auto-detected wing.
 For UPDATED files: deletes old drawers, re-mines with fresh content.
 
+Also refreshes the file's extractive summaries (memory_summaries.py) and
+the compiled keyword index (memory_index_builder.py) so the search hook sees
+the change on the next prompt. This part does not need MemPalace.
+
 Runs async with 5s timeout. Exits 0 always (never blocks Claude).
 """
 import json
@@ -17,6 +21,8 @@ import hashlib
 from pathlib import Path
 from datetime import datetime
 
+import hook_metrics
+
 # Paths — UPDATE MEMORY_DIR for your username (same pattern as memory_search.py)
 # macOS:   Path.home() / ".claude" / "projects" / "-Users-yourname" / "memory"
 # Windows: Path.home() / ".claude" / "projects" / "C--Users-yourname" / "memory"
@@ -154,6 +160,8 @@ def mine_file(collection, filepath: Path, wing: str) -> int:
 
 
 def main():
+    hook_metrics.start("mempalace_automine")
+    hook_metrics.mark("skip")
     try:
         data = json.load(sys.stdin)
     except (json.JSONDecodeError, EOFError):
@@ -191,6 +199,20 @@ def main():
     if not filepath.exists():
         sys.exit(0)
 
+    # Refresh cached summaries and the compiled index first — independent of MemPalace
+    try:
+        import memory_summaries
+        cache = memory_summaries.load_cache()
+        memory_summaries.update_file(str(filepath), cache)
+        memory_summaries.save_cache(cache)
+    except Exception:
+        pass
+    try:
+        import memory_index_builder
+        memory_index_builder.build_index(str(MEMORY_DIR))
+    except Exception:
+        pass
+
     try:
         content = filepath.read_text(encoding="utf-8", errors="replace")
         wing = classify_wing(filepath.name, content)
@@ -209,12 +231,13 @@ def main():
 
         # Log result (visible in hook output if debugging)
         action = "updated" if is_update else "mined"
+        hook_metrics.mark(action if drawers > 0 else "no_drawers")
         if drawers > 0:
             print(f"[mempalace-automine] {action} {filepath.name} → {wing} ({drawers} drawers)")
 
     except Exception as e:
         # Never block Claude — swallow all errors
-        pass
+        hook_metrics.mark("error:" + type(e).__name__)
 
     sys.exit(0)
 
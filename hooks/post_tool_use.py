@@ -6,8 +6,16 @@ Fires after every successful tool call. Silently tracks file operations
 
 This data feeds into:
   - Stop hook (knows which files were touched this session)
-  - Attention scoring (co-activation: files accessed together boost each other)
+  - Attention scoring (the accessed file goes HOT in this session's overlay
+    and at most WARM in the shared baseline — see attention_state.py;
+    co-activation: files accessed together boost each other;
+    memory files in new pairs are queued for the next graph rebuild,
+    which the Stop / SessionEnd hooks run — see coactivation_graph.py)
   - Memory search (recency boost from real file access, not just keyword match)
+  - Prefetch hints: the memory files the co-activation graph says usually go
+    with the touched file, with their first section and token cost already
+    extracted (memory_prefetch.json, one entry per session merged under the
+    state lock; memory_search.py reads its own session's in one load)
 
 Zero interruption to Claude — async-compatible, fast, append-only.
 Exits 0 always.
@@ -18,9 +26,33 @@ import os
 import time
 from pathlib import Path
 
+import hook_metrics
+import state_store
+from memory_search import extract_first_section
+
+try:
+    import hook_recorder
+except ImportError:
+    hook_recorder = None
+
+try:
+    import coactivation_graph
+except ImportError:
+    coactivation_graph = None
+
+try:
+    import attention_state
+except ImportError:
+    attention_state = None
+
 FILE_TRACKING = Path.home() / ".claude" / "file_tracking.jsonl"
 ATTN_STATE = Path.home() / ".claude" / "attn_state.json"
+ATTN_SESSIONS_DIR = Path.home() / ".claude" / "attn_sessions"
 COACTIVATION_LOG = Path.home() / ".claude" / "coactivation_pairs.json"
+COACTIVATION_GRAPH = Path.home() / ".claude" / "coactivation_graph.json"
+PREFETCH_FILE = Path.home() / ".claude" / "memory_prefetch.json"
+# UPDATE for your username (same pattern as memory_search.py)
+MEMORY_DIR = Path.home() / ".claude" / "projects" / "C--Users-yourname" / "memory"
 
 # Tools that touch files
 FILE_TOOLS = {"Read", "Edit", "Write"}
@@ -28,23 +60,35 @@ FILE_TOOLS = {"Read", "Edit", "Write"}
 MAX_AGE = 86400
 # Co-activation window: files accessed within this many seconds are "together"
 COACTIVATION_WINDOW = 120  # 2 minutes
+# Prefetch list bounds: files kept, and characters of section text per file
+PREFETCH_MAX_FILES = 4
+PREFETCH_SECTION_CHARS = 2000
+# Other sessions' lists are dropped once this old (memory_search.PREFETCH_TTL)
+PREFETCH_MAX_AGE = 900
 
 
 def main():
+    hook_metrics.start("post_tool_use")
     try:
         data = json.load(sys.stdin)
     except (json.JSONDecodeError, EOFError):
+        hook_metrics.mark("bad_payload")
         sys.exit(0)
 
+    if hook_recorder is not None:
+        hook_recorder.record("post_tool_use", data)
+
     tool_name = data.get("tool_name", "")
     tool_input = data.get("tool_input", {})
 
     # Only track file operations
     if tool_name not in FILE_TOOLS:
+        hook_metrics.mark("skip_tool")
         sys.exit(0)
 
     file_path = tool_input.get("file_path", "")
     if not file_path:
+        hook_metrics.mark("no_file")
         sys.exit(0)
 
     now = time.time()
@@ -64,40 +108,41 @@ def main():
         pass
 
     # Update attention state — boost this file to HOT
-    update_attention(file_path, now)
+    update_attention(file_path, now, data.get("session_id", ""))
 
     # Update co-activation pairs — files accessed close together
     update_coactivation(file_path, now)
 
+    # Hint the memory files likely needed next to memory_search.py
+    update_prefetch(file_path, now, data.get("session_id", ""))
+
+    hook_metrics.mark("tracked")
     sys.exit(0)
 
 
-def update_attention(file_path, now):
-    """Boost the attention score of the accessed file to 1.0 (HOT)."""
-    try:
-        if ATTN_STATE.exists():
-            with open(ATTN_STATE, "r", encoding="utf-8") as f:
-                state = json.load(f)
-        else:
-            state = {"scores": {}, "last_update": now}
-
-        state["scores"][file_path] = {
-            "score": 1.0,
-            "last_access": now,
-        }
-        state["last_update"] = now
-
-        # Atomic write
-        tmp = str(ATTN_STATE) + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(state, f, indent=2)
-        os.replace(tmp, str(ATTN_STATE))
-    except (OSError, json.JSONDecodeError):
-        pass
+def update_attention(file_path, now, session_id=""):
+    """Boost the attention score of the accessed file to 1.0 (HOT).
+
+    With a session id the boost goes to that session's overlay, and the
+    shared baseline is only raised to attention_state.BASELINE_BOOST.
+    """
+    if session_id and attention_state is not None:
+        baseline = attention_state.load_baseline(str(ATTN_STATE), now)
+        overlay = attention_state.load_overlay(session_id, str(ATTN_SESSIONS_DIR))
+        attention_state.boost(baseline, overlay, file_path, 1.0, now)
+        attention_state.save_overlay(session_id, overlay, str(ATTN_SESSIONS_DIR))
+        if baseline.get("dirty"):
+            attention_state.save_baseline(baseline, str(ATTN_STATE))
+        return
+    state_store.update(ATTN_STATE, "attention", boosts={file_path: {"score": 1.0, "last_access": now}}, now=now)
 
 
 def update_coactivation(file_path, now):
-    """Track co-activation: files accessed within 2 min of each other are related."""
+    """Track co-activation: files accessed within 2 min of each other are related.
+
+    Only the pair counts are written here. Memory files in the new pairs are
+    queued, and the graph itself is rebuilt off the tool path.
+    """
     try:
         # Read recent entries from tracking log to find co-activated files
         recent_files = []
@@ -116,34 +161,89 @@ def update_coactivation(file_path, now):
         if not recent_files:
             return
 
-        # Load or create co-activation pairs
-        if COACTIVATION_LOG.exists():
-            with open(COACTIVATION_LOG, "r", encoding="utf-8") as f:
-                pairs = json.load(f)
-        else:
-            pairs = {}
-
-        # Record bidirectional pairs
+        # Record bidirectional pairs (canonical ordering), added to the
+        # stored counts under the state lock
+        increments = {}
         for other in set(recent_files):
             key_ab = f"{file_path}||{other}"
             key_ba = f"{other}||{file_path}"
-            # Use canonical ordering
             key = key_ab if file_path < other else key_ba
+            increments[key] = {"count": 1, "first_seen": now, "last_seen": now}
+        state_store.update(COACTIVATION_LOG, "counters", entries=increments)
 
-            if key not in pairs:
-                pairs[key] = {"count": 0, "first_seen": now, "last_seen": now}
-            pairs[key]["count"] += 1
-            pairs[key]["last_seen"] = now
-
-        # Atomic write
-        tmp = str(COACTIVATION_LOG) + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(pairs, f, indent=2)
-        os.replace(tmp, str(COACTIVATION_LOG))
+        # Queue the graph nodes the new pairs change (pairs of two memory files)
+        if coactivation_graph is not None and coactivation_graph.is_memory_node(file_path, MEMORY_DIR):
+            touched = {f for f in recent_files if coactivation_graph.is_memory_node(f, MEMORY_DIR)}
+            if touched:
+                coactivation_graph.mark_dirty({file_path, *touched}, now, str(COACTIVATION_GRAPH))
 
     except (OSError, json.JSONDecodeError):
         pass
 
 
+def update_prefetch(file_path, now, session_id=""):
+    """Write the memory files the graph links to file_path, sections pre-extracted.
+
+    A repo file is not a graph node: its memory-file partners in the raw
+    pair counts seed the spread instead. The list is stored under this
+    session's key, so parallel sessions do not see each other's hints, and
+    a touch that predicts nothing leaves the session's previous list alone.
+    Sections of files whose mtime/size are unchanged are carried over from
+    the session's previous list, so a steady working set costs no topic-file
+    reads.
+    """
+    if coactivation_graph is None:
+        return
+    try:
+        graph = coactivation_graph.load_graph(str(COACTIVATION_GRAPH))
+        if coactivation_graph.is_memory_node(file_path, MEMORY_DIR):
+            boosts = coactivation_graph.spread_boosts(graph, [file_path]) if graph else {}
+        else:
+            pairs = state_store.load(COACTIVATION_LOG, {})
+            boosts = coactivation_graph.pair_neighbours(pairs, file_path, MEMORY_DIR)
+            if graph and boosts:
+                for node, boost in coactivation_graph.spread_boosts(graph, list(boosts)).items():
+                    boosts[node] = min(coactivation_graph.MAX_BOOST,
+                                       boosts.get(node, 0.0) + coactivation_graph.HOP_DECAY * boost)
+        ranked = []
+        for node, boost in sorted(boosts.items(), key=lambda kv: (-kv[1], kv[0])):
+            # Graphs from before memory-only nodes may still list repo files
+            if coactivation_graph.is_memory_node(node, MEMORY_DIR):
+                ranked.append((os.path.normpath(node), boost))
+            if len(ranked) >= PREFETCH_MAX_FILES:
+                break
+
+        previous = state_store.load(PREFETCH_FILE).get(session_id)
+        previous = previous.get("files", {}) if isinstance(previous, dict) else {}
+
+        files = {}
+        for path, boost in ranked:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            fname = os.path.basename(path)
+            old = previous.get(fname)
+            if old and old.get("mtime") == st.st_mtime and old.get("size") == st.st_size:
+                section = old["section"]
+            else:
+                section = extract_first_section(path, PREFETCH_SECTION_CHARS)
+            files[fname] = {
+                "boost": round(boost, 4),
+                "mtime": st.st_mtime,
+                "size": st.st_size,
+                "section": section,
+                "section_tokens": len(section) // 4,
+                "full_tokens": st.st_size // 4,
+            }
+
+        if not files:
+            return
+        state_store.update(PREFETCH_FILE, "keep_latest", max_age=PREFETCH_MAX_AGE, now=now,
+                           values={session_id: {"ts": now, "source": file_path, "files": files}})
+    except (OSError, KeyError, AttributeError):
+        pass
+
+
 if __name__ == "__main__":
     main()
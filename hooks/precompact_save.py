@@ -4,21 +4,69 @@ PreCompact Hook for Claude Code
 Runs before context compression — saves a session snapshot so the next
 session (or post-compression context) knows what was being worked on.
 
-Reads the conversation transcript, extracts recent activity, and writes
+Reads the tail of the conversation transcript (last 200 entries, via
+transcript_tail.py), extracts recent activity, and writes
 a recovery file that memory_search.py or Claude can read on next session.
+The same activity is appended to the searchable session history
+(session_history.py), so it outlives the next snapshot.
+
+Also checkpoints the retrieval working set, one file per session
+(sessions/working_set_<session_id>.json): memories that were HOT/WARM in
+the session's attention view, the session's last injection set (from its
+attention overlay), and their co-activation neighbourhood. SessionStart
+(source=compact) of the same session restores the attention scores and
+pre-injects the top memories, so the session resumes warm; SessionEnd
+removes the file.
 
 Exits 0 always (cannot block compaction).
 """
 import json
 import sys
 import os
+import re
+import time
 from datetime import datetime, timezone
 from pathlib import Path
 
+import hook_metrics
+import state_codec
+import transcript_tail
+
+try:
+    import hook_recorder
+except ImportError:
+    hook_recorder = None
+
+try:
+    import coactivation_graph
+except ImportError:
+    coactivation_graph = None
+
+try:
+    import attention_state
+except ImportError:
+    attention_state = None
+
 MEMORY_DIR = Path.home() / ".claude" / "projects" / "C--Users-yourname" / "memory"
 SESSION_DIR = Path.home() / ".claude" / "sessions"
 RECOVERY_FILE = SESSION_DIR / "last_session.md"
 COMPACTION_LOG = SESSION_DIR / "compaction_log.jsonl"
+# Working-set checkpoints: working_set_<session_id>.json (working_set.json without an id)
+WORKING_SET_DIR = SESSION_DIR
+ATTN_STATE = Path.home() / ".claude" / "attn_state.json"
+ATTN_SESSIONS_DIR = Path.home() / ".claude" / "attn_sessions"
+RESULT_FILE = Path.home() / ".claude" / "memory_search_result.txt"
+COACTIVATION_GRAPH = Path.home() / ".claude" / "coactivation_graph.json"
+
+# Working-set checkpoint bounds
+WORKING_SET_MAX_MEMORIES = 8
+WORKING_SET_MAX_ATTENTION = 30
+# Attention below this is not worth carrying across compaction (WARM floor)
+WORKING_SET_MIN_ATTENTION = 0.25
+# Overlay boosts this close to the newest one came from the same prompt's injection
+INJECTION_WINDOW = 5
+# Checkpoints of sessions that never reached SessionEnd are removed after this
+WORKING_SET_MAX_AGE = 2 * 86400
 
 
 def extract_recent_activity(transcript_path, max_lines=200):
@@ -31,21 +79,8 @@ def extract_recent_activity(transcript_path, max_lines=200):
     if not transcript_path or not os.path.exists(transcript_path):
         return None
 
-    entries = []
-    try:
-        with open(transcript_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    entry = json.loads(line)
-                    entries.append(entry)
-                except json.JSONDecodeError:
-                    continue
-    except (OSError, PermissionError):
-        return None
-
+    # Only the last max_lines entries, read back from the end of the file
+    entries = transcript_tail.read_tail(transcript_path, max_lines)
     if not entries:
         return None
 
@@ -95,6 +130,119 @@ def extract_recent_activity(transcript_path, max_lines=200):
     }
 
 
+def _topic_name(key):
+    """Topic filename for an attention/graph key, or None if it is not a memory file."""
+    name = os.path.basename(str(key).replace("\\", "/"))
+    if name.endswith(".md") and name != "MEMORY.md" and (MEMORY_DIR / name).exists():
+        return name
+    return None
+
+
+def working_set_path(session_id):
+    """Checkpoint file of one session."""
+    if not session_id:
+        return WORKING_SET_DIR / "working_set.json"
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", session_id)[:80]
+    return WORKING_SET_DIR / f"working_set_{safe}.json"
+
+
+def remove_working_set(session_id, now=None):
+    """Drop the session's checkpoint, and any left behind by sessions that never ended."""
+    now = now or time.time()
+    try:
+        working_set_path(session_id).unlink()
+    except OSError:
+        pass
+    try:
+        for path in WORKING_SET_DIR.glob("working_set_*.json"):
+            if now - path.stat().st_mtime > WORKING_SET_MAX_AGE:
+                path.unlink()
+    except OSError:
+        pass
+
+
+def last_injection(overlay):
+    """Topic files of the session's latest memory_search injection, read off its overlay.
+
+    memory_search.py boosts each file it injects under its bare filename;
+    the latest prompt's are those within INJECTION_WINDOW of the newest.
+    """
+    stamps = {}
+    for key, entry in overlay.get("scores", {}).items():
+        name = _topic_name(key) if key == os.path.basename(key) else None
+        if name:
+            stamps[name] = entry.get("last_access", 0)
+    if not stamps:
+        return set()
+    newest = max(stamps.values())
+    return {name for name, ts in stamps.items() if newest - ts <= INJECTION_WINDOW}
+
+
+def _result_file_injection():
+    """Files in memory_search_result.txt — the latest prompt of any session."""
+    injected = set()
+    try:
+        with open(RESULT_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.strip().split("|")
+                if len(parts) >= 3:
+                    name = _topic_name(parts[1].replace(".warm", ""))
+                    if name:
+                        injected.add(name)
+    except OSError:
+        pass
+    return injected
+
+
+def build_working_set(session_id, cwd, now):
+    """Checkpoint of the retrieval state: attention, injection set, co-activation neighbours.
+
+    With a session id everything comes from that session's view (its overlay
+    on top of the shared baseline). Without one there is no per-session
+    state, and the shared map and result file are used as before.
+    """
+    if attention_state is not None and session_id:
+        overlay = attention_state.load_overlay(session_id, str(ATTN_SESSIONS_DIR))
+        scores = attention_state.merged(attention_state.load_baseline(str(ATTN_STATE)), overlay)["scores"]
+        injected = last_injection(overlay)
+    else:
+        scores = (state_codec.load(ATTN_STATE) or {}).get("scores", {})
+        injected = _result_file_injection()
+    attention = {k: v.get("score", 0.0) for k, v in scores.items()
+                 if v.get("score", 0.0) >= WORKING_SET_MIN_ATTENTION}
+    attention = dict(sorted(attention.items(), key=lambda kv: -kv[1])[:WORKING_SET_MAX_ATTENTION])
+
+    neighbours = {}
+    if coactivation_graph is not None and attention:
+        graph = coactivation_graph.load_graph(str(COACTIVATION_GRAPH))
+        if graph:
+            for key, boost in coactivation_graph.spread_boosts(graph, list(attention)).items():
+                name = _topic_name(key)
+                if name:
+                    neighbours[name] = max(neighbours.get(name, 0.0), boost)
+
+    ranks = {}
+    for key, score in attention.items():
+        name = _topic_name(key)
+        if name:
+            ranks[name] = max(ranks.get(name, 0.0), score * 3.0)
+    for name in injected:
+        ranks[name] = ranks.get(name, 0.0) + 2.0
+    for name, boost in neighbours.items():
+        ranks[name] = ranks.get(name, 0.0) + 0.5 * boost
+
+    top = sorted(ranks.items(), key=lambda kv: (-kv[1], kv[0]))[:WORKING_SET_MAX_MEMORIES]
+    return {
+        "version": 1,
+        "timestamp": now,
+        "session_id": session_id,
+        "cwd": cwd,
+        "attention": attention,
+        "memories": [{"file": name, "rank": round(rank, 3), "injected": name in injected}
+                     for name, rank in top],
+    }
+
+
 def build_recovery_markdown(activity, session_id, trigger, cwd):
     """Build a markdown recovery file from extracted activity."""
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -136,12 +284,17 @@ def build_recovery_markdown(activity, session_id, trigger, cwd):
 
 
 def main():
+    hook_metrics.start("precompact_save")
     # Read hook input
     try:
         data = json.load(sys.stdin)
     except (json.JSONDecodeError, EOFError):
+        hook_metrics.mark("bad_payload")
         sys.exit(0)
 
+    if hook_recorder is not None:
+        hook_recorder.record("precompact_save", data)
+
     session_id = data.get("session_id", "unknown")
     transcript_path = data.get("transcript_path", "")
     trigger = data.get("trigger", "unknown")
@@ -160,6 +313,20 @@ def main():
     except OSError:
         pass
 
+    # Checkpoint the retrieval working set for SessionStart(source=compact)
+    working_set = build_working_set(session_id, cwd, datetime.now().timestamp())
+    state_codec.save(working_set_path(session_id), working_set)
+
+    # Keep the snapshot in the time/term-indexed history
+    if activity:
+        try:
+            import session_history
+            session_history.append_record("precompact", session_id, cwd,
+                                          " | ".join(activity["user_messages"][-5:]),
+                                          activity["files_touched"])
+        except Exception:
+            pass
+
     # Append to compaction log
     log_entry = {
         "timestamp": datetime.now(timezone.utc).isoformat(),
@@ -175,6 +342,7 @@ def main():
     except OSError:
         pass
 
+    hook_metrics.mark(trigger if activity else "no_transcript")
     sys.exit(0)
 
 
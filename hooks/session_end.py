@@ -7,7 +7,16 @@ Writes a structured session summary to ~/.claude/sessions/. Complements
 PreCompact (which handles mid-session compaction) by capturing the final
 state when the session actually ends.
 
-Also prunes old file_tracking.jsonl entries (>24h) and old .warm files.
+Each summary is also appended to the searchable session history
+(session_history.py), which keeps every session rather than the last 20.
+
+Also folds still-queued co-activation pairs into the graph
+(coactivation_graph.py), learns usefulness priors from the session's injections and file
+accesses (memory_priors.py), prunes old file_tracking.jsonl entries (>24h)
+and old .warm files, garbage-collects per-session attention overlays
+(attention_state.py) and working-set checkpoints (precompact_save.py), and moves long-idle memories that MEMORY.md no
+longer links into the cold-tier archive (memory_archive.py). All of that runs through write_behind.py
+once the hook has returned.
 
 Exits 0 always (cannot block termination).
 """
@@ -18,6 +27,14 @@ import time
 from datetime import datetime
 from pathlib import Path
 
+import hook_metrics
+import write_behind
+
+try:
+    import hook_recorder
+except ImportError:
+    hook_recorder = None
+
 SESSION_DIR = Path.home() / ".claude" / "sessions"
 FILE_TRACKING = Path.home() / ".claude" / "file_tracking.jsonl"
 MEMORIES_DIR = Path.home() / ".claude" / "memories"
@@ -108,12 +125,31 @@ def cleanup_warm_files():
         pass
 
 
+def prune_session_files(keep=20):
+    """Keep only the newest `keep` session summary files."""
+    try:
+        session_files = sorted(SESSION_DIR.glob("session_*.json"))
+        if len(session_files) > keep:
+            for old_file in session_files[:-keep]:
+                try:
+                    old_file.unlink()
+                except OSError:
+                    pass
+    except OSError:
+        pass
+
+
 def main():
+    hook_metrics.start("session_end")
     try:
         data = json.load(sys.stdin)
     except (json.JSONDecodeError, EOFError):
+        hook_metrics.mark("bad_payload")
         sys.exit(0)
 
+    if hook_recorder is not None:
+        hook_recorder.record("session_end", data)
+
     session_id = data.get("session_id", "unknown")
     transcript_path = data.get("transcript_path", "")
 
@@ -131,30 +167,40 @@ def main():
     }
 
     summary_file = SESSION_DIR / f"session_{now.strftime('%Y%m%d_%H%M%S')}.json"
-    try:
-        with open(summary_file, "w", encoding="utf-8") as f:
-            json.dump(summary, f, indent=2)
-    except OSError:
-        pass
 
-    # Prune old tracking entries
-    prune_tracking_log()
+    # Everything below is bookkeeping: queue it and let write_behind apply it
+    # after the hook has returned (Claude Code waits on SessionEnd to exit)
+    deferred = write_behind.Batch()
+    deferred.write_text(summary_file, json.dumps(summary, indent=2))
+
+    # Record the session in the time/term-indexed history
+    if stats:
+        text = f"{stats['user_turns']} user turns, {stats['tool_calls']} tool calls"
+        deferred.call("session_history", "append_record", kind="session_end", session_id=session_id,
+                      cwd=data.get("cwd", ""), summary=text, files=stats["files_touched"])
+
+    # Fold co-activation pairs still queued into the graph
+    deferred.call("coactivation_graph", "rebuild_if_dirty")
 
-    # Clean up .warm temp files
-    cleanup_warm_files()
+    # Learn usefulness priors while the tracking log still covers this session
+    deferred.call("memory_priors", "update_priors")
+
+    # Prune old tracking entries, clean up .warm temp files
+    deferred.call("session_end", "prune_tracking_log")
+    deferred.call("session_end", "cleanup_warm_files")
+
+    # Drop this session's attention overlay and working-set checkpoint (and any abandoned ones)
+    deferred.call("attention_state", "gc_overlays", session_id=session_id)
+    deferred.call("precompact_save", "remove_working_set", session_id=session_id)
+
+    # Move long-idle, unindexed memories to the cold tier (and compact the pack)
+    deferred.call("memory_archive", "archive_cold")
 
     # Prune old session summary files (keep last 20)
-    try:
-        session_files = sorted(SESSION_DIR.glob("session_*.json"))
-        if len(session_files) > 20:
-            for old_file in session_files[:-20]:
-                try:
-                    old_file.unlink()
-                except OSError:
-                    pass
-    except OSError:
-        pass
+    deferred.call("session_end", "prune_session_files")
 
+    hook_metrics.mark("summarized" if stats else "no_transcript")
+    deferred.finish()
     sys.exit(0)
 
 
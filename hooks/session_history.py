@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Session History Store for Claude Code
+Append-only log of what every session did, with a time index and a term
+index so "what was I doing on this repo last Tuesday" is a lookup rather
+than a scan of loose snapshot files.
+
+Writers (one record each):
+  - session_end.py     — end of session: turn counts + files touched
+  - precompact_save.py — before compaction: recent requests + files touched
+  - stop_hook.py       — each saved session_summary memory
+
+Layout (~/.claude/session_history/):
+  - history.jsonl       — append-only records {ts, kind, session_id, cwd, summary, files}
+  - history_index.json  — time index [[ts, id]] sorted by ts, record offsets
+                          [[offset, length]] and cwds by id, term index
+                          {term: [id, ...]} over summary, file paths and cwd,
+                          and indexed_bytes
+  - history_index.delta.jsonl — [offset, length, ts, terms, cwd] per record
+                          appended since; append_record adds one line instead
+                          of rewriting the index, and folds the delta into
+                          history_index.json once it passes MAX_DELTA_BYTES
+
+A query ranks on the index alone (term overlap, cwd match, recency) and
+reads only the records it returns from history.jsonl.
+
+history.jsonl is the source of truth: whatever lies past indexed_bytes and
+is not in the delta (e.g. a writer died between its two appends) is indexed
+from the log on the next load.
+
+memory_search.py queries it when a prompt contains a time phrase
+("yesterday", "last tuesday", "3 days ago", "last week", "2026-10-12").
+"today" and bare weekday names only count with a qualifier ("earlier
+today", "on friday", "what did I fix friday"), so a prompt like "deploy it
+today" or "the friday release" does not pull in history.
+
+Usage:
+    python session_history.py search "deploy worker last tuesday"
+    python session_history.py search "kiln" --since 2026-10-01 --until 2026-10-08
+    python session_history.py list [N]
+    python session_history.py rebuild
+"""
+import bisect
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+import state_codec
+from cli_util import flag
+
+HISTORY_DIR = os.path.join(os.path.expanduser("~"), ".claude", "session_history")
+HISTORY_LOG = os.path.join(HISTORY_DIR, "history.jsonl")
+HISTORY_INDEX = os.path.join(HISTORY_DIR, "history_index.json")
+HISTORY_INDEX_DELTA = os.path.join(HISTORY_DIR, "history_index.delta.jsonl")
+
+INDEX_VERSION = 2
+
+# Characters of summary kept per record
+MAX_SUMMARY_CHARS = 1500
+# Files kept per record
+MAX_FILES = 30
+# Delta log size at which append_record folds it into history_index.json
+MAX_DELTA_BYTES = 256 * 1024
+
+STOP_WORDS = {"the", "and", "for", "are", "but", "not", "you", "all", "can", "had",
+              "her", "was", "one", "our", "out", "has", "have", "been", "some", "them",
+              "than", "its", "over", "also", "back", "into", "then", "what", "when",
+              "how", "who", "why", "where", "which", "this", "that", "with", "from",
+              "does", "did", "will", "would", "could", "should", "about", "just",
+              "doing", "were", "work", "working", "last", "ago", "days",
+              "week", "month", "today", "yesterday", "users", "home", "src", "files",
+              "tasks", "actions"}
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+_WEEKDAY_RE = "|".join(WEEKDAYS)
+# A past-tense verb earlier in the same sentence makes "today" / a weekday a question about the past
+_PAST_RE = (r"\b(?:did|was|were|had|done|worked|changed|fixed|touched|edited|wrote|"
+            r"happened|went)\b[^.?!\n]{0,40}")
+TIME_PHRASES = [
+    ("date", re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")),
+    ("today", re.compile(r"\bthis morning\b|\bearlier today\b|" + _PAST_RE + r"\btoday\b")),
+    ("yesterday", re.compile(r"\byesterday\b")),
+    ("days_ago", re.compile(r"\b(\d{1,3}) days? ago\b")),
+    ("past_days", re.compile(r"\b(?:past|last) (\d{1,3}) days\b")),
+    ("weekday", re.compile(r"\b(?:last |on |this past )(" + _WEEKDAY_RE + r")\b|"
+                           + _PAST_RE + r"\b(" + _WEEKDAY_RE + r")\b")),
+    ("last_week", re.compile(r"\blast week\b")),
+    ("this_week", re.compile(r"\bthis week\b")),
+    ("last_month", re.compile(r"\blast month\b")),
+    ("this_month", re.compile(r"\bthis month\b")),
+]
+
+
+def tokenize(text):
+    return [w for w in re.findall(r"[a-z0-9][a-z0-9_]+", text.lower())
+            if len(w) >= 3 and not w.isdigit() and w not in STOP_WORDS]
+
+
+def record_terms(record):
+    text = " ".join([record.get("summary", ""), record.get("cwd", "")] + record.get("files", []))
+    return set(tokenize(re.sub(r"[/\\.\-]", " ", text)))
+
+
+def _day_start(dt):
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def parse_time_phrase(text, now=None):
+    """Find a time phrase in free text. Returns (start_ts, end_ts) or None (local time)."""
+    text = text.lower()
+    now_dt = datetime.fromtimestamp(now or time.time())
+    today = _day_start(now_dt)
+    for kind, pattern in TIME_PHRASES:
+        m = pattern.search(text)
+        if not m:
+            continue
+        if kind == "date":
+            try:
+                start = datetime.strptime(m.group(1), "%Y-%m-%d")
+            except ValueError:
+                continue
+            end = start + timedelta(days=1)
+        elif kind == "today":
+            start, end = today, now_dt
+        elif kind == "yesterday":
+            start, end = today - timedelta(days=1), today
+        elif kind == "days_ago":
+            start = today - timedelta(days=int(m.group(1)))
+            end = start + timedelta(days=1)
+        elif kind == "past_days":
+            start, end = now_dt - timedelta(days=int(m.group(1))), now_dt
+        elif kind == "weekday":
+            # Most recent such day strictly before today
+            back = (today.weekday() - WEEKDAYS.index(m.group(1) or m.group(2))) % 7 or 7
+            start = today - timedelta(days=back)
+            end = start + timedelta(days=1)
+        elif kind == "last_week":
+            start = today - timedelta(days=today.weekday() + 7)
+            end = start + timedelta(days=7)
+        elif kind == "this_week":
+            start, end = today - timedelta(days=today.weekday()), now_dt
+        elif kind == "last_month":
+            end = today.replace(day=1)
+            start = (end - timedelta(days=1)).replace(day=1)
+        else:
+            start, end = today.replace(day=1), now_dt
+        return start.timestamp(), end.timestamp()
+    return None
+
+
+def _empty_index():
+    return {"version": INDEX_VERSION, "times": [], "offsets": [], "cwds": [], "terms": {}, "indexed_bytes": 0}
+
+
+def _add(index, offset, length, ts, terms, cwd):
+    rid = len(index["offsets"])
+    index["offsets"].append([offset, length])
+    index["cwds"].append(cwd)
+    bisect.insort(index["times"], [ts, rid])
+    for term in terms:
+        index["terms"].setdefault(term, []).append(rid)
+    index["indexed_bytes"] = offset + length
+
+
+def _apply_delta(index):
+    """Index the records logged in the delta file, in log order from indexed_bytes."""
+    pending = {}
+    try:
+        with open(HISTORY_INDEX_DELTA, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    offset, length, ts, terms, cwd = json.loads(line)
+                except (json.JSONDecodeError, TypeError, ValueError):
+                    continue  # older lines without cwd are indexed from the log instead
+                pending[offset] = (length, ts, terms, cwd)
+    except OSError:
+        return
+    while index["indexed_bytes"] in pending:
+        length, ts, terms, cwd = pending.pop(index["indexed_bytes"])
+        _add(index, index["indexed_bytes"], length, ts, terms, cwd)
+
+
+def _index_tail(index):
+    """Index records appended to history.jsonl since indexed_bytes. Returns True if any."""
+    try:
+        size = os.path.getsize(HISTORY_LOG)
+    except OSError:
+        return False
+    if size < index["indexed_bytes"]:
+        # Log was replaced — start over
+        index.update(_empty_index())
+    if size == index["indexed_bytes"]:
+        return False
+    with open(HISTORY_LOG, "rb") as f:
+        f.seek(index["indexed_bytes"])
+        offset = index["indexed_bytes"]
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # partial write in progress
+            length = len(raw)
+            try:
+                record = json.loads(raw.decode("utf-8"))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                offset += length
+                continue
+            _add(index, offset, length, record.get("ts", 0), record_terms(record), record.get("cwd", ""))
+            offset += length
+    index["indexed_bytes"] = offset
+    return True
+
+
+def save_index(index):
+    state_codec.save(HISTORY_INDEX, index)
+
+
+def load_index(catch_up=True):
+    """Load the index plus the delta, indexing from the log whatever neither covers."""
+    index = state_codec.load(HISTORY_INDEX)
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        index = _empty_index()
+    if catch_up:
+        _apply_delta(index)
+        if _index_tail(index):
+            save_index(index)
+    return index
+
+
+def compact_index():
+    """Fold the delta into history_index.json and empty it."""
+    index = load_index(catch_up=False)
+    _apply_delta(index)
+    _index_tail(index)
+    save_index(index)
+    # A line appended meanwhile is lost here, and its record indexed from the log instead
+    try:
+        open(HISTORY_INDEX_DELTA, "w").close()
+    except OSError:
+        pass
+
+
+def append_record(kind, session_id="", cwd="", summary="", files=None, ts=None):
+    """Append one record to the history log and one index line to the delta."""
+    record = {
+        "ts": ts or time.time(),
+        "kind": kind,
+        "session_id": session_id or "",
+        "cwd": cwd or "",
+        "summary": (summary or "")[:MAX_SUMMARY_CHARS],
+        "files": list(files or [])[-MAX_FILES:],
+    }
+    raw = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        with open(HISTORY_LOG, "ab") as f:
+            f.write(raw)
+            f.flush()
+            # Append mode: the position is the end of this write, whoever appended before it
+            offset = f.tell() - len(raw)
+        with open(HISTORY_INDEX_DELTA, "a", encoding="utf-8") as f:
+            f.write(json.dumps([offset, len(raw), record["ts"], sorted(record_terms(record)), record["cwd"]]) + "\n")
+        if os.path.getsize(HISTORY_INDEX_DELTA) > MAX_DELTA_BYTES:
+            compact_index()
+    except OSError:
+        return None
+    return record
+
+
+def read_record(index, rid):
+    offset, length = index["offsets"][rid]
+    with open(HISTORY_LOG, "rb") as f:
+        f.seek(offset)
+        return json.loads(f.read(length).decode("utf-8"))
+
+
+def query(start=None, end=None, terms=None, cwd=None, limit=10, index=None, require_terms=False):
+    """Records in [start, end) ranked by term overlap, then recency.
+
+    With terms, only records matching at least one term are returned. If
+    none match, the time range alone decides (a question like "what was I
+    doing yesterday" has no useful terms), unless require_terms is set. A
+    cwd match adds one to a record's rank. Ranking uses the index only; just
+    the top `limit` records are read from the log.
+    """
+    index = index or load_index()
+    times = index["times"]
+    lo = bisect.bisect_left(times, [start, -1]) if start is not None else 0
+    hi = bisect.bisect_left(times, [end, -1]) if end is not None else len(times)
+    in_range = {rid: ts for ts, rid in times[lo:hi]}
+    if not in_range:
+        return []
+
+    hits = {}
+    for term in set(terms or ()):
+        for rid in index["terms"].get(term, ()):
+            if rid in in_range:
+                hits[rid] = hits.get(rid, 0) + 1
+    if not hits and terms and require_terms:
+        return []
+    candidates = hits if hits else {rid: 0 for rid in in_range}
+    if cwd:
+        cwds = index["cwds"]
+        for rid in candidates:
+            if cwds[rid] == cwd:
+                candidates[rid] += 1
+
+    ranked = sorted(candidates, key=lambda rid: (-candidates[rid], -in_range[rid]))
+    results = []
+    for rid in ranked:
+        if len(results) >= limit:
+            break
+        try:
+            results.append(read_record(index, rid))
+        except (OSError, ValueError):
+            continue
+    return results
+
+
+def search_text(text, now=None, cwd=None, limit=10):
+    """Free-text search: pulls out a time phrase (if any) and uses the rest as terms."""
+    window = parse_time_phrase(text, now)
+    start, end = window if window else (None, None)
+    return query(start, end, tokenize(text), cwd=cwd, limit=limit, require_terms=window is None)
+
+
+def rebuild():
+    index = _empty_index()
+    _index_tail(index)
+    save_index(index)
+    try:
+        open(HISTORY_INDEX_DELTA, "w").close()
+    except OSError:
+        pass
+    return len(index["offsets"])
+
+
+def format_record(record):
+    when = datetime.fromtimestamp(record["ts"]).strftime("%Y-%m-%d %a %H:%M")
+    files = ", ".join(os.path.basename(f) for f in record.get("files", [])[-8:])
+    line = f"{when} [{record.get('kind', '')}] {record.get('cwd', '')}\n  {record.get('summary', '')[:300]}"
+    return line + (f"\n  files: {files}" if files else "")
+
+
+def main():
+    args = sys.argv[1:]
+    cmd = args[0] if args else "list"
+    args = args[1:]
+    if cmd == "search":
+        since, until, cwd = flag(args, "--since"), flag(args, "--until"), flag(args, "--cwd")
+        text = " ".join(args)
+        if since or until:
+            start = datetime.strptime(since, "%Y-%m-%d").timestamp() if since else None
+            end = (datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1)).timestamp() if until else None
+            records = query(start, end, tokenize(text), cwd=cwd)
+        else:
+            records = search_text(text, cwd=cwd)
+    elif cmd == "list":
+        limit = int(args[0]) if args and args[0].isdigit() else 10
+        records = query(limit=limit)
+    elif cmd == "rebuild":
+        print(f"[session-history] {rebuild()} record(s) indexed")
+        sys.exit(0)
+    else:
+        print(__doc__.strip())
+        sys.exit(0)
+    for record in records:
+        print(format_record(record))
+    if not records:
+        print("[session-history] no matching sessions")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
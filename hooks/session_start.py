@@ -8,6 +8,14 @@ contents so Claude automatically knows what was being worked on.
 
 Only injects context when the session started due to compaction or a fresh
 startup (not on /clear or resume, where context is already available).
+
+After compaction it also restores the working-set checkpoint PreCompact
+wrote for this same session (precompact_save.working_set_path; another
+session's checkpoint is never used): attention scores go back into the
+session's attention overlay
+(attn_state.json without a session id), and the top
+memories are pre-injected within WORKING_SET_BUDGET characters (full file,
+else its cached summary), so retrieval resumes warm.
 """
 import json
 import sys
@@ -15,10 +23,46 @@ import os
 import time
 from pathlib import Path
 
+import hook_metrics
+import precompact_save
+import state_codec
+import state_store
+
+try:
+    import hook_recorder
+except ImportError:
+    hook_recorder = None
+
+try:
+    import context_minify
+except ImportError:
+    context_minify = None
+
+try:
+    import memory_summaries
+except ImportError:
+    memory_summaries = None
+
+try:
+    import attention_state
+except ImportError:
+    attention_state = None
+
+try:
+    import memory_archive
+except ImportError:
+    memory_archive = None
+
 SESSION_DIR = Path.home() / ".claude" / "sessions"
 RECOVERY_FILE = SESSION_DIR / "last_session.md"
+ATTN_STATE = Path.home() / ".claude" / "attn_state.json"
+ATTN_SESSIONS_DIR = Path.home() / ".claude" / "attn_sessions"
+# UPDATE for your username (same pattern as memory_search.py)
+MEMORY_DIR = Path.home() / ".claude" / "projects" / "C--Users-yourname" / "memory"
 # Max age in seconds before we consider the recovery file stale (1 hour)
 MAX_AGE_SECONDS = 3600
+# Characters of memory content pre-injected from the working set
+WORKING_SET_BUDGET = 6000
 
 # MemPalace wake-up
 MEMPALACE_DIR = Path.home() / "mempalace"
@@ -26,18 +70,30 @@ MEMPALACE_WAKEUP_CACHE = Path.home() / ".mempalace" / "wakeup_cache.txt"
 MEMPALACE_WAKEUP_MAX_AGE = 3600  # Regenerate wake-up if older than 1 hour
 
 
+def emit(data):
+    """Write bytes to stdout (Claude Code injects them), counted for hook_metrics."""
+    sys.stdout.buffer.write(data)
+    hook_metrics.add_bytes(len(data))
+
+
 def main():
+    hook_metrics.start("session_start")
     # Read hook input
     try:
         data = json.load(sys.stdin)
     except (json.JSONDecodeError, EOFError):
+        hook_metrics.mark("bad_payload")
         sys.exit(0)
 
+    if hook_recorder is not None:
+        hook_recorder.record("session_start", data)
+
     source = data.get("source", "")
 
     # Only inject recovery context on startup or after compaction
     # "resume" already has context, "clear" means user wants a fresh start
     if source not in ("startup", "compact"):
+        hook_metrics.mark("skip_" + (source or "unknown"))
         sys.exit(0)
 
     # Check if recovery file exists and is recent
@@ -49,21 +105,96 @@ def main():
                 content = RECOVERY_FILE.read_text(encoding="utf-8")
                 if content.strip():
                     output = f"[Session Recovery] Previous session state recovered:\n\n{content}"
-                    sys.stdout.buffer.write(output.encode("utf-8", errors="replace"))
-                    sys.stdout.buffer.write(b"\n")
+                    emit(output.encode("utf-8", errors="replace"))
+                    emit(b"\n")
                     has_recovery = True
         except OSError:
             pass
 
+    # Restore the retrieval working set from before compaction
+    if source == "compact":
+        restore_working_set(time.time(), data.get("session_id", ""))
+
     # Inject MemPalace wake-up context (always on startup/compact)
     _inject_mempalace_wakeup()
 
     # Write active session info for F9 voice daemon
     _write_voice_session_info()
 
+    hook_metrics.mark(source)
     sys.exit(0)
 
 
+def restore_attention(attention, now, session_id=""):
+    """Raise attention scores back to their checkpointed values (never lowers them)."""
+    if session_id and attention_state is not None:
+        overlay = attention_state.load_overlay(session_id, str(ATTN_SESSIONS_DIR))
+        for key, score in attention.items():
+            if overlay["scores"].get(key, {}).get("score", 0.0) < score:
+                overlay["scores"][key] = {"score": score, "last_access": now}
+        attention_state.save_overlay(session_id, overlay, str(ATTN_SESSIONS_DIR))
+        return
+    boosts = {key: {"score": score, "last_access": now} for key, score in attention.items()}
+    state_store.update(ATTN_STATE, "attention", boosts=boosts, now=now)
+
+
+def working_set_parts(memories, budget):
+    """(label, path, text) for the top memories that fit the budget, full or summarized."""
+    summary_cache = memory_summaries.load_cache() if memory_summaries else None
+    parts = []
+    remaining = budget
+    for item in memories:
+        path = MEMORY_DIR / item["file"]
+        if not path.exists() and memory_archive is not None:
+            memory_archive.restore_topic(item["file"])
+        try:
+            text = path.read_text(encoding="utf-8")
+        except OSError:
+            continue
+        if context_minify is not None:
+            text = context_minify.minify(text)
+        if len(text) > remaining and summary_cache:
+            for level in ("long", "short", "headline"):
+                summary = memory_summaries.get_summary(str(path), level, summary_cache)
+                if summary and len(summary) <= remaining:
+                    text = summary
+                    break
+        if len(text) > remaining:
+            continue
+        parts.append((item["file"], str(path), text))
+        remaining -= len(text)
+    return parts
+
+
+def restore_working_set(now, session_id=""):
+    """Restore attention and pre-inject the working set PreCompact checkpointed for this session."""
+    path = precompact_save.working_set_path(session_id)
+    try:
+        if now - path.stat().st_mtime > MAX_AGE_SECONDS:
+            return
+    except OSError:
+        return
+    working_set = state_codec.load(path)
+    if not isinstance(working_set, dict) or working_set.get("session_id", "") != session_id:
+        return
+
+    restore_attention(working_set.get("attention", {}), now, session_id)
+
+    parts = working_set_parts(working_set.get("memories", []), WORKING_SET_BUDGET)
+    if not parts:
+        return
+    deduper = context_minify.Deduper() if context_minify is not None else None
+    blocks = []
+    for label, path, text in parts:
+        if deduper is not None:
+            text = deduper.apply(text, label)
+        blocks.append(f"[Memory: {label} (working set)] {path}\n{text}")
+    output = "[Working Set] Memories active before compaction:\n\n" + "\n---\n".join(blocks)
+    emit(b"\n")
+    emit(output.encode("utf-8", errors="replace"))
+    emit(b"\n")
+
+
 def _inject_mempalace_wakeup():
     """Inject MemPalace wake-up context (identity + L1 essential story).
 
@@ -76,13 +207,15 @@ def _inject_mempalace_wakeup():
             age = time.time() - MEMPALACE_WAKEUP_CACHE.stat().st_mtime
             if age <= MEMPALACE_WAKEUP_MAX_AGE:
                 wakeup = MEMPALACE_WAKEUP_CACHE.read_text(encoding="utf-8")
+                hook_metrics.cache("wakeup", bool(wakeup.strip()))
                 if wakeup.strip():
-                    sys.stdout.buffer.write(b"\n[MemPalace Wake-Up]\n")
-                    sys.stdout.buffer.write(wakeup.encode("utf-8", errors="replace"))
-                    sys.stdout.buffer.write(b"\n")
+                    emit(b"\n[MemPalace Wake-Up]\n")
+                    emit(wakeup.encode("utf-8", errors="replace"))
+                    emit(b"\n")
                     return
 
         # Generate fresh wake-up via CLI
+        hook_metrics.cache("wakeup", False)
         import subprocess
         result = subprocess.run(
             ["python", "-m", "mempalace", "wake-up"],
@@ -105,9 +238,9 @@ def _inject_mempalace_wakeup():
                 MEMPALACE_WAKEUP_CACHE.parent.mkdir(parents=True, exist_ok=True)
                 MEMPALACE_WAKEUP_CACHE.write_text(wakeup, encoding="utf-8")
 
-                sys.stdout.buffer.write(b"\n[MemPalace Wake-Up]\n")
-                sys.stdout.buffer.write(wakeup.encode("utf-8", errors="replace"))
-                sys.stdout.buffer.write(b"\n")
+                emit(b"\n[MemPalace Wake-Up]\n")
+                emit(wakeup.encode("utf-8", errors="replace"))
+                emit(b"\n")
     except Exception:
         pass  # Never block session start
 
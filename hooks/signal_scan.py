@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Signal Scanner for the Stop hook
+Finds every category keyword and pattern of stop_hook.CATEGORY_SIGNALS in
+one sweep of the text and derives both things the hook needs from those
+hits: per-category scores (score_category) and which sentences contain
+which signals (extract_relevant_snippet). Before, each category re-counted each keyword
+and re-ran each pattern over the whole text, then again per sentence.
+
+  - keywords  deduplicated across categories and located in one pass: a
+              pyahocorasick automaton when that package is installed,
+              else one str.find sweep per distinct keyword (C speed — a
+              pure-Python automaton is slower than that in CPython)
+  - patterns  deduplicated likewise, one finditer each. That is the
+              findall count already; sentence hits are attributed from
+              the same matches, and only a sentence a match runs into
+              or out of is searched again on its own. (One alternation
+              of all patterns was measured slower: CPython's re loses
+              its literal-prefix skip on a union.)
+
+Sentence scores for the snippets come from one sentence × signal presence
+matrix (a sentence scores a signal once, however often it occurs). Times
+a signal × category weight matrix (1 per keyword, 2 per pattern), that
+gives every category's scores in one product. Each snippet is then the
+stable ranking of its column, cut where the cumulative sentence length
+first passes max_chars. That is the greedy pick that stops at the first
+sentence that does not fit. NumPy is used when it is installed; without
+it the same sums and pick run in plain Python.
+
+Results are identical to the per-category code:
+  - keyword score = str.count (leftmost non-overlapping occurrences)
+  - pattern score = len(re.findall) (leftmost non-overlapping matches)
+  - a sentence has a keyword / pattern when `kw in sentence.lower()` /
+    re.search(pattern, sentence.lower()) would say so — a match running
+    past the sentence end is re-checked against the sentence alone
+
+scan() returns None — and the caller falls back to the per-category code —
+when that equivalence is not guaranteed: lower() changes the text length,
+a pattern uses anchors, \\b or lookaround, or a pattern matched empty.
+
+Not a hook itself — imported by stop_hook.py.
+"""
+import bisect
+import re
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Same split as stop_hook.extract_relevant_snippet
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?\n])\s+")
+# Pattern syntax whose result depends on text outside the match (or the sentence)
+CONTEXT_SENSITIVE = re.compile(r"\\[bBAZ]|[\^$]|\(\?[=!<]")
+
+
+class Scan:
+    """Signal hits of one text: per-signal counts and (sentence, signal) presence."""
+
+    def __init__(self, scanner, sentences, kw_counts, pat_counts, hits):
+        self.scanner = scanner
+        self.sentences = sentences
+        self.kw_counts = kw_counts
+        self.pat_counts = pat_counts
+        # {(sentence index, signal column)}: keywords are columns 0..n-1, patterns follow
+        self.hits = hits
+        self._scores = None
+
+    def score(self, category):
+        """score_category() of the scanned text."""
+        kws, pats = self.scanner.categories[category]
+        return (sum(min(self.kw_counts[k], 3) for k in kws)
+                + sum(self.pat_counts[p] for p in pats) * 2)
+
+    def sentence_scores(self):
+        """Sentence × category snippet scores, all categories at once.
+
+        A NumPy array (presence matrix times weight matrix), or without NumPy
+        one list per category of the same weighted row sums.
+        """
+        if self._scores is None:
+            scanner = self.scanner
+            if np is not None:
+                presence = np.zeros((len(self.sentences), len(scanner.weight_matrix)))
+                if self.hits:
+                    rows, cols = zip(*self.hits)
+                    presence[rows, cols] = 1
+                self._scores = presence @ scanner.weight_matrix
+            else:
+                self._scores = [[0] * len(self.sentences) for _ in scanner.names]
+                for j, col in self.hits:
+                    for c, w in scanner.columns[col].items():
+                        self._scores[c][j] += w
+        return self._scores
+
+    def snippet(self, category, max_chars=800):
+        """extract_relevant_snippet() of the scanned text."""
+        c = self.scanner.names.index(category)
+        if np is None:
+            scores = self.sentence_scores()[c]
+            ranked = sorted((j for j, s in enumerate(scores) if s > 0), key=lambda j: scores[j], reverse=True)
+            result, total_len = [], 0
+            for j in ranked:
+                if total_len + len(self.sentences[j]) > max_chars:
+                    break
+                result.append(self.sentences[j].strip())
+                total_len += len(self.sentences[j])
+            return " ".join(result)
+        scores = self.sentence_scores()[:, c]
+        hit = np.flatnonzero(scores > 0)
+        ranked = hit[np.argsort(-scores[hit], kind="stable")]
+        lengths = np.fromiter((len(self.sentences[j]) for j in ranked), dtype=np.int64, count=len(ranked))
+        # Sentences up to the first one whose cumulative length passes max_chars
+        take = int(np.searchsorted(np.cumsum(lengths), max_chars, side="right"))
+        return " ".join(self.sentences[j].strip() for j in ranked[:take])
+
+
+class SignalScanner:
+    """Compiled matcher for a {category: {"keywords", "patterns"}} signal table."""
+
+    def __init__(self, category_signals):
+        kw_index, pat_index = {}, {}
+        self.categories = {}
+        for name, signals in category_signals.items():
+            kws = [kw_index.setdefault(kw, len(kw_index)) for kw in signals["keywords"]]
+            pats = [pat_index.setdefault(p, len(pat_index)) for p in signals["patterns"]]
+            self.categories[name] = (kws, pats)
+        self.keywords = list(kw_index)
+        self.patterns = [re.compile(p) for p in pat_index]
+        self.names = list(self.categories)
+        # Snippet points per signal column (keywords, then patterns) and category:
+        # 1 per keyword, 2 per pattern; a signal listed twice counts twice
+        self.columns = [{} for _ in range(len(self.keywords) + len(self.patterns))]
+        for c, (kws, pats) in enumerate(self.categories.values()):
+            for col, w in [(k, 1) for k in kws] + [(len(self.keywords) + p, 2) for p in pats]:
+                self.columns[col][c] = self.columns[col].get(c, 0) + w
+        self.weight_matrix = None
+        if np is not None:
+            self.weight_matrix = np.zeros((len(self.columns), len(self.names)))
+            for col, points in enumerate(self.columns):
+                for c, w in points.items():
+                    self.weight_matrix[col, c] = w
+        self.exact = all(self.keywords) and not any(CONTEXT_SENSITIVE.search(p) for p in pat_index)
+        self.automaton = None
+        if ahocorasick is not None and self.keywords:
+            self.automaton = ahocorasick.Automaton()
+            for i, kw in enumerate(self.keywords):
+                self.automaton.add_word(kw, i)
+            self.automaton.make_automaton()
+
+    def keyword_hits(self, text_lower):
+        """Start offsets of every (overlapping) occurrence, per keyword index."""
+        hits = [[] for _ in self.keywords]
+        if self.automaton is not None:
+            for end, i in self.automaton.iter(text_lower):
+                hits[i].append(end - len(self.keywords[i]) + 1)
+            for starts in hits:
+                starts.sort()
+            return hits
+        for i, kw in enumerate(self.keywords):
+            pos = text_lower.find(kw)
+            while pos >= 0:
+                hits[i].append(pos)
+                pos = text_lower.find(kw, pos + 1)
+        return hits
+
+    def scan(self, text):
+        """Scan for every signal at once. None when only the per-category code is exact."""
+        text_lower = text.lower()
+        if not self.exact or len(text_lower) != len(text):
+            return None
+
+        # Sentence spans, exactly the pieces re.split() returns
+        spans, pos = [], 0
+        for m in SENTENCE_SPLIT.finditer(text):
+            spans.append((pos, m.start()))
+            pos = m.end()
+        spans.append((pos, len(text)))
+        starts = [s for s, _ in spans]
+
+        hits = set()
+        kw_counts = []
+        for i, occurrences in enumerate(self.keyword_hits(text_lower)):
+            width, count, free = len(self.keywords[i]), 0, 0
+            for start in occurrences:
+                if start >= free:
+                    count += 1
+                    free = start + width
+                j = bisect.bisect_right(starts, start) - 1
+                if start + width <= spans[j][1]:
+                    hits.add((j, i))
+            kw_counts.append(count)
+
+        pat_counts = []
+        for i, compiled in enumerate(self.patterns):
+            col = len(self.keywords) + i
+            count, unsure = 0, set()
+            for m in compiled.finditer(text_lower):
+                start, end = m.span()
+                if start == end:
+                    return None
+                count += 1
+                j = bisect.bisect_right(starts, start) - 1
+                if end <= spans[j][1]:
+                    hits.add((j, col))
+                    continue
+                # Runs past its sentence: it and the sentences it reaches into
+                # (where a match may hide under this one) are searched alone
+                last = bisect.bisect_left(starts, end) - 1
+                unsure.update(range(j if start < spans[j][1] else j + 1, last + 1))
+            for j in unsure:
+                if (j, col) not in hits and compiled.search(text_lower, *spans[j]):
+                    hits.add((j, col))
+            pat_counts.append(count)
+
+        sentences = [text[s:e] for s, e in spans]
+        return Scan(self, sentences, kw_counts, pat_counts, hits)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+State Codec for Claude Code memory hooks
+One place that turns hook state into bytes and back, so the machine-only
+state files (attention, access log, co-activation pairs, hashes, pattern
+tracker, caches and indexes) stop paying for pretty-printed stdlib JSON.
+
+Every file is written behind a 6-byte header — b"\\x00CMS", a format
+version byte and a codec byte — which JSON can never start with, so
+readers tell the formats apart per file and refuse versions newer than
+FORMAT_VERSION:
+
+  - JSON (default)  codec b"J"; compact, orjson when installed, else stdlib
+                    json with compact separators. The text after the header
+                    is plain JSON (`tail -c +7 file`). Bare JSON — every
+                    file written before the header, or by any other JSON
+                    writer — still loads.
+  - msgpack         codec b"M"; opt-in with CLAUDE_MEMORY_STATE_FORMAT=msgpack
+                    (needs the msgpack package on every machine that reads
+                    the files).
+
+Hand-read files (session summaries, Stop-hook memories) stay indented JSON
+and do not go through here.
+
+Not a hook itself — imported by the hooks' load/save helpers.
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMAT_ENV = "CLAUDE_MEMORY_STATE_FORMAT"
+MAGIC = b"\x00CMS"
+# 1: msgpack behind the header, JSON bare; 2: JSON behind the header too
+FORMAT_VERSION = 2
+CODEC_JSON = b"J"
+CODEC_MSGPACK = b"M"
+
+
+class CodecError(ValueError):
+    """Bytes that are not a state file this codec can read."""
+
+
+def backend():
+    """The encoder save() uses: "msgpack", "orjson" or "json"."""
+    if os.environ.get(FORMAT_ENV, "").lower() == "msgpack" and msgpack is not None:
+        return "msgpack"
+    return "orjson" if orjson is not None else "json"
+
+
+def _sorted(obj):
+    if isinstance(obj, dict):
+        return {k: _sorted(obj[k]) for k in sorted(obj)}
+    if isinstance(obj, list):
+        return [_sorted(v) for v in obj]
+    return obj
+
+
+def _header(codec):
+    return MAGIC + bytes([FORMAT_VERSION]) + codec
+
+
+def dumps(obj, sort_keys=False):
+    kind = backend()
+    if kind == "msgpack":
+        return _header(CODEC_MSGPACK) + msgpack.packb(_sorted(obj) if sort_keys else obj, use_bin_type=True)
+    if kind == "orjson":
+        try:
+            return _header(CODEC_JSON) + orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+        except TypeError:
+            pass  # e.g. non-str keys or huge ints — stdlib handles those
+    return _header(CODEC_JSON) + json.dumps(obj, separators=(",", ":"), ensure_ascii=False,
+                                            sort_keys=sort_keys).encode("utf-8")
+
+
+def _loads_json(data):
+    try:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data.decode("utf-8") if isinstance(data, bytes) else data)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CodecError(str(e)) from e
+
+
+def loads(data):
+    """Decode bytes written by dumps() or by any JSON writer. Raises CodecError."""
+    if data[:len(MAGIC)] != MAGIC:
+        # Bare JSON: files from before the header, or from other writers
+        return _loads_json(data)
+    version, codec = data[len(MAGIC):len(MAGIC) + 1], data[len(MAGIC) + 1:len(MAGIC) + 2]
+    body = data[len(MAGIC) + 2:]
+    if not version or version[0] > FORMAT_VERSION:
+        raise CodecError("unknown state format version")
+    if codec == CODEC_JSON:
+        return _loads_json(body)
+    if codec != CODEC_MSGPACK or msgpack is None:
+        raise CodecError("state file needs msgpack")
+    try:
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    except Exception as e:
+        raise CodecError(str(e)) from e
+
+
+def load(path, default=None):
+    """Decoded contents of path, or default if it is missing or unreadable."""
+    try:
+        with open(path, "rb") as f:
+            return loads(f.read())
+    except (OSError, CodecError):
+        return default
+
+
+def save(path, obj, sort_keys=False):
+    """Atomic write (temp file + rename). Returns True on success."""
+    path = str(path)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        data = dumps(obj, sort_keys)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return True
+    except (OSError, TypeError, ValueError):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Locked State Store for Claude Code memory hooks
+Read-modify-write access to the JSON state files several hooks (and
+several sessions) update at once — attn_state.json and the attention
+overlays, coactivation_pairs.json, memory_hashes.json,
+pattern_tracker.json, memory_access_log.json, transcript_cursors.json,
+memory_prefetch.json and the co-activation graph's rebuild queue.
+
+A writer does not save a whole file; it names an operation ("decay these
+scores and raise these", "add these counts") and update() applies it to
+the freshly loaded file while holding an advisory lock:
+  - lock      <file>.lock, fcntl.flock (msvcrt on Windows), polled for at
+              most LOCK_TIMEOUT so a hook never blocks past its budget
+  - journal   if the lock stays busy, the operation is written to
+              <file>.journal/ instead (one small file per op, created by
+              rename, so it is either complete or absent) and the hook
+              moves on; the next writer to get the lock replays and
+              deletes pending entries before applying its own
+  - readers   load() applies pending journal entries in memory, so a
+              journaled update is visible immediately
+
+Operations are merge-friendly — max-merge for scores and timestamps,
+additive for counters — so the order in which concurrent writers land
+does not matter. Files that are not JSON state (an append-only pack, a
+JSONL index that is appended to and occasionally rewritten) use the same
+<file>.lock directly through `with locked(path):`.
+
+With CLAUDE_MEMORY_LOCK_LOG set, every update appends a {"file",
+"wait_ms"} line to that file (read by hook_loadtest.py).
+
+Not a hook itself — imported by the hooks that write shared state.
+"""
+import contextlib
+import itertools
+import json
+import os
+import time
+
+import state_codec
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Longest a hook waits for a state file's lock before journaling instead
+LOCK_TIMEOUT = 0.2
+# Sleep between lock attempts
+LOCK_POLL = 0.005
+# Attention scores below this are evicted (same cut as attention_state.MIN_SCORE)
+MIN_SCORE = 0.01
+
+OPS = {}
+_seq = itertools.count()
+
+
+def op(name):
+    """Register fn(state, **args) -> state as a named, journalable operation."""
+    def register(fn):
+        OPS[name] = fn
+        return fn
+    return register
+
+
+@op("attention")
+def _attention(state, decay=None, half_life=None, boosts=None, now=None):
+    """Decay every score (per-prompt factor and/or wall-clock half-life), then max-merge boosts."""
+    if not isinstance(state, dict) or not isinstance(state.get("scores"), dict):
+        state = {"scores": {}, "last_update": 0}
+    now = now or time.time()
+    last = state.get("last_update") or now
+    factor = decay if decay is not None else 1.0
+    if half_life:
+        factor *= 0.5 ** (max(0.0, now - last) / half_life)
+    scores = state["scores"]
+    if factor < 1.0:
+        for key in list(scores):
+            score = scores[key].get("score", 0.0) * factor
+            if score < MIN_SCORE:
+                del scores[key]
+            else:
+                scores[key]["score"] = round(score, 4)
+    for key, entry in (boosts or {}).items():
+        if entry.get("score", 0.0) >= scores.get(key, {}).get("score", 0.0):
+            scores[key] = dict(entry)
+    state["last_update"] = max(last, now)
+    return state
+
+
+@op("counters")
+def _counters(state, entries):
+    """Add counts per key; first_seen = min, last_seen = max, new keys copied whole."""
+    if not isinstance(state, dict):
+        state = {}
+    for key, delta in entries.items():
+        current = state.get(key)
+        if not isinstance(current, dict):
+            state[key] = dict(delta)
+            continue
+        current["count"] = current.get("count", 0) + delta.get("count", 0)
+        if "first_seen" in delta:
+            current["first_seen"] = min(current.get("first_seen", delta["first_seen"]), delta["first_seen"])
+        if "last_seen" in delta:
+            current["last_seen"] = max(current.get("last_seen", delta["last_seen"]), delta["last_seen"])
+    return state
+
+
+@op("keep_first")
+def _keep_first(state, values):
+    """Add keys that are not there yet (dedup hashes: the first sighting wins)."""
+    if not isinstance(state, dict):
+        state = {}
+    for key, value in values.items():
+        state.setdefault(key, value)
+    return state
+
+
+@op("keep_max")
+def _keep_max(state, values):
+    """Per key, the larger value (access timestamps)."""
+    if not isinstance(state, dict):
+        state = {}
+    for key, value in values.items():
+        if key not in state or state[key] < value:
+            state[key] = value
+    return state
+
+
+@op("keep_latest")
+def _keep_latest(state, values, max_age=None, now=None):
+    """Per key, the value with the newer "ts"; values older than max_age seconds are dropped."""
+    if not isinstance(state, dict):
+        state = {}
+    for key, value in values.items():
+        current = state.get(key)
+        if not isinstance(current, dict) or current.get("ts", 0) <= value.get("ts", 0):
+            state[key] = value
+    if max_age:
+        now = now or time.time()
+        for key in [k for k, v in state.items() if not isinstance(v, dict) or now - v.get("ts", 0) > max_age]:
+            del state[key]
+    return state
+
+
+@op("drop_seen")
+def _drop_seen(state, values):
+    """Remove keys whose value is not newer than the one given (a processed queue)."""
+    if not isinstance(state, dict):
+        state = {}
+    for key, value in values.items():
+        if key in state and state[key] <= value:
+            del state[key]
+    return state
+
+
+def journal_dir(path):
+    return str(path) + ".journal"
+
+
+def _read(path, default):
+    state = state_codec.load(path)
+    if state is None:
+        return default() if callable(default) else default
+    return state
+
+
+def _pending(path):
+    """[(entry path, {"op", "args"})] journaled for path, oldest first."""
+    jdir = journal_dir(path)
+    try:
+        names = sorted(n for n in os.listdir(jdir) if n.endswith(".json") and not n.startswith("."))
+    except OSError:
+        return []
+    pending = []
+    for name in names:
+        entry_path = os.path.join(jdir, name)
+        record = state_codec.load(entry_path)
+        if isinstance(record, dict):
+            pending.append((entry_path, record))
+    return pending
+
+
+def _apply(state, record):
+    fn = OPS.get(record.get("op"))
+    if fn is None:
+        return state
+    return fn(state, **record.get("args", {}))
+
+
+def load(path, default=None):
+    """Current state of path, with journaled updates applied (nothing is written)."""
+    state = _read(str(path), default if default is not None else dict)
+    for _, record in _pending(str(path)):
+        state = _apply(state, record)
+    return state
+
+
+def _journal(path, record):
+    jdir = journal_dir(path)
+    name = f"{time.time_ns():020d}-{os.getpid()}-{next(_seq)}.json"
+    tmp = os.path.join(jdir, "." + name)
+    try:
+        os.makedirs(jdir, exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(state_codec.dumps(record))
+        os.replace(tmp, os.path.join(jdir, name))
+        return True
+    except (OSError, TypeError, ValueError):
+        return False
+
+
+def _try_lock(fd):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        elif msvcrt is not None:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    except OSError:
+        pass
+
+
+def _log_wait(path, wait_ms, journaled):
+    log = os.environ.get("CLAUDE_MEMORY_LOCK_LOG")
+    if not log:
+        return
+    record = {"file": path, "wait_ms": round(wait_ms, 3)}
+    if journaled:
+        record["journaled"] = True
+    try:
+        with open(log, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        pass
+
+
+def _acquire(path, timeout):
+    """Poll <path>.lock for up to timeout seconds. Returns (fd or None, held, wait_ms)."""
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        fd = None
+
+    held = False
+    if fd is not None:
+        deadline = start + timeout
+        while True:
+            held = _try_lock(fd)
+            if held or time.perf_counter() >= deadline:
+                break
+            time.sleep(LOCK_POLL)
+    return fd, held, (time.perf_counter() - start) * 1000
+
+
+def _release(fd, held):
+    if fd is not None:
+        if held:
+            _unlock(fd)
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def locked(path, timeout=None):
+    """Hold <path>.lock for the block; yields whether the lock was obtained in time."""
+    path = str(path)
+    fd, held, wait_ms = _acquire(path, LOCK_TIMEOUT if timeout is None else timeout)
+    _log_wait(path, wait_ms, False)
+    try:
+        yield held
+    finally:
+        _release(fd, held)
+
+
+def update(path, op_name, default=None, timeout=None, **args):
+    """Apply a named operation to the JSON state at path. Returns the resulting state.
+
+    Holds <path>.lock while it replays pending journal entries, applies the
+    operation and replaces the file. If the lock is still busy after
+    `timeout` (LOCK_TIMEOUT) seconds the operation is journaled for the
+    next writer and the returned state is the current view with it applied.
+    """
+    path = str(path)
+    record = {"op": op_name, "args": args}
+    fd, held, wait_ms = _acquire(path, LOCK_TIMEOUT if timeout is None else timeout)
+
+    try:
+        if not held and fd is not None and _journal(path, record):
+            _log_wait(path, wait_ms, True)
+            return load(path, default)
+        # Locked — or no lock to be had at all, where this is a plain atomic save
+        pending = _pending(path)
+        state = _read(path, default if default is not None else dict)
+        for _, earlier in pending:
+            state = _apply(state, earlier)
+        state = _apply(state, record)
+        state_codec.save(path, state)
+        for entry_path, _ in pending:
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+        _log_wait(path, wait_ms, False)
+        return state
+    finally:
+        _release(fd, held)
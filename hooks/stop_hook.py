@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 """
 Stop Hook for Claude Code
-Fires after Claude finishes responding. Analyzes the transcript tail
-to detect memories worth saving across 6 structured categories.
+Fires after Claude finishes responding. Analyzes the transcript entries
+added since the previous Stop to detect memories worth saving across 6
+structured categories.
 
 Categories:
   1. session_summary — Work resume snapshots (what happened, what's next)
@@ -14,7 +15,26 @@ Categories:
 
 Uses a stop_hook_active guard file to prevent infinite loops.
 Uses hash deduplication to prevent re-inserting the same fact.
-Writes structured JSON to ~/.claude/memories/<category>/.
+Writes structured JSON to ~/.claude/memories/<category>/, and appends each
+entry to both the consolidated memories/index.jsonl and the per-category
+partition memories/<category>/index.jsonl (which memory_search.py reads).
+Saved session summaries are also recorded in session_history.py. Those
+history records, the dedup-hash / pattern-tracker updates and the
+co-activation graph rebuild (coactivation_graph.rebuild_if_dirty) are handed
+to write_behind.py, so the turn ends once the memories themselves are written.
+
+A per-session cursor in transcript_cursors.json (byte offset past the last
+analyzed line, entries analyzed, a fingerprint of the bytes before the
+offset) limits each Stop to what the turn appended — at most TAIL_ENTRIES
+new entries, preceded by CURSOR_OVERLAP older ones for context — so its
+cost follows the turn, not the transcript. A cursor whose fingerprint no
+longer matches (transcript rewritten) is discarded. The session summary
+still covers the transcript's last TAIL_ENTRIES entries, not just the
+turn: a short turn adds one backwards tail read (transcript_tail.py).
+
+All category signals are found in one scan of the text (signal_scan.py),
+which yields every category's score, and its snippet from one
+sentence × signal matrix.
 
 Exits 0 normally. Exits 2 to block (not used — we never block Stop).
 """
@@ -27,12 +47,32 @@ import time
 from datetime import datetime
 from pathlib import Path
 
+import hook_metrics
+import signal_scan
+import state_codec
+import state_store
+import transcript_tail
+import write_behind
+
+try:
+    import hook_recorder
+except ImportError:
+    hook_recorder = None
+
 # Directories
 MEMORIES_DIR = Path.home() / ".claude" / "memories"
 GUARD_FILE = Path.home() / ".claude" / "stop_hook_active"
 HASH_FILE = Path.home() / ".claude" / "memory_hashes.json"
 PATTERN_FILE = Path.home() / ".claude" / "pattern_tracker.json"
 FILE_TRACKING = Path.home() / ".claude" / "file_tracking.jsonl"
+CURSOR_FILE = Path.home() / ".claude" / "transcript_cursors.json"
+
+# Most new transcript entries analyzed per Stop
+TAIL_ENTRIES = 30
+# Already-analyzed entries re-read before the new ones, for context
+CURSOR_OVERLAP = 4
+# Cursors of transcripts without a Stop for this long are dropped (30 days)
+CURSOR_MAX_AGE = 30 * 86400
 
 # Category detection keywords — deterministic triage, zero LLM cost
 CATEGORY_SIGNALS = {
@@ -107,31 +147,20 @@ CATEGORY_SIGNALS = {
         "min_score": 2,
     },
 }
+# All categories' signals, compiled for one scan per text (signal_scan.py)
+SCANNER = signal_scan.SignalScanner(CATEGORY_SIGNALS)
 
 
 def load_json_file(path, default=None):
-    """Load a JSON file, returning default on any error."""
+    """Load a state file (state_codec.py), returning default on any error."""
     if default is None:
         default = {}
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError, OSError):
-        return default
+    return state_codec.load(path, default)
 
 
 def save_json_file(path, data):
-    """Atomic save: write to temp file then rename."""
-    tmp = str(path) + ".tmp"
-    try:
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-        os.replace(tmp, str(path))
-    except OSError:
-        try:
-            os.remove(tmp)
-        except OSError:
-            pass
+    """Atomic save: write to temp file then rename (state_codec.py)."""
+    state_codec.save(path, data)
 
 
 def content_hash(text):
@@ -153,26 +182,24 @@ def record_hash(text, hashes):
     return hashes
 
 
-def extract_transcript_tail(transcript_path, tail_entries=30):
-    """Read the last N entries from the JSONL transcript."""
-    if not transcript_path or not os.path.exists(transcript_path):
-        return []
-
-    entries = []
-    try:
-        with open(transcript_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    entries.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
-    except (OSError, PermissionError):
-        return []
+def extract_new_entries(transcript_path, cursor, tail_entries=TAIL_ENTRIES, overlap=CURSOR_OVERLAP):
+    """Entries appended since cursor, with up to `overlap` earlier ones in front.
 
-    return entries[-tail_entries:]
+    Returns (entries, number of new entries, updated cursor). Without a
+    usable cursor this is the plain tail of the transcript.
+    """
+    if not transcript_path or not os.path.exists(transcript_path):
+        return [], 0, cursor
+    end = transcript_tail.line_end(transcript_path)
+    offset, analyzed = 0, 0
+    if isinstance(cursor, dict) and 0 < cursor.get("offset", 0) <= end and \
+            transcript_tail.fingerprint(transcript_path, cursor["offset"]) == cursor.get("fingerprint"):
+        offset, analyzed = cursor["offset"], cursor.get("entries", 0)
+    new = transcript_tail.read_tail(transcript_path, tail_entries, start=offset, end=end)
+    context = transcript_tail.read_tail(transcript_path, overlap, end=offset) if offset and new else []
+    updated = {"offset": end, "entries": analyzed + len(new),
+               "fingerprint": transcript_tail.fingerprint(transcript_path, end), "ts": time.time()}
+    return context + new, len(new), updated
 
 
 def extract_text_from_entries(entries):
@@ -199,8 +226,13 @@ def extract_text_from_entries(entries):
     return "\n".join(texts)
 
 
-def score_category(text, category_name, signals):
-    """Score text against a category's keyword and pattern signals."""
+def score_category(text, category_name, signals, scan=None):
+    """Score text against a category's keyword and pattern signals.
+
+    With a signal_scan Scan of the text, the score is read off the scan.
+    """
+    if scan is not None:
+        return scan.score(category_name)
     text_lower = text.lower()
     score = 0
 
@@ -218,9 +250,13 @@ def score_category(text, category_name, signals):
     return score
 
 
-def extract_relevant_snippet(text, category_name, signals, max_chars=800):
-    """Extract the most relevant portion of text for a given category."""
-    text_lower = text.lower()
+def extract_relevant_snippet(text, category_name, signals, max_chars=800, scan=None):
+    """Extract the most relevant portion of text for a given category.
+
+    With a signal_scan Scan of the text, the snippet is picked from the scan.
+    """
+    if scan is not None:
+        return scan.snippet(category_name, max_chars)
     sentences = re.split(r"(?<=[.!?\n])\s+", text)
 
     scored_sentences = []
@@ -274,6 +310,39 @@ def update_pattern_tracker(category, snippet, pattern_tracker):
     return pattern_tracker
 
 
+def partition_json_index():
+    """One-time split of memories/index.jsonl into memories/<category>/index.jsonl.
+
+    Once the .partitioned marker exists, memory_search.py reads only the
+    category partitions it searches instead of the whole consolidated log.
+    Callers hold the memories/index.jsonl lock.
+    """
+    marker = MEMORIES_DIR / ".partitioned"
+    if marker.exists():
+        return
+    by_category = {}
+    try:
+        with open(MEMORIES_DIR / "index.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    cat = json.loads(line).get("category", "")
+                except json.JSONDecodeError:
+                    continue
+                if cat:
+                    by_category.setdefault(cat, []).append(line.rstrip("\n"))
+    except OSError:
+        pass
+    try:
+        for cat, lines in by_category.items():
+            cat_dir = MEMORIES_DIR / cat
+            cat_dir.mkdir(parents=True, exist_ok=True)
+            with open(cat_dir / "index.jsonl", "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        marker.touch()
+    except OSError:
+        pass
+
+
 def save_memory(category, snippet, hashes):
     """Save a memory entry as JSON to the category directory."""
     cat_dir = MEMORIES_DIR / category
@@ -301,13 +370,20 @@ def save_memory(category, snippet, hashes):
 
     record_hash(snippet, hashes)
 
-    # Append to consolidated index for memory_search.py retrieval
-    try:
-        index_path = MEMORIES_DIR / "index.jsonl"
-        with open(index_path, "a", encoding="utf-8") as idx:
-            idx.write(json.dumps(entry, ensure_ascii=False) + "\n")
-    except OSError:
-        pass
+    # Append to the consolidated index and the category partition for memory_search.py
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    # Under the index lock: memory_archive.py rewrites these files when it
+    # archives, and another session's Stop may be splitting them. Without
+    # the lock only the appends run; the one-time split waits for a later save
+    with state_store.locked(MEMORIES_DIR / "index.jsonl") as held:
+        if held:
+            partition_json_index()
+        for index_path in (MEMORIES_DIR / "index.jsonl", cat_dir / "index.jsonl"):
+            try:
+                with open(index_path, "a", encoding="utf-8") as idx:
+                    idx.write(line)
+            except OSError:
+                pass
 
     return True
 
@@ -349,6 +425,12 @@ def build_session_summary(entries, files_from_tracking):
     return "\n".join(summary_parts)
 
 
+def record_history(data, summary, files, batch):
+    """Queue a saved session summary for the searchable session history."""
+    batch.call("session_history", "append_record", kind="stop", session_id=data.get("session_id", ""),
+               cwd=data.get("cwd", ""), summary=summary, files=list(files))
+
+
 def get_recent_files_from_tracking(max_age_seconds=3600):
     """Read recent file paths from the PostToolUse tracking log."""
     files = set()
@@ -371,6 +453,7 @@ def get_recent_files_from_tracking(max_age_seconds=3600):
 
 
 def main():
+    hook_metrics.start("stop_hook")
     # === GUARD: Prevent infinite loops ===
     # If the guard file exists, this is a re-entry — just clean up and exit
     if GUARD_FILE.exists():
@@ -378,12 +461,14 @@ def main():
             GUARD_FILE.unlink()
         except OSError:
             pass
+        hook_metrics.mark("reentry")
         sys.exit(0)
 
     # Set the guard before doing any work
     try:
         GUARD_FILE.touch()
     except OSError:
+        hook_metrics.mark("no_guard")
         sys.exit(0)
 
     try:
@@ -401,39 +486,58 @@ def _run():
     try:
         data = json.load(sys.stdin)
     except (json.JSONDecodeError, EOFError):
+        hook_metrics.mark("bad_payload")
         sys.exit(0)
 
+    if hook_recorder is not None:
+        hook_recorder.record("stop_hook", data)
+
     transcript_path = data.get("transcript_path", "")
     stop_reason = data.get("stop_reason", "end_turn")
 
     # Only process normal end-of-turn stops
     if stop_reason not in ("end_turn",):
+        hook_metrics.mark("skip_" + str(stop_reason))
         sys.exit(0)
 
-    # Extract transcript tail
-    entries = extract_transcript_tail(transcript_path)
-    if not entries:
+    # Shared-state writes are queued and applied once the hook has returned
+    deferred = write_behind.Batch()
+
+    # Entries this turn added (plus a little context), per the session's cursor
+    cursor_key = data.get("session_id") or transcript_path
+    cursor = state_store.load(CURSOR_FILE).get(cursor_key)
+    entries, new_count, updated = extract_new_entries(transcript_path, cursor)
+    hook_metrics.cache("cursor", bool(updated and updated["entries"] > new_count))
+    if not new_count:
+        hook_metrics.mark("no_new_entries" if cursor else "no_transcript")
         sys.exit(0)
+    deferred.update(CURSOR_FILE, "keep_latest", values={cursor_key: updated}, max_age=CURSOR_MAX_AGE)
 
     # Get full text for category analysis
     full_text = extract_text_from_entries(entries)
     if not full_text or len(full_text) < 50:
+        hook_metrics.mark("short_text")
+        deferred.finish()
         sys.exit(0)
 
     # Load dedup hashes and pattern tracker
-    hashes = load_json_file(HASH_FILE, {})
-    pattern_tracker = load_json_file(PATTERN_FILE, {})
+    hashes = state_store.load(HASH_FILE)
+    known_hashes = set(hashes)
+    # This run's sightings only; added to the stored counts on save
+    pattern_tracker = {}
 
     # Ensure memories directory exists
     MEMORIES_DIR.mkdir(parents=True, exist_ok=True)
 
     saved_count = 0
 
-    # Score each category
+    # Score each category — one scan of the text serves all of them (None:
+    # the per-category code is used)
+    scan = SCANNER.scan(full_text)
     for cat_name, signals in CATEGORY_SIGNALS.items():
-        score = score_category(full_text, cat_name, signals)
+        score = score_category(full_text, cat_name, signals, scan)
         if score >= signals["min_score"]:
-            snippet = extract_relevant_snippet(full_text, cat_name, signals)
+            snippet = extract_relevant_snippet(full_text, cat_name, signals, scan=scan)
             if snippet and len(snippet) > 20:
                 # Update pattern tracker
                 pattern_tracker = update_pattern_tracker(cat_name, snippet, pattern_tracker)
@@ -441,16 +545,30 @@ def _run():
                 if save_memory(cat_name, snippet, hashes):
                     saved_count += 1
 
-    # Always try to save a session summary (lightweight)
+    # Always try to save a session summary (lightweight). It summarizes the
+    # last TAIL_ENTRIES entries, however few of them this turn added
     recent_files = get_recent_files_from_tracking()
-    summary = build_session_summary(entries, recent_files)
+    if len(entries) >= TAIL_ENTRIES:
+        summary_entries = entries[-TAIL_ENTRIES:]
+    else:
+        summary_entries = transcript_tail.read_tail(transcript_path, TAIL_ENTRIES, end=updated["offset"])
+    summary = build_session_summary(summary_entries, recent_files)
     if summary and len(summary) > 30:
         if not is_duplicate(summary, hashes):
-            save_memory("session_summary", summary, hashes)
-
-    # Persist hashes and pattern tracker
-    save_json_file(HASH_FILE, hashes)
-    save_json_file(PATTERN_FILE, pattern_tracker)
+            if save_memory("session_summary", summary, hashes):
+                record_history(data, summary, recent_files, deferred)
+
+    # Persist hashes and pattern tracker, merged under the state lock with
+    # whatever overlapping sessions saved meanwhile
+    new_hashes = {h: ts for h, ts in hashes.items() if h not in known_hashes}
+    if new_hashes:
+        deferred.update(HASH_FILE, "keep_first", values=new_hashes)
+    if pattern_tracker:
+        deferred.update(PATTERN_FILE, "counters", entries=pattern_tracker)
+    # Fold this turn's co-activation pairs into the graph
+    deferred.call("coactivation_graph", "rebuild_if_dirty")
+    hook_metrics.mark(f"saved_{saved_count}" if saved_count else "nothing_saved")
+    deferred.finish()
 
     sys.exit(0)
 
@@ -6,7 +6,8 @@ task description, matches against the memory index, and injects the top
 matching topic file contents so subagents have relevant context.
 
 This prevents subagents from operating blind — they get the same memory
-context as the main agent for their specific task.
+context as the main agent for their specific task. Bodies are minified and
+cross-file deduplicated by context_minify.py before output.
 
 Exits 0 always.
 """
@@ -16,8 +17,26 @@ import os
 import re
 from pathlib import Path
 
+import hook_metrics
+
+try:
+    import hook_recorder
+except ImportError:
+    hook_recorder = None
+
+try:
+    import context_minify
+except ImportError:
+    context_minify = None
+
+try:
+    import memory_archive
+except ImportError:
+    memory_archive = None
+
 MEMORY_DIR = os.path.join(os.path.expanduser("~"), ".claude", "projects", "C--Users-yourname", "memory")
 MEMORY_INDEX = os.path.join(MEMORY_DIR, "MEMORY.md")
+MINIFY_CACHE = os.path.join(os.path.expanduser("~"), ".claude", "memory_minified.json")
 
 
 def parse_index(index_path):
@@ -61,23 +80,31 @@ def parse_index(index_path):
 
 
 def main():
+    hook_metrics.start("subagent_start")
     try:
         data = json.load(sys.stdin)
     except (json.JSONDecodeError, EOFError):
+        hook_metrics.mark("bad_payload")
         sys.exit(0)
 
+    if hook_recorder is not None:
+        hook_recorder.record("subagent_start", data)
+
     # The subagent's task description/prompt
     task_prompt = data.get("task_prompt", "") or data.get("prompt", "")
     if not task_prompt or len(task_prompt) < 5:
+        hook_metrics.mark("short_prompt")
         sys.exit(0)
 
     entries = parse_index(MEMORY_INDEX)
     if not entries:
+        hook_metrics.mark("no_index")
         sys.exit(0)
 
     words = set(re.findall(r"[a-z0-9]+", task_prompt.lower()))
     words = {w for w in words if len(w) >= 3}
     if not words:
+        hook_metrics.mark("no_words")
         sys.exit(0)
 
     # Score entries
@@ -100,28 +127,42 @@ def main():
             scored.append((final, entry))
 
     if not scored:
+        hook_metrics.mark("no_match")
         sys.exit(0)
 
     scored.sort(key=lambda x: x[0], reverse=True)
     top = scored[:2]  # Inject max 2 files to keep subagent context lean
 
+    if context_minify is not None:
+        minify_cache = context_minify.load_cache(MINIFY_CACHE)
+        deduper = context_minify.Deduper()
+
     output_parts = ["[Memory Context for Subagent]"]
     for score, entry in top:
         full_path = os.path.join(MEMORY_DIR, entry["file"])
+        if not os.path.exists(full_path) and memory_archive is not None:
+            memory_archive.restore_topic(entry["file"])
         if os.path.exists(full_path):
             try:
                 with open(full_path, "r", encoding="utf-8") as f:
                     content = f.read(3000)  # Cap at 3KB per file
+                if context_minify is not None:
+                    content = deduper.apply(context_minify.minify(content, minify_cache), entry["name"])
                 output_parts.append(f"\n--- {entry['name']} (relevance: {score:.1f}) ---")
                 output_parts.append(content)
             except OSError:
                 continue
 
+    if context_minify is not None:
+        context_minify.save_cache(minify_cache, MINIFY_CACHE)
+
     if len(output_parts) > 1:
         output = "\n".join(output_parts)
         # Windows cp1252 can't handle Unicode arrows etc — force utf-8
-        sys.stdout.buffer.write(output.encode("utf-8", errors="replace"))
-        sys.stdout.buffer.write(b"\n")
+        data = output.encode("utf-8", errors="replace") + b"\n"
+        sys.stdout.buffer.write(data)
+        hook_metrics.add_bytes(len(data))
+        hook_metrics.mark("injected")
 
     sys.exit(0)
 
@@ -22,12 +22,16 @@ MEMORY_INDEX = os.path.join(MEMORY_DIR, "MEMORY.md")
 ACCESS_LOG = os.path.join(os.path.expanduser("~"), ".claude", "memory_access_log.json")
 ATTN_STATE = os.path.join(os.path.expanduser("~"), ".claude", "attn_state.json")
 COACTIVATION_LOG = os.path.join(os.path.expanduser("~"), ".claude", "coactivation_pairs.json")
+COACTIVATION_GRAPH = os.path.join(os.path.expanduser("~"), ".claude", "coactivation_graph.json")
+COMPILED_INDEX = os.path.join(os.path.expanduser("~"), ".claude", "memory_index.json")
 
 # Import the scoring functions from the main hook
 sys.path.insert(0, os.path.dirname(__file__))
+import state_store
 from memory_search import (
-    parse_index, score_entry, load_json, save_json,
+    load_entries, score_entry, load_json,
     decay_all_scores, get_attention_score, extract_first_section,
+    graph_coactivation_boosts, coactivation_graph, memory_archive,
     SIGNIFICANT_SHORT_KW, HOT_THRESHOLD, WARM_THRESHOLD,
 )
 
@@ -55,7 +59,7 @@ def main():
     if not prompt or len(prompt) < 3:
         sys.exit(0)
 
-    entries = parse_index(MEMORY_INDEX)
+    entries = load_entries(MEMORY_INDEX, COMPILED_INDEX)
     if not entries:
         sys.exit(0)
 
@@ -66,9 +70,10 @@ def main():
     if not words:
         sys.exit(0)
 
-    access_log = load_json(ACCESS_LOG)
-    attn_state = load_json(ATTN_STATE, {"scores": {}, "last_update": 0})
-    coact_pairs = load_json(COACTIVATION_LOG)
+    access_log = state_store.load(ACCESS_LOG)
+    attn_state = state_store.load(ATTN_STATE, {"scores": {}, "last_update": 0})
+    graph = coactivation_graph.load_graph(COACTIVATION_GRAPH) if coactivation_graph else None
+    coact_pairs = {} if graph else load_json(COACTIVATION_LOG)
 
     # Don't decay on Telegram searches — only the main hook should decay
     # (otherwise Telegram messages would double-decay attention)
@@ -82,9 +87,10 @@ def main():
     preliminary.sort(key=lambda x: x[0], reverse=True)
     already_matched = [e["file"] for _, e in preliminary[:5]]
 
+    coact_boosts = graph_coactivation_boosts(already_matched, graph) if graph else None
     scored = []
     for entry in entries:
-        s = score_entry(entry, words, access_log, attn_state, coact_pairs, already_matched)
+        s = score_entry(entry, words, access_log, attn_state, coact_pairs, already_matched, coact_boosts)
         if s >= 4:
             scored.append((s, entry))
 
@@ -94,9 +100,12 @@ def main():
 
     scored.sort(key=lambda x: x[0], reverse=True)
     top = scored[:3]
+    accessed = {}
 
     for score, entry in top:
         full_path = os.path.join(MEMORY_DIR, entry["file"])
+        if not os.path.exists(full_path) and memory_archive is not None:
+            memory_archive.restore_topic(entry["file"])
         if os.path.exists(full_path):
             attention = get_attention_score(entry["file"], attn_state)
 
@@ -123,9 +132,9 @@ def main():
             print("---")
 
             # Update access log
-            access_log[entry["file"]] = time.time()
+            accessed[entry["file"]] = time.time()
 
-    save_json(ACCESS_LOG, access_log)
+    state_store.update(ACCESS_LOG, "keep_max", values=accessed)
 
 
 if __name__ == "__main__":
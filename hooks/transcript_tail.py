@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Transcript Tail Reader for Claude Code memory hooks
+The last N entries of a session transcript (JSONL) without reading the
+whole file. Long sessions grow transcripts to tens of megabytes, and the
+Stop and PreCompact hooks only ever look at the recent end.
+
+The file is read backwards in BLOCK_SIZE blocks from its end; lines are
+split off the back and parsed until N records have been collected. Blank
+lines and lines that are not valid JSON (including a half-written last
+line) are skipped, exactly as a front-to-back parse would skip them, so
+the result equals parsing every line and keeping the last N.
+
+start/end limit the read to a byte range that begins and ends on line
+boundaries — the Stop hook's cursor uses this to read only what a turn
+appended (line_end() gives the boundary after the last complete line,
+fingerprint() lets a cursor check that the file before it is unchanged).
+
+Not a hook itself — imported by stop_hook.py and precompact_save.py.
+"""
+import hashlib
+import json
+import os
+
+BLOCK_SIZE = 64 * 1024
+# Bytes before an offset that fingerprint() hashes
+FINGERPRINT_BYTES = 256
+
+
+def parse_line(line):
+    """The JSON record on one transcript line, or None."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def read_tail(path, n, block_size=BLOCK_SIZE, start=0, end=None):
+    """The last n JSON records of the JSONL file at path, oldest first ([] if unreadable).
+
+    Only bytes in [start, end) are read (end defaults to the end of the file).
+    """
+    if n <= 0:
+        return []
+    entries = []
+    try:
+        with open(path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            pos = size if end is None else min(end, size)
+            carry = b""
+            while pos > start and len(entries) < n:
+                size = min(block_size, pos - start)
+                pos -= size
+                f.seek(pos)
+                lines = (f.read(size) + carry).split(b"\n")
+                # The first piece may continue in the block before this one
+                carry = lines.pop(0)
+                for line in reversed(lines):
+                    entry = parse_line(line)
+                    if entry is not None:
+                        entries.append(entry)
+                        if len(entries) >= n:
+                            break
+            if pos <= start and len(entries) < n:
+                entry = parse_line(carry)
+                if entry is not None:
+                    entries.append(entry)
+    except OSError:
+        return []
+    entries.reverse()
+    return entries
+
+
+def line_end(path, block_size=BLOCK_SIZE):
+    """Offset of the end of the file's last complete line.
+
+    That is just past the last newline, unless what follows it is already a
+    whole JSON record (a last line written without its newline).
+    """
+    try:
+        with open(path, "rb") as f:
+            total = pos = f.seek(0, os.SEEK_END)
+            boundary, last = 0, b""
+            while pos > 0:
+                size = min(block_size, pos)
+                pos -= size
+                f.seek(pos)
+                block = f.read(size)
+                i = block.rfind(b"\n")
+                if i >= 0:
+                    boundary, last = pos + i + 1, block[i + 1:] + last
+                    break
+                last = block + last
+    except OSError:
+        return 0
+    if boundary < total and parse_line(last) is not None:
+        return total
+    return boundary
+
+
+def fingerprint(path, offset):
+    """Hash of the FINGERPRINT_BYTES before offset ("" if they cannot be read)."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, offset - FINGERPRINT_BYTES))
+            data = f.read(min(offset, FINGERPRINT_BYTES))
+    except OSError:
+        return ""
+    if len(data) != min(offset, FINGERPRINT_BYTES):
+        return ""
+    return hashlib.md5(data).hexdigest()
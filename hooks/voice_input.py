@@ -8,6 +8,8 @@ import os
 import sys
 from pathlib import Path
 
+import hook_metrics
+
 VOICE_INPUT = Path.home() / ".claude" / "voice" / "voice_input.jsonl"
 VOICE_CURSOR = Path.home() / ".claude" / "voice" / "voice_cursor.txt"
 
@@ -57,9 +59,12 @@ def main():
     # Output for Claude's context
     output = "[Voice Input via F9] " + " | ".join(deduped)
     print(output)
+    hook_metrics.add_bytes(len(output.encode("utf-8")) + 1)
+    hook_metrics.mark("injected")
 
 
 if __name__ == "__main__":
+    hook_metrics.start("voice_input")
     try:
         main()
     except Exception:
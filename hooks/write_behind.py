@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Write-Behind Persistence for Claude Code memory hooks
+Lets a hook hand its bookkeeping writes off and finish as soon as its
+context output is ready. Claude Code waits for the hook process (and its
+stdout) to end, so result files, access logs, .warm files and attention
+saves used to sit on the prompt's critical path.
+
+A hook collects its writes in a Batch of small serializable ops and calls
+finish() once its output is written:
+  1. stdout is flushed and pointed at /dev/null — Claude Code sees EOF
+  2. the ops run after the hook has gone:
+       - POSIX: in a forked child, detached with setsid and with no stdio
+       - elsewhere (or if fork fails): the batch is spooled to
+         ~/.claude/write_behind/spool/ and `write_behind.py drain` is
+         started detached to apply every spooled batch
+  3. if neither works the ops run inline, as before
+
+Ops: write_text, append_text, remove, state (a state_store.update()
+operation) and call (module.function(**args) of another hook module).
+Ops run in order, each failure isolated.
+
+Inline instead of write-behind when CLAUDE_MEMORY_WRITE_BEHIND=0, when the
+process is not a hook script from this directory (tests, tools importing
+a hook), or when stdout has been redirected (hook_replay --in-process).
+wait_idle() blocks until a HOME's pending batches are applied — harnesses
+call it before reading state back.
+
+Usage:
+    python write_behind.py drain           # apply spooled batches
+    python write_behind.py status          # in-flight and spooled batches
+"""
+import importlib
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+import state_store
+
+HOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+WRITE_BEHIND_DIR = os.path.join(os.path.expanduser("~"), ".claude", "write_behind")
+# In-flight markers older than this belong to a child that died — ignored
+STALE_AFTER = 60
+
+OPS = {}
+_seq = itertools.count()
+
+
+def op(name):
+    """Register fn(**args) as a named deferred op."""
+    def register(fn):
+        OPS[name] = fn
+        return fn
+    return register
+
+
+@op("write_text")
+def _write_text(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+@op("append_text")
+def _append_text(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+@op("remove")
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@op("state")
+def _state(path, operation, args):
+    state_store.update(path, operation, **args)
+
+
+@op("call")
+def _call(module, function, args):
+    getattr(importlib.import_module(module), function)(**args)
+
+
+def enabled():
+    """Write-behind only for a hook run as a script, still on its real stdout."""
+    if os.environ.get("CLAUDE_MEMORY_WRITE_BEHIND", "1") == "0" or sys.stdout is not sys.__stdout__:
+        return False
+    script = getattr(sys.modules.get("__main__"), "__file__", None) or ""
+    return os.path.dirname(os.path.abspath(script)) == HOOKS_DIR
+
+
+def run_ops(ops):
+    """Apply ops in order. Returns the number that failed."""
+    failed = 0
+    for record in ops:
+        try:
+            OPS[record["op"]](**record.get("args", {}))
+        except Exception:
+            failed += 1
+    return failed
+
+
+def _dirs(root=None):
+    root = root or WRITE_BEHIND_DIR
+    return os.path.join(root, "inflight"), os.path.join(root, "spool")
+
+
+def _name():
+    return f"{time.time_ns():020d}-{os.getpid()}-{next(_seq)}"
+
+
+def _detach_stdio():
+    try:
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        os.close(devnull)
+    except OSError:
+        pass
+
+
+class Batch:
+    """Writes a hook defers until its output has been handed to Claude Code."""
+
+    def __init__(self):
+        self.ops = []
+
+    def __len__(self):
+        return len(self.ops)
+
+    def add(self, kind, **args):
+        self.ops.append({"op": kind, "args": args})
+
+    def write_text(self, path, text):
+        self.add("write_text", path=str(path), text=text)
+
+    def append_text(self, path, text):
+        self.add("append_text", path=str(path), text=text)
+
+    def remove(self, path):
+        self.add("remove", path=str(path))
+
+    def update(self, path, operation, **args):
+        self.add("state", path=str(path), operation=operation, args=args)
+
+    def call(self, module, function, **args):
+        self.add("call", module=module, function=function, args=args)
+
+    def finish(self):
+        """Flush and release stdout, then apply the ops off the hook's critical path."""
+        ops, self.ops = self.ops, []
+        if not ops:
+            return "none"
+        if not enabled():
+            run_ops(ops)
+            return "inline"
+        try:
+            sys.stdout.flush()
+        except (OSError, ValueError):
+            pass
+        _detach_stdio()
+        if hasattr(os, "fork") and self._fork(ops):
+            return "fork"
+        if self._spool(ops):
+            return "spool"
+        run_ops(ops)
+        return "inline"
+
+    def _fork(self, ops):
+        inflight, _ = _dirs()
+        marker = os.path.join(inflight, _name())
+        try:
+            os.makedirs(inflight, exist_ok=True)
+            open(marker, "w").close()
+            pid = os.fork()
+        except OSError:
+            try:
+                os.remove(marker)
+            except OSError:
+                pass
+            return False
+        if pid:
+            return True
+        # Child: outlive the hook without holding its process group or pipes
+        try:
+            os.setsid()
+        except OSError:
+            pass
+        try:
+            run_ops(ops)
+        finally:
+            try:
+                os.remove(marker)
+            except OSError:
+                pass
+            os._exit(0)
+
+    def _spool(self, ops):
+        _, spool = _dirs()
+        name = _name() + ".json"
+        tmp = os.path.join(spool, "." + name)
+        try:
+            os.makedirs(spool, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(ops, f)
+            os.replace(tmp, os.path.join(spool, name))
+        except (OSError, TypeError, ValueError):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+        kwargs = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL,
+                  "stderr": subprocess.DEVNULL, "close_fds": True}
+        if os.name == "nt":
+            kwargs["creationflags"] = 0x00000008 | 0x00000200  # DETACHED_PROCESS | NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        try:
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), "drain"], **kwargs)
+        except OSError:
+            pass  # stays spooled for the next drain
+        return True
+
+
+def drain(root=None):
+    """Apply every spooled batch (oldest first). Returns the number applied."""
+    _, spool = _dirs(root)
+    try:
+        names = sorted(n for n in os.listdir(spool) if n.endswith(".json") and not n.startswith("."))
+    except OSError:
+        return 0
+    applied = 0
+    for name in names:
+        path = os.path.join(spool, name)
+        claimed = f"{path}.{os.getpid()}.draining"
+        try:
+            os.replace(path, claimed)  # only one drainer wins each batch
+        except OSError:
+            continue
+        try:
+            with open(claimed, "r", encoding="utf-8") as f:
+                ops = json.load(f)
+            run_ops(ops)
+            applied += 1
+        except (OSError, json.JSONDecodeError):
+            pass
+        finally:
+            try:
+                os.remove(claimed)
+            except OSError:
+                pass
+    return applied
+
+
+def pending(root=None, now=None):
+    """(in-flight children, spooled batches) not yet applied."""
+    now = now or time.time()
+    counts = []
+    for d in _dirs(root):
+        n = 0
+        try:
+            for name in os.listdir(d):
+                try:
+                    if now - os.path.getmtime(os.path.join(d, name)) < STALE_AFTER:
+                        n += 1
+                except OSError:
+                    continue
+        except OSError:
+            pass
+        counts.append(n)
+    return tuple(counts)
+
+
+def wait_idle(root=None, timeout=10.0):
+    """Block until no batch is in flight or spooled. Returns True if idle."""
+    deadline = time.time() + timeout
+    while sum(pending(root)) > 0:
+        if time.time() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def main():
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "drain":
+        drain()
+    elif cmd == "status":
+        inflight, spooled = pending()
+        print(f"[write-behind] {inflight} in flight, {spooled} spooled")
+    else:
+        print(__doc__.strip())
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
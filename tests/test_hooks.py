@@ -12,16 +12,23 @@ import tempfile
 import shutil
 import hashlib
 import re
+from datetime import datetime
 from pathlib import Path
 from unittest import TestCase, main as unittest_main
 from unittest.mock import patch
-from io import BytesIO
+from io import BytesIO, StringIO
 
 # Add hooks directory to path
 HOOKS_DIR = Path(__file__).parent.parent / "hooks"
 sys.path.insert(0, str(HOOKS_DIR))
 
 
+def load_state(path):
+    """A machine state file as the hooks read it (through state_codec)."""
+    import state_codec
+    return state_codec.load(str(path))
+
+
 class TestMemorySearch(TestCase):
     """Tests for memory_search.py (v2 — attention + co-activation)."""
 
@@ -70,6 +77,12 @@ class TestMemorySearch(TestCase):
         memory_search.ACCESS_LOG = self.access_log
         memory_search.ATTN_STATE = self.attn_state
         memory_search.COACTIVATION_LOG = self.coact_log
+        memory_search.SUMMARY_CACHE = os.path.join(self.tmpdir, "memory_summaries.json")
+        memory_search.MINIFY_CACHE = os.path.join(self.tmpdir, "memory_minified.json")
+        memory_search.COMPILED_INDEX = os.path.join(self.tmpdir, "memory_index.json")
+        memory_search.COACTIVATION_GRAPH = os.path.join(self.tmpdir, "coactivation_graph.json")
+        memory_search.PREFETCH_FILE = os.path.join(self.tmpdir, "memory_prefetch.json")
+        memory_search.ATTN_SESSIONS_DIR = os.path.join(self.tmpdir, "attn_sessions")
         return memory_search
 
     def test_parse_index_4field(self):
@@ -152,6 +165,2244 @@ class TestMemorySearch(TestCase):
         self.assertEqual(boost2, 2.0)  # Within 4 hours
 
 
+class TestMemorySummaries(TestCase):
+    """Tests for memory_summaries.py — cached extractive summaries."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.memory_dir = os.path.join(self.tmpdir, "memory")
+        os.makedirs(self.memory_dir)
+        self.cache_path = os.path.join(self.tmpdir, "memory_summaries.json")
+        self.runbook = os.path.join(self.memory_dir, "deploy-runbook.md")
+        sections = []
+        for i in range(20):
+            sections.append(f"## Step {i}\nRestart the deploy worker on node {i}. "
+                            f"Check the deploy log for errors before continuing. "
+                            f"Unrelated filler sentence number {i} about the weather.\n")
+        with open(self.runbook, "w") as f:
+            f.write("---\nname: Deploy Runbook\ndescription: how to deploy the worker fleet\n"
+                    "type: reference\n---\n# Deploy Runbook\n\n" + "\n".join(sections))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _import_summaries(self):
+        import importlib
+        import memory_summaries
+        importlib.reload(memory_summaries)
+        memory_summaries.MEMORY_DIR = self.memory_dir
+        memory_summaries.SUMMARY_CACHE = self.cache_path
+        return memory_summaries
+
+    def test_summaries_respect_level_limits(self):
+        msum = self._import_summaries()
+        content = open(self.runbook).read()
+        summaries = msum.summarize(content)
+        for level, limit in msum.SUMMARY_LEVELS.items():
+            self.assertLessEqual(len(summaries[level]), limit, level)
+        self.assertEqual(summaries["headline"], "Deploy Runbook — how to deploy the worker fleet")
+        self.assertIn("## Step", summaries["long"])
+
+    def test_summaries_deterministic(self):
+        msum = self._import_summaries()
+        content = open(self.runbook).read()
+        self.assertEqual(msum.summarize(content), msum.summarize(content))
+
+    def test_build_all_and_stale_lookup(self):
+        msum = self._import_summaries()
+        self.assertEqual(msum.build_all(self.memory_dir), 1)
+        # Second pass is a no-op (mtime/size unchanged)
+        self.assertEqual(msum.build_all(self.memory_dir), 0)
+        cache = msum.load_cache(self.cache_path)
+        self.assertIsNotNone(msum.get_summary(self.runbook, "short", cache))
+        with open(self.runbook, "a") as f:
+            f.write("\nOne more line.\n")
+        self.assertIsNone(msum.get_summary(self.runbook, "short", cache))
+
+    def test_small_files_not_summarized(self):
+        msum = self._import_summaries()
+        small = os.path.join(self.memory_dir, "small.md")
+        with open(small, "w") as f:
+            f.write("# Small\n\nTiny note.")
+        msum.build_all(self.memory_dir)
+        cache = msum.load_cache(self.cache_path)
+        self.assertIsNone(msum.get_summary(small, "headline", cache))
+
+    def test_choose_injection_degrades_to_fit_budget(self):
+        msum = self._import_summaries()
+        msum.build_all(self.memory_dir)
+        import importlib
+        import memory_search
+        importlib.reload(memory_search)
+        memory_search.memory_summaries = msum
+        cache = msum.load_cache(self.cache_path)
+        # HOT with plenty of budget: full file
+        level, _, _ = memory_search.choose_injection(self.runbook, 20, 1.0, cache, 100000)
+        self.assertEqual(level, "full")
+        # HOT with a tight budget: falls back to a summary that fits
+        level, text, cost = memory_search.choose_injection(self.runbook, 20, 1.0, cache, 600)
+        self.assertEqual(level, "short")
+        self.assertLessEqual(cost, 600)
+        # No cache: classic behaviour
+        level, _, _ = memory_search.choose_injection(self.runbook, 20, 0.0, {}, 10)
+        self.assertEqual(level, "full")
+
+
+class TestContextMinify(TestCase):
+    """Tests for context_minify.py — output-stage minification + cross-file dedup."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmpdir, "memory_minified.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _import_minify(self):
+        import importlib
+        import context_minify
+        importlib.reload(context_minify)
+        context_minify.MINIFY_CACHE = self.cache_path
+        return context_minify
+
+    def test_minify_strips_frontmatter_and_decoration(self):
+        cm = self._import_minify()
+        text = ("---\nname: Deploy\ndescription: deploy steps\ntype: reference\n---\n"
+                "# Deploy ##\n\n\n\nStep one.   \n\n---\n\nStep two.\n")
+        out = cm.minify_text(text)
+        self.assertEqual(out, "description: deploy steps\n# Deploy\n\nStep one.\n\nStep two.")
+
+    def test_code_blocks_untouched(self):
+        cm = self._import_minify()
+        text = "# T\n```\n---\n\n\n    indented  \n```\n"
+        out = cm.minify_text(text)
+        self.assertIn("```\n---\n\n\n    indented  \n```", out)
+
+    def test_cross_file_lines_become_back_references(self):
+        cm = self._import_minify()
+        shared = "Always run the full test suite before pushing to main.\nNever force-push over a teammate's branch history."
+        deduper = cm.Deduper()
+        outs = [deduper.apply(cm.minify(text), label) for label, text in [
+            ("First", "# First\n" + shared + "\nFirst only."),
+            ("Second", "# Second\n" + shared + "\nSecond only."),
+        ]]
+        self.assertIn("Always run the full test suite", outs[0])
+        self.assertNotIn("Always run the full test suite", outs[1])
+        self.assertIn("[2 lines same as: First]", outs[1])
+        self.assertIn("Second only.", outs[1])
+
+    def test_fenced_lines_never_back_referenced(self):
+        cm = self._import_minify()
+        command = "export PATH=$HOME/.local/bin:$PATH  # tools"
+        deduper = cm.Deduper()
+        deduper.apply("# A\n```bash\n" + command + "\n```", "A")
+        deduper.apply("# B\n" + command, "B")
+        out = deduper.apply("# C\n```bash\n" + command + "\n```", "C")
+        self.assertIn(command, out)
+        self.assertNotIn("same as", out)
+
+    def test_setext_headings_kept(self):
+        cm = self._import_minify()
+        out = cm.minify_text("Deploy\n======\n\nSteps\n-----\nRun it.\n\n---\n\nDone.")
+        self.assertEqual(out, "Deploy\n======\n\nSteps\n-----\nRun it.\n\nDone.")
+
+    def test_warm_note_not_in_minify_cache(self):
+        import subprocess
+        home = os.path.join(self.tmpdir, "home")
+        memory_dir = os.path.join(home, ".claude", "projects", "C--Users-yourname", "memory")
+        os.makedirs(memory_dir)
+        with open(os.path.join(memory_dir, "MEMORY.md"), "w") as f:
+            f.write("**Deploy Runbook** | Active | deploy rollback worker | [deploy-runbook.md](deploy-runbook.md)\n")
+        with open(os.path.join(memory_dir, "deploy-runbook.md"), "w") as f:
+            f.write("# Deploy Runbook\n\nRoll back the worker with `make rollback`.\n\n## Later\n\nMore.")
+        env = dict(os.environ, HOME=home, USERPROFILE=home, CLAUDE_MEMORY_METRICS="0")
+        env.pop("MEMORY_SERVER_URL", None)
+        cache_path = os.path.join(home, ".claude", "memory_minified.json")
+        sizes = []
+        for _ in range(3):
+            # Attention 0.3 after the first prompt, then WARM (>= 0.25) with a new note each time
+            proc = subprocess.run([sys.executable, str(HOOKS_DIR / "memory_search.py")],
+                                  input=json.dumps({"session_id": "s1", "prompt": "rollback the deploy worker"}).encode(),
+                                  capture_output=True, env=env, timeout=30)
+            bodies = load_state(cache_path)["bodies"]
+            sizes.append(len(bodies))
+        self.assertIn(b"Attention:", proc.stdout)
+        self.assertFalse(any("Attention:" in body for body in bodies.values()))
+        self.assertEqual(sizes[1], sizes[2])
+
+    def test_cache_by_content_hash(self):
+        cm = self._import_minify()
+        cache = cm.load_cache()
+        cm.minify("# A\n\n\nbody", cache)
+        self.assertTrue(cache["dirty"])
+        cm.save_cache(cache)
+        cache2 = cm.load_cache()
+        self.assertEqual(list(cache2["bodies"].values()), ["# A\n\nbody"])
+        cm.minify("# A\n\n\nbody", cache2)
+        self.assertFalse(cache2["dirty"])
+
+
+class TestMemoryArchive(TestCase):
+    """Tests for memory_archive.py — cold-tier archive pack."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.memory_dir = os.path.join(self.tmpdir, "memory")
+        self.memories_dir = os.path.join(self.tmpdir, "memories")
+        os.makedirs(self.memory_dir)
+        os.makedirs(os.path.join(self.memories_dir, "decision"))
+        self.old = time.time() - 200 * 86400
+        self.stale_topic = os.path.join(self.memory_dir, "kiln-controller.md")
+        with open(self.stale_topic, "w") as f:
+            f.write("# Kiln Controller\n\nPID tuning for the ceramic kiln thermocouple.")
+        os.utime(self.stale_topic, (self.old, self.old))
+        self.fresh_topic = os.path.join(self.memory_dir, "fresh.md")
+        with open(self.fresh_topic, "w") as f:
+            f.write("# Fresh\n\nRecently edited.")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _import_archive(self):
+        import importlib
+        import memory_archive
+        importlib.reload(memory_archive)
+        memory_archive.MEMORY_DIR = self.memory_dir
+        memory_archive.MEMORIES_DIR = self.memories_dir
+        memory_archive.ACCESS_LOG = os.path.join(self.tmpdir, "access_log.json")
+        memory_archive.ATTN_STATE = os.path.join(self.tmpdir, "attn_state.json")
+        memory_archive.ARCHIVE_DIR = os.path.join(self.tmpdir, "memory_archive")
+        memory_archive.ARCHIVE_PACK = os.path.join(memory_archive.ARCHIVE_DIR, "archive.pack")
+        memory_archive.ARCHIVE_INDEX = os.path.join(memory_archive.ARCHIVE_DIR, "archive_index.json")
+        return memory_archive
+
+    def test_archive_moves_only_idle_files(self):
+        ma = self._import_archive()
+        keys = ma.archive_cold()
+        self.assertEqual(keys, ["topic:kiln-controller.md"])
+        self.assertFalse(os.path.exists(self.stale_topic))
+        self.assertTrue(os.path.exists(self.fresh_topic))
+        meta = ma.load_index()["members"]["topic:kiln-controller.md"]
+        self.assertIn(b"PID tuning", ma.read_member(meta))
+
+    def test_warm_attention_blocks_archival(self):
+        ma = self._import_archive()
+        with open(ma.ATTN_STATE, "w") as f:
+            json.dump({"scores": {"kiln-controller.md": {"score": 0.5}}}, f)
+        self.assertEqual(ma.archive_cold(), [])
+
+    def test_json_memory_dropped_from_hot_index(self):
+        ma = self._import_archive()
+        entry = {"category": "decision", "content": "We chose argon over nitrogen", "hash": "abc123"}
+        mem_path = os.path.join(self.memories_dir, "decision", "old.json")
+        with open(mem_path, "w") as f:
+            json.dump(entry, f)
+        os.utime(mem_path, (self.old, self.old))
+        with open(os.path.join(self.memories_dir, "index.jsonl"), "w") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.write(json.dumps({"category": "decision", "content": "keep", "hash": "keep1"}) + "\n")
+        keys = ma.archive_cold()
+        self.assertIn("memory:decision/old.json", keys)
+        with open(os.path.join(self.memories_dir, "index.jsonl")) as f:
+            remaining = [json.loads(l)["hash"] for l in f if l.strip()]
+        self.assertEqual(remaining, ["keep1"])
+
+    def test_busy_index_lock_leaves_json_memories_hot(self):
+        ma = self._import_archive()
+        import state_store
+        ma.ARCHIVE_LOCK_TIMEOUT = 0.01
+        entry = {"category": "decision", "content": "We chose argon over nitrogen", "hash": "abc123"}
+        mem_path = os.path.join(self.memories_dir, "decision", "old.json")
+        with open(mem_path, "w") as f:
+            json.dump(entry, f)
+        os.utime(mem_path, (self.old, self.old))
+        index_path = os.path.join(self.memories_dir, "index.jsonl")
+        with open(index_path, "w") as f:
+            f.write(json.dumps(entry) + "\n")
+        with state_store.locked(index_path):
+            self.assertEqual(ma.archive_cold(), ["topic:kiln-controller.md"])
+        self.assertTrue(os.path.exists(mem_path))
+        with open(index_path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+        # Archived now; a restore that cannot get the index lock leaves it archived
+        self.assertIn("memory:decision/old.json", ma.archive_cold())
+        with state_store.locked(index_path):
+            self.assertIsNone(ma.restore("memory:decision/old.json", timeout=0.01))
+        self.assertFalse(os.path.exists(mem_path))
+        self.assertIn("memory:decision/old.json", ma.load_index()["members"])
+        self.assertEqual(ma.restore("memory:decision/old.json"), mem_path)
+        with open(index_path) as f:
+            self.assertEqual([json.loads(l)["hash"] for l in f if l.strip()], ["abc123"])
+
+    def test_strong_search_hit_restores(self):
+        ma = self._import_archive()
+        ma.archive_cold()
+        results = ma.search_archive({"kiln", "thermocouple", "pid"})
+        self.assertEqual(results[0][1], "topic:kiln-controller.md")
+        self.assertEqual(results[0][3], self.stale_topic)
+        self.assertTrue(os.path.exists(self.stale_topic))
+        self.assertEqual(ma.load_index()["members"], {})
+
+    def test_weak_search_hit_stays_archived(self):
+        ma = self._import_archive()
+        ma.archive_cold()
+        results = ma.search_archive({"ceramic"})
+        self.assertEqual(len(results), 1)
+        self.assertIsNone(results[0][3])
+        self.assertFalse(os.path.exists(self.stale_topic))
+
+    def test_files_linked_from_memory_md_never_archived(self):
+        ma = self._import_archive()
+        with open(os.path.join(self.memory_dir, "MEMORY.md"), "w") as f:
+            f.write("**Kiln** | Active | kiln pid | [kiln-controller.md](kiln-controller.md)\n")
+        self.assertEqual(ma.archive_cold(), [])
+        self.assertTrue(os.path.exists(self.stale_topic))
+
+    def test_restore_waits_for_lock_and_leaves_compaction_to_archive_pass(self):
+        ma = self._import_archive()
+        import state_store
+        ma.archive_cold()
+        with state_store.locked(ma.ARCHIVE_INDEX):
+            self.assertIsNone(ma.restore("topic:kiln-controller.md", timeout=0.01))
+        self.assertFalse(os.path.exists(self.stale_topic))
+        pack_size = os.path.getsize(ma.ARCHIVE_PACK)
+        self.assertEqual(ma.restore_topic("kiln-controller.md"), self.stale_topic)
+        self.assertEqual(os.path.getsize(ma.ARCHIVE_PACK), pack_size)
+        self.assertTrue(ma.compact())
+        self.assertEqual(os.path.getsize(ma.ARCHIVE_PACK), 0)
+
+    def test_search_hook_restores_on_any_hit(self):
+        import subprocess
+        home = os.path.join(self.tmpdir, "home")
+        claude = os.path.join(home, ".claude")
+        self.memory_dir = os.path.join(claude, "projects", "C--Users-yourname", "memory")
+        self.memories_dir = os.path.join(claude, "memories")
+        os.makedirs(self.memory_dir)
+        topic = os.path.join(self.memory_dir, "kiln-controller.md")
+        with open(topic, "w") as f:
+            f.write("# Kiln Controller\n\nPID tuning for the ceramic kiln thermocouple.")
+        os.utime(topic, (self.old, self.old))
+        ma = self._import_archive()
+        ma.ACCESS_LOG = os.path.join(claude, "memory_access_log.json")
+        ma.ATTN_STATE = os.path.join(claude, "attn_state.json")
+        ma.ARCHIVE_DIR = os.path.join(claude, "memory_archive")
+        ma.ARCHIVE_PACK = os.path.join(ma.ARCHIVE_DIR, "archive.pack")
+        ma.ARCHIVE_INDEX = os.path.join(ma.ARCHIVE_DIR, "archive_index.json")
+        self.assertEqual(ma.archive_cold(), ["topic:kiln-controller.md"])
+        # Linked again later; a single keyword hit is far below the old restore score
+        with open(os.path.join(self.memory_dir, "MEMORY.md"), "w") as f:
+            f.write("**Kiln Controller** | Active | kiln | [kiln-controller.md](kiln-controller.md)\n")
+        env = dict(os.environ, HOME=home, USERPROFILE=home, CLAUDE_MEMORY_METRICS="0")
+        env.pop("MEMORY_SERVER_URL", None)
+        proc = subprocess.run([sys.executable, str(HOOKS_DIR / "memory_search.py")],
+                              input=json.dumps({"session_id": "s1", "prompt": "check the kiln"}).encode(),
+                              capture_output=True, env=env, timeout=30)
+        self.assertTrue(os.path.exists(topic))
+        self.assertIn(b"PID tuning", proc.stdout)
+
+
+class TestMemoryIndexBuilder(TestCase):
+    """Tests for memory_index_builder.py — compiled index from topic-file frontmatter."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.memory_dir = os.path.join(self.tmpdir, "memory")
+        os.makedirs(self.memory_dir)
+        self.index_path = os.path.join(self.memory_dir, "MEMORY.md")
+        with open(self.index_path, "w") as f:
+            f.write("- [Kiln notes](kiln.md) — the notes about the project kiln and various other words\n")
+        with open(os.path.join(self.memory_dir, "kiln.md"), "w") as f:
+            f.write("---\nname: Kiln Controller\ndescription: PID tuning for the ceramic kiln\ntype: project\n---\n"
+                    "# Kiln\n\nThermocouple wiring and PID tuning. Project notes. Thermocouple drift.\n")
+        with open(os.path.join(self.memory_dir, "garden.md"), "w") as f:
+            f.write("---\nname: Garden Irrigation\ndescription: drip irrigation schedule\ntype: project\n---\n"
+                    "# Garden\n\nSolenoid valves on the drip line. Project notes.\n")
+        self.compiled = os.path.join(self.tmpdir, "memory_index.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _import_builder(self):
+        import importlib
+        import memory_index_builder
+        importlib.reload(memory_index_builder)
+        memory_index_builder.MEMORY_DIR = self.memory_dir
+        memory_index_builder.COMPILED_INDEX = self.compiled
+        memory_index_builder.BUILDER_STATE = os.path.join(self.tmpdir, "memory_index_state.json")
+        memory_index_builder.MEMORY_PRIORS = os.path.join(self.tmpdir, "memory_priors.json")
+        return memory_index_builder
+
+    def test_frontmatter_and_tfidf_keywords(self):
+        mib = self._import_builder()
+        self.assertEqual(mib.build_index(), 2)
+        files = mib.load_compiled(self.compiled)
+        kiln = files["kiln.md"]
+        self.assertEqual(kiln["name"], "Kiln Controller")
+        self.assertEqual(kiln["type"], "project")
+        self.assertIn("thermocouple", kiln["keywords"])
+        # "project"/"notes" appear in every file — low IDF ranks them below distinctive terms
+        self.assertLess(kiln["keywords"].index("thermocouple"),
+                        kiln["keywords"].index("notes") if "notes" in kiln["keywords"] else 99)
+
+    def test_incremental_rebuild(self):
+        mib = self._import_builder()
+        mib.build_index()
+        self.assertEqual(mib.build_index(), 0)
+        with open(os.path.join(self.memory_dir, "garden.md"), "a") as f:
+            f.write("Rain sensor added.\n")
+        self.assertEqual(mib.build_index(), 1)
+        self.assertIn("rain", mib.load_compiled(self.compiled)["garden.md"]["keywords"])
+
+    def test_index_writers_wait_for_the_index_lock(self):
+        mib = self._import_builder()
+        mib.build_index()
+        mib.INDEX_LOCK_TIMEOUT = 0.01
+        with open(os.path.join(self.memory_dir, "garden.md"), "a") as f:
+            f.write("Rain sensor added.\n")
+        with mib.state_store.locked(self.compiled) as held:
+            self.assertTrue(held)
+            self.assertEqual(mib.build_index(), 0)
+            mib.apply_priors({"kiln.md": 1.5})
+        files = mib.load_compiled(self.compiled)
+        self.assertNotIn("rain", files["garden.md"]["keywords"])
+        self.assertNotIn("prior", files["kiln.md"])
+        # The skipped build left the builder state alone, so the next one catches up
+        self.assertEqual(mib.build_index(), 1)
+        mib.apply_priors({"kiln.md": 1.5})
+        files = mib.load_compiled(self.compiled)
+        self.assertIn("rain", files["garden.md"]["keywords"])
+        self.assertEqual(files["kiln.md"]["prior"], 1.5)
+
+    def test_memory_md_untouched_and_merged(self):
+        mib = self._import_builder()
+        before = open(self.index_path).read()
+        mib.build_index()
+        self.assertEqual(open(self.index_path).read(), before)
+
+        import importlib
+        import memory_search
+        importlib.reload(memory_search)
+        memory_search.memory_index_builder = mib
+        entries = memory_search.load_entries(self.index_path, self.compiled)
+        by_file = {e["file"]: e for e in entries}
+        # Dash-list filler words are replaced by compiled keywords
+        self.assertNotIn("various", by_file["kiln.md"]["keywords"])
+        self.assertIn("thermocouple", by_file["kiln.md"]["keywords"])
+        # Files not listed in MEMORY.md still become searchable
+        self.assertEqual(by_file["garden.md"]["source"], "compiled")
+
+
+class TestCoactivationGraph(TestCase):
+    """Tests for coactivation_graph.py — CSR adjacency + spreading activation."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.graph_path = os.path.join(self.tmpdir, "coactivation_graph.json")
+        # a -- b -- c chain, plus d -- e island
+        self.pairs = {
+            "a.md||b.md": {"count": 3},
+            "b.md||c.md": {"count": 3},
+            "d.md||e.md": {"count": 1},
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _import_graph(self):
+        import importlib
+        import coactivation_graph
+        importlib.reload(coactivation_graph)
+        coactivation_graph.COACTIVATION_GRAPH = self.graph_path
+        return coactivation_graph
+
+    def test_csr_is_symmetric(self):
+        cg = self._import_graph()
+        nodes, indptr, indices, weights = cg.compile_csr(self.pairs)
+        self.assertEqual(nodes, ["a.md", "b.md", "c.md", "d.md", "e.md"])
+        b = nodes.index("b.md")
+        self.assertEqual(sorted(indices[indptr[b]:indptr[b + 1]]), [0, 2])
+        self.assertEqual(len(indices), 6)
+
+    def test_one_hop_matches_legacy_boost(self):
+        cg = self._import_graph()
+        graph = cg.update_graph(self.pairs, path=self.graph_path)
+        boosts = cg.spread_boosts(graph, ["a.md"])
+        # log2(3 + 1) = 2.0 — same as get_coactivation_boost
+        self.assertAlmostEqual(boosts["b.md"], 2.0, places=3)
+
+    def test_multi_hop_reaches_unmentioned_file(self):
+        cg = self._import_graph()
+        graph = cg.update_graph(self.pairs, path=self.graph_path)
+        boosts = cg.spread_boosts(graph, ["a.md"])
+        self.assertIn("c.md", boosts)
+        self.assertLess(boosts["c.md"], boosts["b.md"])
+        self.assertNotIn("d.md", boosts)
+
+    def test_incremental_update_matches_full_rebuild(self):
+        cg = self._import_graph()
+        cg.update_graph(self.pairs, path=self.graph_path)
+        self.pairs["e.md||f.md"] = {"count": 2}
+        incremental = cg.update_graph(self.pairs, {"e.md", "f.md"}, self.graph_path)
+        full = cg.update_graph(self.pairs, path=os.path.join(self.tmpdir, "full.json"))
+        self.assertEqual(incremental, full)
+
+    def _import_ptu(self, memory_dir):
+        import importlib
+        import post_tool_use
+        importlib.reload(post_tool_use)
+        post_tool_use.FILE_TRACKING = Path(self.tmpdir) / "tracking.jsonl"
+        post_tool_use.COACTIVATION_LOG = Path(self.tmpdir) / "coact.json"
+        post_tool_use.COACTIVATION_GRAPH = Path(self.graph_path)
+        post_tool_use.PREFETCH_FILE = Path(self.tmpdir) / "memory_prefetch.json"
+        post_tool_use.MEMORY_DIR = Path(memory_dir)
+        return post_tool_use
+
+    def test_post_tool_use_queues_memory_files_only(self):
+        memory_dir = os.path.join(self.tmpdir, "memory")
+        x, y = os.path.join(memory_dir, "x.md"), os.path.join(memory_dir, "y.md")
+        ptu = self._import_ptu(memory_dir)
+        now = time.time()
+        with open(ptu.FILE_TRACKING, "w") as f:
+            for fp in (x, "/repo/README.md"):
+                f.write(json.dumps({"timestamp": now - 10, "tool": "Read", "file_path": fp}) + "\n")
+        ptu.update_coactivation(y, now)
+        # Pairs are counted; the graph is not rebuilt on the tool path
+        self.assertEqual(len(load_state(ptu.COACTIVATION_LOG)), 2)
+        self.assertFalse(os.path.exists(self.graph_path))
+        cg = self._import_graph()
+        self.assertEqual(sorted(load_state(cg.dirty_path(self.graph_path))), [x, y])
+
+        graph = cg.rebuild_if_dirty(self.graph_path, str(ptu.COACTIVATION_LOG), memory_dir)
+        self.assertEqual(graph["nodes"], [x, y])
+        self.assertEqual(cg.load_graph(self.graph_path)["nodes"], [x, y])
+        # Queue drained: the next Stop has nothing to do
+        self.assertIsNone(cg.rebuild_if_dirty(self.graph_path, str(ptu.COACTIVATION_LOG), memory_dir))
+
+    def test_repo_file_pairs_queue_nothing(self):
+        memory_dir = os.path.join(self.tmpdir, "memory")
+        ptu = self._import_ptu(memory_dir)
+        now = time.time()
+        with open(ptu.FILE_TRACKING, "w") as f:
+            f.write(json.dumps({"timestamp": now - 10, "tool": "Read", "file_path": "/repo/a.py"}) + "\n")
+        ptu.update_coactivation(os.path.join(memory_dir, "x.md"), now)
+        cg = self._import_graph()
+        self.assertFalse(os.path.exists(cg.dirty_path(self.graph_path)))
+
+    def test_rebuild_keeps_entries_queued_meanwhile(self):
+        cg = self._import_graph()
+        cg.mark_dirty(["a.md"], 100.0, self.graph_path)
+        import state_store
+        state_store.update(cg.dirty_path(self.graph_path), "drop_seen", values={"a.md": 50.0})
+        self.assertEqual(state_store.load(cg.dirty_path(self.graph_path)), {"a.md": 100.0})
+        state_store.update(cg.dirty_path(self.graph_path), "drop_seen", values={"a.md": 100.0})
+        self.assertEqual(state_store.load(cg.dirty_path(self.graph_path)), {})
+
+
+class TestPartitionedRetrieval(TestCase):
+    """Tests for wing/category-routed retrieval (memory_search.py + stop_hook.py)."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.memory_dir = os.path.join(self.tmpdir, "memory")
+        os.makedirs(self.memory_dir)
+        self.index_path = os.path.join(self.memory_dir, "MEMORY.md")
+        with open(self.index_path, "w") as f:
+            f.write("# Index\n")
+        with open(os.path.join(self.memory_dir, "kiln.md"), "w") as f:
+            f.write("# Kiln Controller\n\nThermocouple wiring and PID tuning.\n")
+        with open(os.path.join(self.memory_dir, "feedback_commits.md"), "w") as f:
+            f.write("# Commit Style\n\nShort imperative subjects, no emoji.\n")
+        self.compiled = os.path.join(self.tmpdir, "memory_index.json")
+        self.memories_dir = Path(self.tmpdir) / "memories"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _import_search(self):
+        import importlib
+        import memory_index_builder
+        import memory_search
+        importlib.reload(memory_index_builder)
+        memory_index_builder.MEMORY_DIR = self.memory_dir
+        memory_index_builder.COMPILED_INDEX = self.compiled
+        memory_index_builder.BUILDER_STATE = os.path.join(self.tmpdir, "memory_index_state.json")
+        memory_index_builder.MEMORY_PRIORS = os.path.join(self.tmpdir, "memory_priors.json")
+        memory_index_builder.build_index()
+        importlib.reload(memory_search)
+        memory_search.memory_index_builder = memory_index_builder
+        memory_search.MEMORY_DIR = self.memory_dir
+        memory_search.COMPILED_INDEX = self.compiled
+        memory_search.JSON_MEMORIES_INDEX = str(self.memories_dir / "index.jsonl")
+        memory_search.JSON_PARTITION_MARKER = str(self.memories_dir / ".partitioned")
+        return memory_search
+
+    def test_compiled_index_partitioned_by_wing(self):
+        ms = self._import_search()
+        parts = ms.memory_index_builder.load_partitions(self.compiled)
+        self.assertEqual(parts["wing_feedback"]["files"], ["feedback_commits.md"])
+        self.assertEqual(parts["wing_infrastructure"]["files"], ["kiln.md"])
+        self.assertIn("thermocouple", parts["wing_infrastructure"]["vocab"])
+
+    def test_router_picks_matching_wing(self):
+        ms = self._import_search()
+        entries = ms.load_entries(self.index_path, self.compiled)
+        parts = ms.memory_index_builder.load_partitions(self.compiled)
+        self.assertEqual(ms.route_partitions({"thermocouple"}, entries, parts), {"wing_infrastructure"})
+        # Hint words route even without a vocabulary hit
+        self.assertEqual(ms.route_partitions({"prefer"}, entries, parts), {"wing_feedback"})
+        # Nothing recognised: search everything
+        self.assertIsNone(ms.route_partitions({"zzz"}, entries, parts))
+
+    def test_warm_entries_survive_routing(self):
+        ms = self._import_search()
+        entries = ms.load_entries(self.index_path, self.compiled)
+        attn = {"scores": {"feedback_commits.md": {"score": 0.5}}}
+        kept = ms.select_candidates(entries, {"wing_infrastructure"}, {}, attn)
+        self.assertEqual({e["file"] for e in kept}, {"kiln.md", "feedback_commits.md"})
+        kept = ms.select_candidates(entries, {"wing_infrastructure"}, {}, {"scores": {}})
+        self.assertEqual([e["file"] for e in kept], ["kiln.md"])
+        self.assertEqual(ms.wing_filter({"wing_meta"}), {"wing": "wing_meta"})
+        self.assertEqual(ms.wing_filter({"b", "a"}), {"wing": {"$in": ["a", "b"]}})
+
+    def test_routing_falls_back_when_routed_wings_have_no_match(self):
+        ms = self._import_search()
+        entries = ms.load_entries(self.index_path, self.compiled)
+        # "prefer" routes to wing_feedback by hint only; "thermo" matches kiln.md
+        # by partial keyword, which exact routing cannot see
+        words = {"prefer", "thermo"}
+        wings = ms.route_partitions(words, entries, ms.memory_index_builder.load_partitions(self.compiled))
+        self.assertEqual(wings, {"wing_feedback"})
+        kept = ms.select_candidates(entries, wings, {}, {"scores": {}}, words=words)
+        self.assertIn("kiln.md", {e["file"] for e in kept})
+        # A routed entry that matches keeps the routing
+        kept = ms.select_candidates(entries, wings, {}, {"scores": {}}, words={"prefer", "commit"})
+        self.assertEqual([e["file"] for e in kept], ["feedback_commits.md"])
+
+    def test_partition_split_runs_under_index_lock(self):
+        import importlib
+        import state_store
+        import stop_hook
+        importlib.reload(stop_hook)
+        stop_hook.MEMORIES_DIR = self.memories_dir
+        self.memories_dir.mkdir()
+        held = []
+        real = stop_hook.partition_json_index
+
+        def probe():
+            with state_store.locked(self.memories_dir / "index.jsonl", 0) as free:
+                held.append(not free)
+            real()
+        with patch.object(stop_hook, "partition_json_index", probe):
+            stop_hook.save_memory("constraint", "Never deploy kiln firmware on fridays.", {})
+        self.assertEqual(held, [True])
+
+    def test_partition_split_skipped_without_index_lock(self):
+        import importlib
+        import state_store
+        import stop_hook
+        importlib.reload(stop_hook)
+        stop_hook.MEMORIES_DIR = self.memories_dir
+        self.memories_dir.mkdir()
+        with state_store.locked(self.memories_dir / "index.jsonl"), \
+                patch.object(stop_hook.state_store, "LOCK_TIMEOUT", 0.01), \
+                patch.object(stop_hook, "partition_json_index", side_effect=AssertionError("split unlocked")):
+            self.assertTrue(stop_hook.save_memory("constraint", "Never deploy kiln firmware on fridays.", {}))
+        with open(self.memories_dir / "constraint" / "index.jsonl") as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_json_memories_split_by_category(self):
+        import importlib
+        import stop_hook
+        importlib.reload(stop_hook)
+        stop_hook.MEMORIES_DIR = self.memories_dir
+        stop_hook.HASH_FILE = Path(self.tmpdir) / "memory_hashes.json"
+        # Pre-existing consolidated log is migrated on the first save
+        self.memories_dir.mkdir()
+        with open(self.memories_dir / "index.jsonl", "w") as f:
+            f.write(json.dumps({"category": "constraint", "content": "never deploy kiln firmware on fridays"}) + "\n")
+        stop_hook.save_memory("session_summary", "Worked on the kiln firmware deploy today.", {})
+        self.assertTrue((self.memories_dir / ".partitioned").exists())
+        self.assertTrue((self.memories_dir / "constraint" / "index.jsonl").exists())
+        self.assertTrue((self.memories_dir / "session_summary" / "index.jsonl").exists())
+
+        ms = self._import_search()
+        self.assertNotIn(str(self.memories_dir / "index.jsonl"), ms.json_index_paths())
+        hits = ms.search_json_memories({"kiln", "firmware", "deploy"})
+        self.assertEqual([h[1] for h in hits], ["constraint"])
+
+
+class TestMemoryPriors(TestCase):
+    """Tests for memory_priors.py — usefulness priors learned from injections + file access."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.memory_dir = os.path.join(self.tmpdir, "memory")
+        os.makedirs(self.memory_dir)
+        for name in ("useful.md", "ignored.md"):
+            with open(os.path.join(self.memory_dir, name), "w") as f:
+                f.write(f"# {name}\n\nNotes about {name[:-3]} things.\n")
+        self.now = time.time()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _import_priors(self):
+        import importlib
+        import memory_index_builder
+        import memory_priors
+        importlib.reload(memory_index_builder)
+        importlib.reload(memory_priors)
+        memory_index_builder.MEMORY_DIR = self.memory_dir
+        memory_index_builder.COMPILED_INDEX = os.path.join(self.tmpdir, "memory_index.json")
+        memory_index_builder.BUILDER_STATE = os.path.join(self.tmpdir, "memory_index_state.json")
+        memory_index_builder.MEMORY_PRIORS = os.path.join(self.tmpdir, "memory_priors.json")
+        memory_priors.memory_index_builder = memory_index_builder
+        memory_priors.RESULT_FILE = os.path.join(self.tmpdir, "result.txt")
+        memory_priors.ACCESS_LOG = os.path.join(self.tmpdir, "access_log.json")
+        memory_priors.FILE_TRACKING = os.path.join(self.tmpdir, "file_tracking.jsonl")
+        memory_priors.MEMORY_PRIORS = memory_index_builder.MEMORY_PRIORS
+        memory_priors.MEMORY_DIR = self.memory_dir
+        return memory_priors
+
+    def _session(self, mp, offset):
+        """One simulated session: both files injected, only useful.md read afterwards."""
+        injected_at = self.now - offset
+        with open(mp.ACCESS_LOG, "w") as f:
+            json.dump({"useful.md": injected_at, "ignored.md": injected_at}, f)
+        with open(mp.FILE_TRACKING, "a") as f:
+            f.write(json.dumps({"timestamp": injected_at + 30, "tool": "Read",
+                                "file_path": os.path.join(self.memory_dir, "useful.md")}) + "\n")
+        return mp.update_priors(now=self.now)
+
+    def test_used_files_gain_prior(self):
+        mp = self._import_priors()
+        for i in range(6):
+            priors = self._session(mp, 10000 - i * 1000)
+        self.assertGreater(priors["useful.md"], 1.0)
+        self.assertLess(priors["ignored.md"], 1.0)
+        self.assertGreaterEqual(priors["ignored.md"], mp.MIN_PRIOR)
+
+    def test_injection_counted_once(self):
+        mp = self._import_priors()
+        self._session(mp, 5000)
+        mp.update_priors(now=self.now)
+        state = mp.load_state()
+        self.assertEqual(state["files"]["useful.md"]["injected"], 1)
+        self.assertEqual(state["files"]["useful.md"]["used"], 1)
+
+    def test_same_name_outside_memory_dir_not_a_use(self):
+        mp = self._import_priors()
+        injected_at = self.now - 5000
+        with open(mp.ACCESS_LOG, "w") as f:
+            json.dump({"ignored.md": injected_at}, f)
+        with open(mp.FILE_TRACKING, "w") as f:
+            f.write(json.dumps({"timestamp": injected_at + 30, "tool": "Edit",
+                                "file_path": os.path.join(self.tmpdir, "repo", "ignored.md")}) + "\n")
+        mp.update_priors(now=self.now)
+        self.assertEqual(mp.load_state()["files"]["ignored.md"]["used"], 0)
+
+    def test_recent_injection_deferred(self):
+        mp = self._import_priors()
+        priors = self._session(mp, 60)  # use window still open
+        self.assertEqual(priors, {"useful.md": 1.0, "ignored.md": 1.0})
+        self.assertEqual(mp.load_state()["files"]["useful.md"]["injected"], 0)
+
+    def test_priors_flow_into_scoring(self):
+        mp = self._import_priors()
+        mp.memory_index_builder.build_index()
+        for i in range(6):
+            self._session(mp, 10000 - i * 1000)
+        # A rebuild keeps the learned priors
+        mp.memory_index_builder.build_index(force=True)
+
+        import importlib
+        import memory_search
+        importlib.reload(memory_search)
+        memory_search.memory_index_builder = mp.memory_index_builder
+        memory_search.MEMORY_DIR = self.memory_dir
+        entries = memory_search.load_entries(os.path.join(self.memory_dir, "MEMORY.md"),
+                                             mp.memory_index_builder.COMPILED_INDEX)
+        by_file = {e["file"]: e for e in entries}
+        score = lambda e: memory_search.score_entry(e, {"notes", "things"}, {}, {"scores": {}}, {}, [])
+        self.assertGreater(score(by_file["useful.md"]), score(by_file["ignored.md"]))
+
+
+class TestPrefetch(TestCase):
+    """Tests for PostToolUse prefetch hints consumed by memory_search.py."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.memory_dir = os.path.join(self.tmpdir, "memory")
+        os.makedirs(self.memory_dir)
+        self.topic = os.path.join(self.memory_dir, "deploy.md")
+        with open(self.topic, "w") as f:
+            f.write("# Deploy\n\n## Steps\nRestart the worker fleet.\n\n## History\nOld notes.\n")
+        self.graph_path = os.path.join(self.tmpdir, "coactivation_graph.json")
+        self.prefetch = os.path.join(self.tmpdir, "memory_prefetch.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _import_ptu(self):
+        import importlib
+        import coactivation_graph
+        import post_tool_use
+        importlib.reload(post_tool_use)
+        post_tool_use.MEMORY_DIR = Path(self.memory_dir)
+        post_tool_use.COACTIVATION_GRAPH = Path(self.graph_path)
+        post_tool_use.PREFETCH_FILE = Path(self.prefetch)
+        post_tool_use.COACTIVATION_LOG = Path(self.tmpdir) / "coactivation_pairs.json"
+        self.runbook = os.path.join(self.memory_dir, "runbook.md")
+        coactivation_graph.update_graph({f"{self.runbook}||{self.topic}": {"count": 3},
+                                         f"{self.runbook}||/src/other.py": {"count": 3}},
+                                        path=self.graph_path)
+        return post_tool_use
+
+    def test_prefetch_lists_linked_memory_files(self):
+        ptu = self._import_ptu()
+        ptu.update_prefetch(self.runbook, time.time(), "s1")
+        hints = load_state(self.prefetch)["s1"]["files"]
+        # Only memory topic files, not the other source file (an old graph may list it)
+        self.assertEqual(list(hints), ["deploy.md"])
+        self.assertIn("Restart the worker fleet", hints["deploy.md"]["section"])
+        self.assertNotIn("Old notes", hints["deploy.md"]["section"])
+        self.assertEqual(hints["deploy.md"]["section_tokens"], len(hints["deploy.md"]["section"]) // 4)
+
+    def test_unchanged_section_carried_over(self):
+        ptu = self._import_ptu()
+        ptu.update_prefetch(self.runbook, time.time(), "s1")
+        with patch.object(ptu, "extract_first_section", side_effect=AssertionError("re-read")):
+            ptu.update_prefetch(self.runbook, time.time(), "s1")
+
+    def test_repo_file_touch_keeps_existing_hints(self):
+        ptu = self._import_ptu()
+        ptu.update_prefetch(self.runbook, time.time(), "s1")
+        ptu.update_prefetch("/repo/src/app.py", time.time(), "s1")
+        hints = load_state(self.prefetch)["s1"]
+        self.assertEqual(list(hints["files"]), ["deploy.md"])
+        self.assertEqual(hints["source"], self.runbook)
+
+    def test_repo_file_seeds_spread_from_pair_counts(self):
+        ptu = self._import_ptu()
+        with open(ptu.COACTIVATION_LOG, "w") as f:
+            json.dump({f"/repo/src/worker.py||{self.runbook}": {"count": 2}}, f)
+        ptu.update_prefetch("/repo/src/worker.py", time.time(), "s1")
+        # runbook.md is its direct partner (no file on disk); deploy.md is reached through the graph
+        self.assertEqual(list(load_state(self.prefetch)["s1"]["files"]), ["deploy.md"])
+
+    def test_hints_kept_per_session(self):
+        ptu = self._import_ptu()
+        ptu.update_prefetch(self.runbook, time.time(), "s1")
+        ptu.update_prefetch("/src/unlinked.py", time.time(), "s2")
+        import importlib
+        import memory_search
+        importlib.reload(memory_search)
+        self.assertIn("deploy.md", memory_search.load_prefetch("s1", self.prefetch))
+        self.assertEqual(memory_search.load_prefetch("s2", self.prefetch), {})
+        self.assertEqual(memory_search.load_prefetch("s3", self.prefetch), {})
+
+    def test_search_uses_fresh_hint_only(self):
+        ptu = self._import_ptu()
+        ptu.update_prefetch(self.runbook, time.time(), "s1")
+        import importlib
+        import memory_search
+        importlib.reload(memory_search)
+        hints = memory_search.load_prefetch("s1", self.prefetch)
+        self.assertIn("deploy.md", hints)
+        self.assertEqual(memory_search.load_prefetch("s1", self.prefetch, now=time.time() + 3600), {})
+
+        hint = dict(hints["deploy.md"], section="PREFETCHED")
+        level, text, _ = memory_search.choose_injection(self.topic, 5, 0.5, {}, 12000, hint)
+        self.assertEqual((level, text), ("section", "PREFETCHED"))
+        # A file edited since the hint was taken is read again
+        with open(self.topic, "a") as f:
+            f.write("More.\n")
+        level, text, _ = memory_search.choose_injection(self.topic, 5, 0.5, {}, 12000, hint)
+        self.assertIn("Restart the worker fleet", text)
+
+
+class TestSessionHistory(TestCase):
+    """Tests for session_history.py — append-only store with time + term indexes."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # Wednesday 2026-10-14 12:00 local time
+        self.now = datetime(2026, 10, 14, 12, 0).timestamp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _import_history(self):
+        import importlib
+        import session_history
+        importlib.reload(session_history)
+        session_history.HISTORY_DIR = self.tmpdir
+        session_history.HISTORY_LOG = os.path.join(self.tmpdir, "history.jsonl")
+        session_history.HISTORY_INDEX = os.path.join(self.tmpdir, "history_index.json")
+        session_history.HISTORY_INDEX_DELTA = os.path.join(self.tmpdir, "history_index.delta.jsonl")
+        return session_history
+
+    def _seed(self, sh):
+        day = 86400
+        sh.append_record("stop", "s1", "/repos/kiln", "Tuned the kiln PID loop", ["/repos/kiln/pid.py"],
+                         ts=self.now - day)        # Tuesday
+        sh.append_record("stop", "s2", "/repos/garden", "Drip irrigation schedule", ["/repos/garden/valves.py"],
+                         ts=self.now - day - 3600)  # Tuesday
+        sh.append_record("session_end", "s3", "/repos/kiln", "Thermocouple wiring", [],
+                         ts=self.now - 8 * day)     # previous Tuesday
+
+    def test_parse_time_phrase(self):
+        sh = self._import_history()
+        start, end = sh.parse_time_phrase("what was I doing last Tuesday", self.now)
+        self.assertEqual(datetime.fromtimestamp(start), datetime(2026, 10, 13))
+        self.assertEqual(end - start, 86400)
+        start, _ = sh.parse_time_phrase("anything 2026-10-01?", self.now)
+        self.assertEqual(datetime.fromtimestamp(start), datetime(2026, 10, 1))
+        self.assertIsNone(sh.parse_time_phrase("fix the kiln", self.now))
+
+    def test_today_and_weekdays_need_a_qualifier(self):
+        sh = self._import_history()
+        for prompt in ("deploy the kiln today", "prep the friday release", "monday standup notes"):
+            self.assertIsNone(sh.parse_time_phrase(prompt, self.now), prompt)
+        for prompt in ("what did I change today", "earlier today", "on friday", "what was I fixing monday"):
+            self.assertIsNotNone(sh.parse_time_phrase(prompt, self.now), prompt)
+        start, _ = sh.parse_time_phrase("what did I fix monday", self.now)
+        self.assertEqual(datetime.fromtimestamp(start), datetime(2026, 10, 12))
+
+    def test_append_does_not_rewrite_index(self):
+        sh = self._import_history()
+        self._seed(sh)
+        sh.rebuild()
+        with patch.object(sh, "save_index", side_effect=AssertionError("index rewritten")):
+            sh.append_record("stop", "s4", "/repos/kiln", "Glaze firing log", [], ts=self.now)
+            self.assertEqual([r["session_id"] for r in sh.query(terms=["glaze"], require_terms=True)], ["s4"])
+        # A full delta is folded into the index and emptied
+        sh.MAX_DELTA_BYTES = 0
+        sh.append_record("stop", "s5", "/repos/kiln", "Cone 6 schedule", [], ts=self.now)
+        self.assertEqual(os.path.getsize(sh.HISTORY_INDEX_DELTA), 0)
+        self.assertEqual(len(sh.load_index(catch_up=False)["offsets"]), 5)
+
+    def test_time_range_and_terms(self):
+        sh = self._import_history()
+        self._seed(sh)
+        day = sh.parse_time_phrase("last tuesday", self.now)
+        self.assertEqual({r["session_id"] for r in sh.query(*day)}, {"s1", "s2"})
+        # Terms narrow the window; paths and cwd are indexed too
+        self.assertEqual([r["session_id"] for r in sh.query(*day, terms=["valves"])], ["s2"])
+        # Without a time phrase, ranked by term overlap: s3 matches both terms, s1 only "kiln"
+        self.assertEqual([r["session_id"] for r in sh.search_text("kiln thermocouple", now=self.now)], ["s3", "s1"])
+
+    def test_ranks_on_index_and_reads_only_the_top_records(self):
+        sh = self._import_history()
+        self._seed(sh)
+        for i in range(20):
+            sh.append_record("stop", f"n{i}", "/repos/other", "Unrelated chores", [], ts=self.now - 86400 - 7200 - i)
+        day = sh.parse_time_phrase("last tuesday", self.now)
+        read = []
+        real_read = sh.read_record
+        with patch.object(sh, "read_record", side_effect=lambda index, rid: read.append(rid) or real_read(index, rid)):
+            # No term hit: the cwd match lifts the older garden record above the kiln one
+            records = sh.query(*day, terms=["nothing"], cwd="/repos/garden", limit=2)
+        self.assertEqual([r["session_id"] for r in records], ["s2", "s1"])
+        self.assertEqual(len(read), 2)
+
+    def test_index_catches_up_with_log(self):
+        sh = self._import_history()
+        self._seed(sh)
+        # Another process appended without updating the index
+        with open(sh.HISTORY_LOG, "a") as f:
+            f.write(json.dumps({"ts": self.now, "kind": "stop", "summary": "Rewrote the glaze notes"}) + "\n")
+        self.assertEqual(len(sh.query(terms=["glaze"], require_terms=True)), 1)
+        self.assertEqual(sh.rebuild(), 4)
+
+    def test_memory_search_answers_time_questions(self):
+        sh = self._import_history()
+        self._seed(sh)
+        import importlib
+        import memory_search
+        importlib.reload(memory_search)
+        memory_search.session_history = sh
+        with patch.object(sh.time, "time", return_value=self.now):
+            hits = memory_search.search_session_history("what was I doing on the kiln last tuesday",
+                                                        {"kiln", "tuesday"}, "/repos/kiln")
+            self.assertEqual(hits[0]["session_id"], "s1")
+            self.assertEqual(memory_search.search_session_history("fix the kiln", {"kiln"}), [])
+
+
+class TestWorkingSetCheckpoint(TestCase):
+    """Tests for the PreCompact working-set checkpoint restored by SessionStart."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.memory_dir = Path(self.tmpdir) / "memory"
+        self.memory_dir.mkdir()
+        for name, body in (("hot.md", "Hot notes."), ("shown.md", "Shown notes."),
+                           ("cold.md", "Cold notes."), ("big.md", "x" * 5000)):
+            (self.memory_dir / name).write_text(f"# {name}\n\n{body}\n")
+        self.attn = Path(self.tmpdir) / "attn_state.json"
+        self.attn.write_text(json.dumps({"scores": {
+            str(self.memory_dir / "hot.md"): {"score": 1.0},
+            "cold.md": {"score": 0.1},
+            "/src/app.py": {"score": 0.9},
+        }}))
+        self.result = Path(self.tmpdir) / "result.txt"
+        self.result.write_text(f"Shown|{self.memory_dir / 'shown.md'}.warm|7.0\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _import_hooks(self):
+        import importlib
+        import precompact_save
+        import session_start
+        importlib.reload(precompact_save)
+        importlib.reload(session_start)
+        precompact_save.MEMORY_DIR = self.memory_dir
+        precompact_save.ATTN_STATE = self.attn
+        precompact_save.RESULT_FILE = self.result
+        precompact_save.COACTIVATION_GRAPH = Path(self.tmpdir) / "coactivation_graph.json"
+        precompact_save.ATTN_SESSIONS_DIR = Path(self.tmpdir) / "attn_sessions"
+        session_start.ATTN_SESSIONS_DIR = Path(self.tmpdir) / "attn_sessions"
+        session_start.MEMORY_DIR = self.memory_dir
+        session_start.ATTN_STATE = self.attn
+        precompact_save.WORKING_SET_DIR = Path(self.tmpdir)
+        session_start.memory_summaries = None
+        return precompact_save, session_start
+
+    def _overlay(self, pc, session_id, scores):
+        path = pc.attention_state.overlay_path(session_id, str(pc.ATTN_SESSIONS_DIR))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"scores": scores, "last_update": time.time()}, f)
+
+    def test_checkpoint_ranks_working_set(self):
+        pc, _ = self._import_hooks()
+        now = time.time()
+        self._overlay(pc, "s1", {"shown.md": {"score": 0.2, "last_access": now}})
+        ws = pc.build_working_set("s1", "/repo", now)
+        self.assertEqual([m["file"] for m in ws["memories"]], ["hot.md", "shown.md"])
+        self.assertTrue(ws["memories"][1]["injected"])
+        # Non-memory files keep their attention, cold entries are dropped
+        self.assertIn("/src/app.py", ws["attention"])
+        self.assertNotIn("cold.md", ws["attention"])
+
+    def test_injection_set_comes_from_session_overlay(self):
+        pc, _ = self._import_hooks()
+        now = time.time()
+        # shown.md is in the global result file, but only another session injected it
+        self._overlay(pc, "s1", {"cold.md": {"score": 0.3, "last_access": now},
+                                 "big.md": {"score": 0.3, "last_access": now - 600},
+                                 str(self.memory_dir / "hot.md"): {"score": 1.0, "last_access": now + 60}})
+        ws = pc.build_working_set("s1", "/repo", now)
+        self.assertEqual({m["file"] for m in ws["memories"] if m["injected"]}, {"cold.md"})
+        self.assertNotIn("shown.md", [m["file"] for m in ws["memories"]])
+
+    def test_restore_never_lowers_attention(self):
+        _, ss = self._import_hooks()
+        self.attn.write_text(json.dumps({"scores": {"a.md": {"score": 0.9}, "b.md": {"score": 0.1}}}))
+        ss.restore_attention({"a.md": 0.5, "b.md": 0.8}, time.time())
+        scores = load_state(self.attn)["scores"]
+        self.assertEqual(scores["a.md"]["score"], 0.9)
+        self.assertEqual(scores["b.md"]["score"], 0.8)
+
+    def test_preinjection_respects_budget(self):
+        _, ss = self._import_hooks()
+        memories = [{"file": "big.md"}, {"file": "hot.md"}, {"file": "shown.md"}]
+        parts = ss.working_set_parts(memories, 200)
+        # big.md does not fit (and has no summary) — the smaller ones still do
+        self.assertEqual([p[0] for p in parts], ["hot.md", "shown.md"])
+        self.assertLessEqual(sum(len(p[2]) for p in parts), 200)
+
+    def _restore(self, ss, session_id):
+        out = BytesIO()
+        with patch.object(sys, "stdout", type("Out", (), {"buffer": out})()):
+            ss.restore_working_set(time.time(), session_id)
+        return out.getvalue().decode("utf-8")
+
+    def test_compact_restart_resumes_warm(self):
+        pc, ss = self._import_hooks()
+        ws = pc.build_working_set("", "/repo", time.time())
+        pc.working_set_path("").write_text(json.dumps(ws))
+        self.attn.write_text(json.dumps({"scores": {}}))
+        text = self._restore(ss, "")
+        self.assertIn("[Working Set]", text)
+        self.assertIn("Hot notes.", text)
+        self.assertIn(str(self.memory_dir / "hot.md"), load_state(self.attn)["scores"])
+
+    def test_checkpoints_kept_per_session(self):
+        pc, ss = self._import_hooks()
+        for sid in ("s1", "s2"):
+            pc.working_set_path(sid).write_text(json.dumps(pc.build_working_set(sid, "/repo", time.time())))
+        self.assertNotEqual(pc.working_set_path("s1"), pc.working_set_path("s2"))
+        self.assertIn("Hot notes.", self._restore(ss, "s2"))
+        self.assertEqual(self._restore(ss, "s3"), "")
+        # A checkpoint whose recorded session differs is not restored
+        pc.working_set_path("s3").write_text(pc.working_set_path("s1").read_text())
+        self.assertEqual(self._restore(ss, "s3"), "")
+        pc.remove_working_set("s1")
+        self.assertFalse(pc.working_set_path("s1").exists())
+        self.assertTrue(pc.working_set_path("s2").exists())
+
+
+class TestAttentionState(TestCase):
+    """Tests for attention_state.py — global baseline + per-session overlays."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.baseline = os.path.join(self.tmpdir, "attn_state.json")
+        self.sessions = os.path.join(self.tmpdir, "attn_sessions")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _import_search(self):
+        import importlib
+        import attention_state
+        import memory_search
+        importlib.reload(attention_state)
+        importlib.reload(memory_search)
+        memory_search.attention_state = attention_state
+        memory_search.ATTN_STATE = self.baseline
+        memory_search.ATTN_SESSIONS_DIR = self.sessions
+        return memory_search
+
+    def _prompt(self, ms, session_id, boost_file=None):
+        """One memory_search prompt's attention bookkeeping."""
+        view, baseline, overlay = ms.load_attention(session_id)
+        if boost_file:
+            ms.attention_state.boost(baseline, overlay, boost_file, 1.0, time.time())
+        ms.save_attention(view, baseline, overlay, session_id)
+        return ms.load_attention(session_id)[0]
+
+    def test_sessions_do_not_decay_each_other(self):
+        ms = self._import_search()
+        self._prompt(ms, "B", boost_file="b-hot.md")
+        for _ in range(10):
+            self._prompt(ms, "A")
+        view_b = ms.attention_state.load_view("B", self.baseline, self.sessions)
+        self.assertEqual(ms.get_attention_score("b-hot.md", view_b), 1.0)
+        # Session A only sees the capped baseline contribution (WARM, not HOT)
+        view_a = ms.attention_state.load_view("A", self.baseline, self.sessions)
+        self.assertEqual(ms.get_attention_score("b-hot.md", view_a), ms.attention_state.BASELINE_BOOST)
+
+    def test_overlay_decays_per_own_prompt(self):
+        ms = self._import_search()
+        self._prompt(ms, "A", boost_file="a.md")
+        view = self._prompt(ms, "A")
+        # Overlay decayed once more on load; baseline still holds the capped value
+        self.assertAlmostEqual(ms.get_attention_score("a.md", view), 0.85 * 0.85, places=3)
+
+    def test_baseline_decays_by_time(self):
+        import importlib
+        import attention_state
+        importlib.reload(attention_state)
+        now = time.time()
+        with open(self.baseline, "w") as f:
+            json.dump({"scores": {"x.md": {"score": 0.4}}, "last_update": now - attention_state.BASELINE_HALF_LIFE}, f)
+        self.assertAlmostEqual(attention_state.load_baseline(self.baseline, now)["scores"]["x.md"]["score"], 0.2)
+
+    def test_session_end_gc(self):
+        ms = self._import_search()
+        for sid in ("A", "B", "C"):
+            self._prompt(ms, sid, boost_file="f.md")
+        stale = ms.attention_state.overlay_path("C", self.sessions)
+        os.utime(stale, (time.time() - 3 * 86400,) * 2)
+        self.assertEqual(ms.attention_state.gc_overlays("A", self.sessions), 2)
+        self.assertEqual(sorted(os.listdir(self.sessions)), ["B.json", "B.json.lock"])
+
+    def test_post_tool_use_boosts_overlay(self):
+        import importlib
+        import post_tool_use
+        importlib.reload(post_tool_use)
+        post_tool_use.ATTN_STATE = Path(self.baseline)
+        post_tool_use.ATTN_SESSIONS_DIR = Path(self.sessions)
+        post_tool_use.update_attention("/src/app.py", time.time(), "A")
+        ms = self._import_search()
+        self.assertEqual(ms.load_attention("A")[0]["scores"]["/src/app.py"]["score"], 0.85)
+        self.assertEqual(ms.load_attention("")[0]["scores"]["/src/app.py"]["score"], 0.5 * 0.85)
+
+
+class TestMemoryServer(TestCase):
+    """Tests for memory_server.py and memory_search's client mode."""
+
+    def setUp(self):
+        import importlib
+        import threading
+        import memory_search
+        import memory_server
+        importlib.reload(memory_search)
+        importlib.reload(memory_server)
+        self.ms, self.server_mod = memory_search, memory_server
+        self.tmpdir = tempfile.mkdtemp()
+        self.memory_dir = os.path.join(self.tmpdir, "memory")
+        os.makedirs(self.memory_dir)
+        with open(os.path.join(self.memory_dir, "MEMORY.md"), "w") as f:
+            f.write("**Deploy Runbook** | Active | deploy rollback worker release | [deploy-runbook.md](deploy-runbook.md)\n")
+        with open(os.path.join(self.memory_dir, "deploy-runbook.md"), "w") as f:
+            f.write("# Deploy Runbook\n\nRoll back the worker with `make rollback`.")
+        self.service = memory_server.MemoryService(
+            memory_dir=self.memory_dir,
+            compiled_path=os.path.join(self.tmpdir, "memory_index.json"),
+            graph_path=os.path.join(self.tmpdir, "coactivation_graph.json"),
+            access_log_path=os.path.join(self.tmpdir, "server_access.json"),
+            summary_cache_path=os.path.join(self.tmpdir, "memory_summaries.json"),
+        )
+        self.server = memory_server.make_server(self.service, port=0, token="")
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+    def _get(self, path):
+        import urllib.error
+        import urllib.request
+        try:
+            with urllib.request.urlopen(self.url + path, timeout=5) as resp:
+                return resp.status, json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_search_and_lru(self):
+        hits = self.ms.remote_search("how do I rollback the deploy worker", url=self.url, timeout=5)
+        self.assertEqual([h["file"] for h in hits], ["deploy-runbook.md"])
+        self.assertIn("make rollback", hits[0]["content"])
+        self.ms.remote_search("rollback the worker deploy", url=self.url, timeout=5)
+        self.assertEqual(self.service.cache.hits, 1)
+        # Editing the corpus invalidates the cache
+        with open(os.path.join(self.memory_dir, "MEMORY.md"), "a") as f:
+            f.write("**Other** | Active | unrelated | [other.md](other.md)\n")
+        self.ms.remote_search("rollback the worker deploy", url=self.url, timeout=5)
+        self.assertEqual(self.service.cache.hits, 1)
+
+    def test_graph_resolved_against_service_memory_dir(self):
+        import coactivation_graph
+        with open(os.path.join(self.memory_dir, "MEMORY.md"), "a") as f:
+            f.write("**Queue Notes** | Active | queue worker | [queue-notes.md](queue-notes.md)\n")
+        with open(os.path.join(self.memory_dir, "queue-notes.md"), "w") as f:
+            f.write("# Queue Notes\n\nDrain before deploys.")
+        self.assertEqual([r["file"] for r in self.service.search("rollback the deploy worker", 5)],
+                         ["deploy-runbook.md"])
+        runbook, queue = (os.path.join(self.memory_dir, n) for n in ("deploy-runbook.md", "queue-notes.md"))
+        coactivation_graph.update_graph({f"{runbook}||{queue}": {"count": 3}}, None,
+                                        self.service.graph_path, self.memory_dir)
+        # Nodes are this server's paths, not memory_search.MEMORY_DIR's
+        self.assertEqual([r["file"] for r in self.service.search("rollback the deploy worker", 5)],
+                         ["deploy-runbook.md", "queue-notes.md"])
+
+    def test_injection_tier_uses_summaries_and_attention(self):
+        import memory_summaries
+        big = os.path.join(self.memory_dir, "deploy-runbook.md")
+        with open(big, "w") as f:
+            f.write("# Deploy Runbook\n\n" + "Roll back the worker with make rollback. Check the queue first. " * 250
+                    + "\n\n## Appendix\n\nOld notes.\n")
+        cache = memory_summaries.load_cache(self.service.summary_cache_path)
+        memory_summaries.update_file(big, cache)
+        memory_summaries.save_cache(cache, self.service.summary_cache_path)
+        # Strong match, but the whole file is over the budget: the long summary fits
+        self.assertEqual(self.service.search("rollback the deploy worker")[0]["level"], "long")
+        # A WARM file in the shared attention state gets its first section
+        attention = os.path.join(self.tmpdir, "attn_state.json")
+        with open(attention, "w") as f:
+            json.dump({"scores": {"deploy-runbook.md": {"score": 0.5}}}, f)
+        self.service.attention_path = attention
+        hit = self.service.search("rollback the deploy worker")[0]
+        self.assertEqual(hit["level"], "section")
+        self.assertNotIn("Appendix", hit["content"])
+
+    def test_get_file_rejects_traversal(self):
+        status, body = self._get("/file?name=deploy-runbook.md")
+        self.assertEqual(status, 200)
+        self.assertIn("make rollback", body["content"])
+        with open(os.path.join(self.tmpdir, "secret.md"), "w") as f:
+            f.write("secret")
+        self.assertEqual(self._get("/file?name=../secret.md")[0], 404)
+
+    def test_record_access(self):
+        import urllib.request
+        req = urllib.request.Request(self.url + "/record-access", method="POST",
+                                     data=json.dumps({"files": ["deploy-runbook.md", "../x.txt"]}).encode())
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            self.assertEqual(json.loads(resp.read())["recorded"], 1)
+        self.assertIn("deploy-runbook.md", load_state(os.path.join(self.tmpdir, "server_access.json")))
+
+    def test_token_required(self):
+        server = self.server_mod.make_server(self.service, port=0, token="s3cret")
+        try:
+            import threading
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = "http://127.0.0.1:%d" % server.server_address[1]
+            self.assertEqual(self.ms.remote_search("rollback deploy", url=url, timeout=5), [])
+            self.ms.MEMORY_SERVER_TOKEN = "s3cret"
+            self.assertEqual(len(self.ms.remote_search("rollback deploy", url=url, timeout=5)), 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_client_timeout_and_merge(self):
+        import socket
+        # A socket that accepts but never answers
+        silent = socket.socket()
+        silent.bind(("127.0.0.1", 0))
+        silent.listen(1)
+        try:
+            self.ms.MEMORY_SERVER_URL = "http://127.0.0.1:%d" % silent.getsockname()[1]
+            self.ms.REMOTE_TIMEOUT = 0.2
+            start = time.time()
+            self.assertEqual(self.ms.start_remote_search("rollback deploy")(), [])
+            self.assertLess(time.time() - start, 1.0)
+        finally:
+            silent.close()
+        local = [(9.0, {"file": "a.md"}), (5.0, {"file": "b.md"})]
+        remote = [{"file": "a.md", "score": 20.0}, {"file": "c.md", "score": 7.0}]
+        top, hits = self.ms.merge_remote(local, remote)
+        self.assertEqual([e["file"] for _, e in top], ["a.md", "b.md"])
+        self.assertEqual([h["file"] for h in hits], ["c.md"])
+
+
+class TestMemorySync(TestCase):
+    """Tests for memory_sync.py — content-addressed delta sync."""
+
+    def setUp(self):
+        import importlib
+        import memory_sync
+        importlib.reload(memory_sync)
+        self.sync = memory_sync
+        self.tmpdir = tempfile.mkdtemp()
+        self.roots = {}
+        for side in ("a", "b"):
+            claude = os.path.join(self.tmpdir, side)
+            os.makedirs(os.path.join(claude, "memory"))
+            os.makedirs(os.path.join(claude, "memories", "decision"))
+            self.roots[side] = claude
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _root(self, side):
+        claude = self.roots[side]
+        return self.sync.LocalRoot(claude, os.path.join(claude, "memory"), derived=False)
+
+    def _write(self, side, rel, text, mtime=None):
+        path = self._root(side).locate(rel)
+        with open(path, "w") as f:
+            f.write(text)
+        if mtime:
+            os.utime(path, (mtime, mtime))
+
+    def _read(self, side, rel):
+        with open(self._root(side).locate(rel)) as f:
+            return f.read()
+
+    def test_copies_new_files_both_ways(self):
+        self._write("a", "memory/deploy.md", "# Deploy\n")
+        self._write("b", "memories/decision/1.json", '{"content": "x"}')
+        report = self.sync.sync(self._root("a"), self._root("b"))
+        self.assertEqual(report["pushed"], ["memory/deploy.md"])
+        self.assertEqual(report["pulled"], ["memories/decision/1.json"])
+        self.assertEqual(self._read("b", "memory/deploy.md"), "# Deploy\n")
+        # Second sync has nothing to do
+        report = self.sync.sync(self._root("a"), self._root("b"))
+        self.assertEqual((report["pulled"], report["pushed"], report["bytes_out"]), ([], [], 0))
+
+    def test_transfers_only_missing_chunks(self):
+        size = self.sync.CHUNK_SIZE
+        big = "x" * size + "y" * size + "z" * size
+        self._write("a", "memory/big.md", big, mtime=1000)
+        self.sync.sync(self._root("a"), self._root("b"))
+        self._write("a", "memory/big.md", big[:size] + "Y" * size + big[2 * size:], mtime=2000)
+        report = self.sync.sync(self._root("a"), self._root("b"))
+        self.assertEqual((report["chunks_out"], report["bytes_out"]), (1, size))
+        self.assertEqual(self._read("b", "memory/big.md")[size:size + 3], "YYY")
+
+    def test_merges_index_and_coactivation(self):
+        rec = lambda ts, h: json.dumps({"timestamp": ts, "hash": h, "content": h}) + "\n"
+        self._write("a", "memories/index.jsonl", rec("2026-01-01", "a1") + rec("2026-01-03", "a3"))
+        self._write("b", "memories/index.jsonl", rec("2026-01-01", "a1") + rec("2026-01-02", "b2"))
+        pairs_a = {"x||y": {"count": 5, "first_seen": 10, "last_seen": 50}}
+        pairs_b = {"x||y": {"count": 3, "first_seen": 5, "last_seen": 60},
+                   "y||z": {"count": 1, "first_seen": 7, "last_seen": 7}}
+        self._write("a", "state/coactivation_pairs.json", json.dumps(pairs_a))
+        self._write("b", "state/coactivation_pairs.json", json.dumps(pairs_b))
+        report = self.sync.sync(self._root("a"), self._root("b"))
+        self.assertEqual(sorted(report["merged"]), ["memories/index.jsonl", "state/coactivation_pairs.json"])
+        for side in ("a", "b"):
+            hashes = [json.loads(l)["hash"] for l in self._read(side, "memories/index.jsonl").splitlines()]
+            self.assertEqual(hashes, ["a1", "b2", "a3"])
+            pairs = load_state(self._root(side).locate("state/coactivation_pairs.json"))
+            self.assertEqual(pairs["x||y"], {"count": 5, "first_seen": 5, "last_seen": 60})
+            self.assertIn("y||z", pairs)
+
+    def test_coactivation_keys_mapped_between_memory_dirs(self):
+        mem = {side: os.path.join(self.roots[side], "memory") for side in ("a", "b")}
+        repo = os.path.join(self.tmpdir, "repo", "pid.py")
+        key = lambda side, x, y: f"{os.path.join(mem[side], x)}||{os.path.join(mem[side], y)}"
+        self._write("a", "state/coactivation_pairs.json", json.dumps({
+            key("a", "kiln.md", "oven.md"): {"count": 4, "first_seen": 10, "last_seen": 40},
+            f"{repo}||{os.path.join(mem['a'], 'kiln.md')}": {"count": 1, "first_seen": 20, "last_seen": 20}}))
+        self._write("b", "state/coactivation_pairs.json", json.dumps({
+            key("b", "kiln.md", "oven.md"): {"count": 2, "first_seen": 5, "last_seen": 50}}))
+        report = self.sync.sync(self._root("a"), self._root("b"))
+        self.assertEqual(report["merged"], ["state/coactivation_pairs.json"])
+        for side in ("a", "b"):
+            pairs = load_state(self._root(side).locate("state/coactivation_pairs.json"))
+            self.assertEqual(pairs[key(side, "kiln.md", "oven.md")], {"count": 4, "first_seen": 5, "last_seen": 50})
+            self.assertIn(f"{repo}||{os.path.join(mem[side], 'kiln.md')}", pairs)
+            self.assertEqual(len(pairs), 2)
+        # Each side holds its own paths, so the next sync finds nothing to merge
+        report = self.sync.sync(self._root("a"), self._root("b"))
+        self.assertEqual((report["merged"], report["bytes_out"]), ([], 0))
+
+    def test_newer_topic_file_wins(self):
+        self._write("a", "memory/t.md", "old", mtime=1000)
+        self._write("b", "memory/t.md", "new", mtime=2000)
+        report = self.sync.sync(self._root("a"), self._root("b"))
+        self.assertEqual(report["conflicts"], [("memory/t.md", "remote")])
+        self.assertEqual(self._read("a", "memory/t.md"), "new")
+        with self.assertRaises(ValueError):
+            self._root("a").locate("memory/../../etc/passwd")
+
+    def test_pipe_transport(self):
+        # The far side is a real `memory_sync.py serve` process with its own HOME, as over ssh
+        home = os.path.join(self.tmpdir, "home")
+        far_memory = os.path.join(home, ".claude", "projects", "C--Users-yourname", "memory")
+        os.makedirs(far_memory)
+        with open(os.path.join(far_memory, "remote.md"), "w") as f:
+            f.write("# Remote\n")
+        self._write("a", "memory/local.md", "# Local\n")
+        with patch.dict(os.environ, {"HOME": home, "USERPROFILE": home}):
+            remote = self.sync.PipeRoot([sys.executable, str(HOOKS_DIR / "memory_sync.py"), "serve"])
+            report = self.sync.sync(self._root("a"), remote)
+        self.assertEqual((report["pulled"], report["pushed"]), (["memory/remote.md"], ["memory/local.md"]))
+        with open(os.path.join(far_memory, "local.md")) as f:
+            self.assertEqual(f.read(), "# Local\n")
+        self.assertEqual(self._read("a", "memory/remote.md"), "# Remote\n")
+
+
+class TestMemoryBundle(TestCase):
+    """Tests for memory_bundle.py — packed export/import with prebuilt indexes."""
+
+    def setUp(self):
+        import importlib
+        import memory_bundle
+        importlib.reload(memory_bundle)
+        self.mb = memory_bundle
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, "src")
+        self.src_memory = os.path.join(self.src, "memory")
+        os.makedirs(os.path.join(self.src, "memories", "decision"))
+        os.makedirs(self.src_memory)
+        with open(os.path.join(self.src_memory, "MEMORY.md"), "w") as f:
+            f.write("- [Kiln](kiln.md) — kiln notes\n")
+        with open(os.path.join(self.src_memory, "kiln.md"), "w") as f:
+            f.write("---\nname: Kiln\ndescription: PID tuning\ntype: project\n---\n# Kiln\n\nThermocouple wiring. " * 20)
+        with open(os.path.join(self.src, "memories", "decision", "1.json"), "w") as f:
+            f.write('{"content": "use PID"}')
+        self.dst = os.path.join(self.tmpdir, "dst")
+        self.dst_memory = os.path.join(self.dst, "memory")
+        self.bundle = os.path.join(self.tmpdir, "memory.bundle")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _builder(self, claude_dir, memory_dir):
+        import importlib
+        import memory_index_builder
+        importlib.reload(memory_index_builder)
+        memory_index_builder.MEMORY_DIR = memory_dir
+        memory_index_builder.COMPILED_INDEX = os.path.join(claude_dir, "memory_index.json")
+        memory_index_builder.BUILDER_STATE = os.path.join(claude_dir, "memory_index_state.json")
+        memory_index_builder.MEMORY_PRIORS = os.path.join(claude_dir, "memory_priors.json")
+        return memory_index_builder
+
+    def test_round_trip_is_ready_to_query(self):
+        self._builder(self.src, self.src_memory).build_index()
+        header = self.mb.export_bundle(self.bundle, self.src, self.src_memory)
+        paths = [m["path"] for m in header["members"]]
+        self.assertIn("memory/kiln.md", paths)
+        self.assertIn("memories/decision/1.json", paths)
+        self.assertIn("index/memory_index_state.json", paths)
+
+        stats = self.mb.import_bundle(self.bundle, self.dst, self.dst_memory)
+        self.assertEqual(stats["files"], len(paths))
+        with open(os.path.join(self.dst_memory, "kiln.md")) as f1, open(os.path.join(self.src_memory, "kiln.md")) as f2:
+            self.assertEqual(f1.read(), f2.read())
+        # Builder state matches the unpacked files — no topic file is re-read
+        mib = self._builder(self.dst, self.dst_memory)
+        self.assertEqual(mib.build_index(), 0)
+        self.assertIn("kiln.md", mib.load_compiled(os.path.join(self.dst, "memory_index.json")))
+
+    def test_coactivation_paths_rebased_to_new_memory_dir(self):
+        import coactivation_graph as cg
+        kiln, oven = os.path.join(self.src_memory, "kiln.md"), os.path.join(self.src_memory, "oven.md")
+        repo = os.path.join(self.tmpdir, "repo", "pid.py")
+        pairs = {f"{kiln}||{oven}": {"count": 3}, f"{repo}||{kiln}": {"count": 2}}
+        cg.state_codec.save(os.path.join(self.src, "coactivation_pairs.json"), pairs)
+        cg.update_graph(pairs, None, os.path.join(self.src, "coactivation_graph.json"), self.src_memory)
+
+        self.mb.export_bundle(self.bundle, self.src, self.src_memory)
+        self.mb.import_bundle(self.bundle, self.dst, self.dst_memory)
+        new_kiln, new_oven = os.path.join(self.dst_memory, "kiln.md"), os.path.join(self.dst_memory, "oven.md")
+        graph = cg.load_graph(os.path.join(self.dst, "coactivation_graph.json"))
+        self.assertEqual(graph["nodes"], [new_kiln, new_oven])
+        self.assertIn(new_oven, cg.spread_boosts(graph, [new_kiln]))
+        imported = cg.state_codec.load(os.path.join(self.dst, "coactivation_pairs.json"))
+        # Repo files are outside the memory dir and keep their paths
+        self.assertEqual(set(imported), {f"{new_kiln}||{new_oven}", f"{repo}||{new_kiln}"})
+
+    def test_versioned_header(self):
+        self.mb.export_bundle(self.bundle, self.src, self.src_memory)
+        with open(self.bundle, "rb") as f:
+            magic, version, _ = self.mb._PREFIX.unpack(f.read(self.mb._PREFIX.size))
+        self.assertEqual((magic, version), (self.mb.MAGIC, self.mb.BUNDLE_VERSION))
+        # A newer format is refused rather than misread
+        with open(self.bundle, "r+b") as f:
+            f.seek(8)
+            f.write((self.mb.BUNDLE_VERSION + 1).to_bytes(2, "big"))
+        with self.assertRaises(self.mb.BundleError):
+            self.mb.Bundle(self.bundle)
+
+    def test_corruption_detected(self):
+        header = self.mb.export_bundle(self.bundle, self.src, self.src_memory)
+        with open(self.bundle, "r+b") as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b"XYZ")
+        with self.assertRaises(self.mb.BundleError):
+            self.mb.import_bundle(self.bundle, self.dst, self.dst_memory)
+        self.assertTrue(header["members"])
+
+    def test_rejects_path_traversal(self):
+        with self.assertRaises(self.mb.BundleError):
+            self.mb.locate("memories/../../etc/passwd", self.dst, self.dst_memory)
+        with self.assertRaises(self.mb.BundleError):
+            self.mb.locate("index/evil.json", self.dst, self.dst_memory)
+
+
+class TestHookReplay(TestCase):
+    """Tests for hook_recorder.py + hook_replay.py — record and replay hook inputs."""
+
+    def setUp(self):
+        import importlib
+        import hook_recorder
+        import hook_replay
+        importlib.reload(hook_recorder)
+        importlib.reload(hook_replay)
+        self.tmpdir = tempfile.mkdtemp()
+        self.home = os.path.join(self.tmpdir, "home")
+        claude = os.path.join(self.home, ".claude")
+        memory_dir = os.path.join(claude, "projects", "C--Users-yourname", "memory")
+        os.makedirs(memory_dir)
+        with open(os.path.join(memory_dir, "MEMORY.md"), "w") as f:
+            f.write("**Deploy Runbook** | Active | deploy rollback worker release | [deploy-runbook.md](deploy-runbook.md)\n")
+        with open(os.path.join(memory_dir, "deploy-runbook.md"), "w") as f:
+            f.write("# Deploy Runbook\n\nRoll back the worker with `make rollback`.")
+        hook_recorder.CLAUDE_DIR = claude
+        hook_recorder.MEMORY_DIR = memory_dir
+        hook_recorder.RECORDINGS_DIR = os.path.join(claude, "recordings")
+        hook_recorder.ENABLED_MARKER = os.path.join(claude, "recordings", ".enabled")
+        self.rec, self.replay = hook_recorder, hook_replay
+        self.transcript = os.path.join(self.tmpdir, "transcript.jsonl")
+        with open(self.transcript, "w") as f:
+            f.write(json.dumps({"message": {"role": "user", "content": "hi"}}) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _record_session(self):
+        with patch.dict(os.environ, {"CLAUDE_MEMORY_RECORD": "1"}):
+            self.rec.record("memory_search", {"session_id": "s1", "prompt": "how do I rollback the deploy worker"})
+            self.rec.record("stop_hook", {"session_id": "s1", "transcript_path": self.transcript})
+        return self.rec.session_dir("s1")
+
+    def test_disabled_by_default(self):
+        with patch.dict(os.environ, {"CLAUDE_MEMORY_RECORD": ""}):
+            self.rec.record("memory_search", {"session_id": "s1", "prompt": "x"})
+        self.assertFalse(os.path.exists(self.rec.RECORDINGS_DIR))
+
+    def test_records_payloads_snapshot_and_transcript(self):
+        rec_dir = self._record_session()
+        events = self.replay.load_events(rec_dir)
+        self.assertEqual([e["hook"] for e in events], ["memory_search", "stop_hook"])
+        self.assertIsNone(events[0]["transcript"])
+        self.assertTrue(os.path.exists(os.path.join(rec_dir, events[1]["transcript"])))
+        snap_md = os.path.join(rec_dir, "snapshot", ".claude", "projects", "C--Users-yourname", "memory", "MEMORY.md")
+        self.assertTrue(os.path.exists(snap_md))
+        # The replayed stop_hook reads the recorded transcript copy, not the live one
+        self.assertEqual(self.replay.replay_payload(events[1], rec_dir)["transcript_path"],
+                         os.path.join(rec_dir, events[1]["transcript"]))
+
+    def test_subprocess_replay_reports_latency_and_injections(self):
+        rec_dir = self._record_session()
+        result = self.replay.replay(rec_dir)
+        self.assertEqual(len(result["latency"]["memory_search"]), 1)
+        self.assertEqual(result["injections"][0]["injected"], ["Memory:Deploy Runbook"])
+        self.assertIn("memory_search", self.replay.latency_summary(result["latency"]))
+
+    def test_in_process_diff_against_other_version(self):
+        rec_dir = self._record_session()
+        other = os.path.join(self.tmpdir, "other_hooks")
+        shutil.copytree(str(HOOKS_DIR), other, ignore=shutil.ignore_patterns("__pycache__"))
+        with open(os.path.join(other, "memory_search.py")) as f:
+            src = f.read()
+        with open(os.path.join(other, "memory_search.py"), "w") as f:
+            f.write(src.replace("if s >= 4:", "if s >= 400:"))
+        import memory_search
+        base = self.replay.replay(rec_dir, str(HOOKS_DIR), in_process=True)
+        changed = self.replay.replay(rec_dir, other, in_process=True)
+        # Hook modules and HOME are restored afterwards
+        self.assertIs(sys.modules["memory_search"], memory_search)
+        self.assertNotEqual(os.environ.get("HOME"), self.home)
+        diff = self.replay.diff_runs(base, changed)
+        self.assertEqual(len(diff["injections_changed"]), 1)
+        self.assertEqual(diff["injections_changed"][0]["base"], ["Memory:Deploy Runbook"])
+        self.assertEqual(diff["injections_changed"][0]["other"], [])
+
+
+class TestHookLoadTest(TestCase):
+    """Tests for hook_loadtest.py — concurrent sessions against a temp HOME."""
+
+    def setUp(self):
+        import importlib
+        import hook_loadtest
+        importlib.reload(hook_loadtest)
+        self.lt = hook_loadtest
+
+    def test_small_run_reports(self):
+        test = self.lt.LoadTest(sessions=2, duration=1.5, post_rate=3, prompt_rate=1, stop_rate=0.7, seed=3)
+        try:
+            report = test.run()
+        finally:
+            test.cleanup()
+        self.assertGreater(report["runs"], 0)
+        self.assertEqual(report["failures"], 0)
+        self.assertIn("post_tool_use", report["latency"])
+        self.assertGreaterEqual(report["latency"]["post_tool_use"]["p99"], report["latency"]["post_tool_use"]["p50"])
+        # Appends never lose lines, whatever the interleaving
+        self.assertNotIn("file_tracking", report["lost_updates"])
+        self.assertTrue(self.lt.format_report(report).startswith("[loadtest] 2 session(s)"))
+
+    def _post(self, session, path, start, end):
+        return {"session": session, "hook": "post_tool_use", "start": start, "end": end,
+                "latency_ms": (end - start) * 1000, "code": 0, "file": path}
+
+    def test_detects_lost_updates(self):
+        test = self.lt.LoadTest(sessions=2)
+        try:
+            test.events = [self._post("s1", "/a.py", 0, 1), self._post("s2", "/b.py", 2, 3),
+                           self._post("s1", "/c.py", 4, 5)]
+            claude = os.path.join(test.home, ".claude")
+            with open(os.path.join(claude, "file_tracking.jsonl"), "w") as f:
+                f.write("{}\n{}\n{}\n")
+            # b saw a, c saw a and b: a||b >= 1, a||c >= 1, b||c >= 1 — one increment was overwritten
+            with open(os.path.join(claude, "coactivation_pairs.json"), "w") as f:
+                json.dump({"/a.py||/b.py": {"count": 1}, "/a.py||/c.py": {"count": 1}}, f)
+            with open(os.path.join(claude, "attn_state.json"), "w") as f:
+                json.dump({"scores": {"/a.py": {}, "/b.py": {}}}, f)
+            lost, counts = test.lost_updates()
+            self.assertEqual(lost, {"coactivation_counts": 1, "attn_baseline": 1, "attn_overlays": 3})
+            self.assertEqual(counts["posts"], 3)
+        finally:
+            test.cleanup()
+
+    def test_lock_wait_log(self):
+        test = self.lt.LoadTest(sessions=1)
+        try:
+            with open(test.lock_log, "w") as f:
+                f.write(json.dumps({"file": "/x/attn_state.json", "wait_ms": 4.0}) + "\nnot json\n")
+            self.assertEqual(test.lock_waits(), {"attn_state.json": [4.0]})
+            self.assertEqual(test.env["CLAUDE_MEMORY_LOCK_LOG"], test.lock_log)
+        finally:
+            test.cleanup()
+
+
+class TestStateStore(TestCase):
+    """Tests for state_store.py — locked read-modify-write with journal merge."""
+
+    def setUp(self):
+        import importlib
+        import state_store
+        importlib.reload(state_store)
+        self.store = state_store
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "pairs.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_keep_latest_newer_wins_and_expires(self):
+        now = time.time()
+        self.store.update(self.path, "keep_latest", values={"a": {"offset": 9, "ts": now}})
+        self.store.update(self.path, "keep_latest", values={"a": {"offset": 5, "ts": now - 10},
+                                                            "old": {"ts": now - 100}})
+        state = self.store.update(self.path, "keep_latest", values={"b": {"ts": now}}, max_age=50, now=now)
+        self.assertEqual(state, {"a": {"offset": 9, "ts": now}, "b": {"ts": now}})
+
+    def _hold_lock(self):
+        import fcntl
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def test_concurrent_increments_not_lost(self):
+        import threading
+
+        def worker():
+            for _ in range(25):
+                self.store.update(self.path, "counters", entries={"a||b": {"count": 1, "last_seen": time.time()}})
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.store.load(self.path)["a||b"]["count"], 150)
+
+    def test_busy_lock_journals_then_replays(self):
+        if self.store.fcntl is None:
+            self.skipTest("fcntl not available")
+        self.store.update(self.path, "counters", entries={"k": {"count": 1}})
+        fd = self._hold_lock()
+        try:
+            start = time.perf_counter()
+            view = self.store.update(self.path, "counters", timeout=0.05, entries={"k": {"count": 2}})
+            self.assertLess(time.perf_counter() - start, 1.0)
+        finally:
+            os.close(fd)
+        self.assertEqual(view["k"]["count"], 3)
+        # File untouched, but readers already see the journaled update
+        self.assertEqual(load_state(self.path)["k"]["count"], 1)
+        self.assertEqual(self.store.load(self.path)["k"]["count"], 3)
+        # The next writer replays the journal and clears it
+        self.store.update(self.path, "keep_first", values={"other": 1})
+        self.assertEqual(load_state(self.path)["k"]["count"], 3)
+        self.assertEqual(os.listdir(self.store.journal_dir(self.path)), [])
+
+    def test_attention_op_decays_and_max_merges(self):
+        now = time.time()
+        with open(self.path, "w") as f:
+            json.dump({"scores": {"old.md": {"score": 0.4}, "hot.md": {"score": 0.9}},
+                       "last_update": now - 3600}, f)
+        state = self.store.update(self.path, "attention", half_life=3600, now=now,
+                                  boosts={"hot.md": {"score": 0.3}, "new.md": {"score": 0.5}})
+        self.assertAlmostEqual(state["scores"]["old.md"]["score"], 0.2)
+        self.assertAlmostEqual(state["scores"]["hot.md"]["score"], 0.45)
+        self.assertEqual(state["scores"]["new.md"]["score"], 0.5)
+        self.assertEqual(state["last_update"], now)
+
+    def test_lock_wait_logged(self):
+        log = os.path.join(self.tmpdir, "waits.jsonl")
+        with patch.dict(os.environ, {"CLAUDE_MEMORY_LOCK_LOG": log}):
+            self.store.update(self.path, "keep_max", values={"f.md": 5})
+        with open(log) as f:
+            record = json.loads(f.readline())
+        self.assertEqual(record["file"], self.path)
+        self.assertIn("wait_ms", record)
+
+    def test_post_tool_use_coactivation_while_locked(self):
+        if self.store.fcntl is None:
+            self.skipTest("fcntl not available")
+        import importlib
+        import post_tool_use
+        importlib.reload(post_tool_use)
+        post_tool_use.state_store = self.store
+        post_tool_use.FILE_TRACKING = Path(self.tmpdir) / "file_tracking.jsonl"
+        post_tool_use.COACTIVATION_LOG = Path(self.path)
+        post_tool_use.coactivation_graph = None
+        now = time.time()
+        with open(post_tool_use.FILE_TRACKING, "w") as f:
+            f.write(json.dumps({"timestamp": now - 5, "file_path": "/a.py"}) + "\n")
+        self.store.LOCK_TIMEOUT = 0.05
+        fd = self._hold_lock()
+        try:
+            post_tool_use.update_coactivation("/b.py", now)
+        finally:
+            os.close(fd)
+        post_tool_use.update_coactivation("/b.py", now + 1)
+        self.assertEqual(self.store.load(self.path)["/a.py||/b.py"]["count"], 2)
+
+
+class TestStateCodec(TestCase):
+    """Tests for state_codec.py — pluggable state serialization."""
+
+    def setUp(self):
+        import importlib
+        import state_codec
+        importlib.reload(state_codec)
+        self.codec = state_codec
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "state.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_compact_roundtrip_and_legacy_json(self):
+        state = {"scores": {"a.md": {"score": 0.5, "last_access": 1.25}}, "note": "caf\u00e9"}
+        self.assertTrue(self.codec.save(self.path, state))
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        self.assertNotIn(b"\n", raw)
+        # Versioned header, then plain compact JSON
+        header = self.codec.MAGIC + bytes([self.codec.FORMAT_VERSION]) + self.codec.CODEC_JSON
+        self.assertEqual(raw[:len(header)], header)
+        self.assertEqual(json.loads(raw[len(header):]), state)
+        # Bare JSON from before the header still loads
+        with open(self.path, "wb") as f:
+            f.write(raw[len(header):])
+        self.assertEqual(self.codec.load(self.path), state)
+        # Files written by the old indented json.dump still load
+        with open(self.path, "w") as f:
+            json.dump(state, f, indent=2)
+        self.assertEqual(self.codec.load(self.path), state)
+
+    def test_sort_keys_is_deterministic(self):
+        a = self.codec.dumps({"b": {"y": 1, "x": 2}, "a": 1}, sort_keys=True)
+        b = self.codec.dumps({"a": 1, "b": {"x": 2, "y": 1}}, sort_keys=True)
+        self.assertEqual(a, b)
+
+    def test_tagged_header_versions(self):
+        future = self.codec.MAGIC + bytes([self.codec.FORMAT_VERSION + 1]) + b"M" + b"\x80"
+        with self.assertRaises(self.codec.CodecError):
+            self.codec.loads(future)
+        with self.assertRaises(self.codec.CodecError):
+            self.codec.loads(self.codec.MAGIC + bytes([self.codec.FORMAT_VERSION + 1]) + b"J{}")
+        self.assertEqual(self.codec.loads(self.codec.MAGIC + bytes([self.codec.FORMAT_VERSION]) + b"J[1]"), [1])
+        with open(self.path, "wb") as f:
+            f.write(future)
+        self.assertEqual(self.codec.load(self.path, {"default": True}), {"default": True})
+
+    def test_msgpack_opt_in(self):
+        if self.codec.msgpack is None:
+            self.skipTest("msgpack not installed")
+        with patch.dict(os.environ, {"CLAUDE_MEMORY_STATE_FORMAT": "msgpack"}):
+            self.assertEqual(self.codec.backend(), "msgpack")
+            self.codec.save(self.path, {"h": 1.5})
+        with open(self.path, "rb") as f:
+            self.assertTrue(f.read().startswith(self.codec.MAGIC))
+        self.assertEqual(self.codec.load(self.path), {"h": 1.5})
+
+    def test_state_store_writes_through_codec(self):
+        import importlib
+        import state_store
+        importlib.reload(state_store)
+        state_store.update(self.path, "keep_max", values={"f.md": 2})
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), self.codec.dumps({"f.md": 2}))
+
+
+class TestWriteBehind(TestCase):
+    """Tests for write_behind.py — deferred hook writes."""
+
+    def setUp(self):
+        import importlib
+        import write_behind
+        importlib.reload(write_behind)
+        self.wb = write_behind
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, "write_behind")
+        write_behind.WRITE_BEHIND_DIR = self.root
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _batch(self):
+        batch = self.wb.Batch()
+        target = os.path.join(self.tmpdir, "out.txt")
+        batch.write_text(target, "a")
+        batch.append_text(target, "b")
+        batch.update(os.path.join(self.tmpdir, "log.json"), "keep_max", values={"f.md": 3})
+        batch.call("os", "makedirs", name=os.path.join(self.tmpdir, "made"))
+        batch.remove(os.path.join(self.tmpdir, "missing"))
+        return batch, target
+
+    def test_inline_outside_hook_scripts(self):
+        batch, target = self._batch()
+        self.assertFalse(self.wb.enabled())
+        self.assertEqual(batch.finish(), "inline")
+        with open(target) as f:
+            self.assertEqual(f.read(), "ab")
+        self.assertEqual(load_state(os.path.join(self.tmpdir, "log.json")), {"f.md": 3})
+        self.assertTrue(os.path.isdir(os.path.join(self.tmpdir, "made")))
+
+    def test_spooled_batch_drained(self):
+        batch, target = self._batch()
+        with patch.object(self.wb.subprocess, "Popen") as popen:
+            self.assertTrue(batch._spool(batch.ops))
+        self.assertIn("drain", popen.call_args[0][0])
+        self.assertEqual(self.wb.pending(self.root), (0, 1))
+        self.assertEqual(self.wb.drain(self.root), 1)
+        self.assertEqual(self.wb.pending(self.root), (0, 0))
+        with open(target) as f:
+            self.assertEqual(f.read(), "ab")
+
+    def test_stale_inflight_marker_ignored(self):
+        inflight = os.path.join(self.root, "inflight")
+        os.makedirs(inflight)
+        marker = os.path.join(inflight, "dead")
+        open(marker, "w").close()
+        self.assertFalse(self.wb.wait_idle(self.root, timeout=0.05))
+        os.utime(marker, (time.time() - 2 * self.wb.STALE_AFTER,) * 2)
+        self.assertTrue(self.wb.wait_idle(self.root, timeout=0.05))
+
+    def test_memory_search_output_before_writes(self):
+        import subprocess
+        home = os.path.join(self.tmpdir, "home")
+        memory_dir = os.path.join(home, ".claude", "projects", "C--Users-yourname", "memory")
+        os.makedirs(memory_dir)
+        with open(os.path.join(memory_dir, "MEMORY.md"), "w") as f:
+            f.write("**Deploy Runbook** | Active | deploy rollback worker | [deploy-runbook.md](deploy-runbook.md)\n")
+        with open(os.path.join(memory_dir, "deploy-runbook.md"), "w") as f:
+            f.write("# Deploy Runbook\n\nRoll back the worker with `make rollback`.")
+        env = dict(os.environ, HOME=home, USERPROFILE=home)
+        env.pop("MEMORY_SERVER_URL", None)
+        proc = subprocess.run([sys.executable, str(HOOKS_DIR / "memory_search.py")],
+                              input=json.dumps({"session_id": "s1", "prompt": "rollback the deploy worker"}).encode(),
+                              capture_output=True, env=env, timeout=30)
+        self.assertIn(b"[Memory: Deploy Runbook", proc.stdout)
+        self.assertTrue(self.wb.wait_idle(os.path.join(home, ".claude", "write_behind")))
+        with open(os.path.join(home, ".claude", "memory_search_result.txt")) as f:
+            self.assertIn("Deploy Runbook", f.read())
+        self.assertIn("deploy-runbook.md", load_state(os.path.join(home, ".claude", "memory_access_log.json")))
+
+
+class TestCliUtil(TestCase):
+    """Tests for cli_util.py — option parsing and percentiles for the CLIs."""
+
+    def test_percentile_and_flag(self):
+        import cli_util
+        self.assertEqual(cli_util.percentile([], 95), 0.0)
+        self.assertEqual(cli_util.percentile([5, 1, 3, 2, 4], 50), 3)
+        args = ["sync", "--pipe", "ssh box", "/root", "--top"]
+        self.assertEqual(cli_util.flag(args, "--pipe"), "ssh box")
+        self.assertEqual(args, ["sync", "/root", "--top"])
+        self.assertEqual(cli_util.flag(args, "--top", 20, int), 20)
+        self.assertEqual(cli_util.flag(["--seed", "7"], "--seed", 1, int), 7)
+
+
+class TestHookMetrics(TestCase):
+    """Tests for hook_metrics.py — per-run telemetry and the stats report."""
+
+    def setUp(self):
+        import importlib
+        import hook_metrics
+        importlib.reload(hook_metrics)
+        self.hm = hook_metrics
+        self.tmpdir = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmpdir, "metrics", "hooks.jsonl")
+        hook_metrics.METRICS_LOG = self.log
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_inactive_outside_hook_scripts(self):
+        self.assertFalse(self.hm.enabled("memory_search"))
+        self.hm.start("memory_search")
+        self.hm.mark("injected")
+        self.hm.add_bytes(10)
+        self.assertIsNone(self.hm._run)
+
+    def test_log_rotates_and_keeps_bounded_history(self):
+        self.hm.MAX_LOG_BYTES = 200
+        for i in range(40):
+            self.hm.write_record({"ts": i, "hook": "post_tool_use", "ms": float(i), "pad": "x" * 40})
+        names = sorted(os.listdir(os.path.dirname(self.log)))
+        self.assertEqual(names, ["hooks.1.jsonl", "hooks.2.jsonl", "hooks.3.jsonl", "hooks.jsonl"])
+        records = self.hm.load_records(self.log)
+        self.assertEqual([r["ts"] for r in records], list(range(40 - len(records), 40)))
+
+    def test_stats_latency_budget_and_growth(self):
+        records = [{"ts": 1000.0 + i * 8640, "hook": "memory_search", "ms": float(i * 100), "exit": "injected",
+                    "bytes": 100, "cache": {"minify": [1, 1]}, "state": {"attn_state.json": 1000 + i * 100}}
+                   for i in range(11)]
+        s = self.hm.stats(records)
+        h = s["hooks"]["memory_search"]
+        self.assertEqual((h["n"], h["p50"], h["p99"], h["timeout"]), (11, 500.0, 1000.0, 5))
+        self.assertAlmostEqual(h["budget_p95"], 0.2)
+        self.assertEqual(h["cache"], {"minify": [11, 11]})
+        growth = s["state"]["attn_state.json"]
+        self.assertEqual((growth["first"], growth["last"]), (1000, 2000))
+        self.assertAlmostEqual(growth["per_day"], 1000.0)
+        self.assertIn("memory_search", self.hm.format_stats(s))
+
+    def test_hook_run_appends_record(self):
+        import subprocess
+        home = os.path.join(self.tmpdir, "home")
+        memory_dir = os.path.join(home, ".claude", "projects", "C--Users-yourname", "memory")
+        os.makedirs(memory_dir)
+        with open(os.path.join(memory_dir, "MEMORY.md"), "w") as f:
+            f.write("**Deploy Runbook** | Active | deploy rollback worker | [deploy-runbook.md](deploy-runbook.md)\n")
+        with open(os.path.join(memory_dir, "deploy-runbook.md"), "w") as f:
+            f.write("# Deploy Runbook\n\nRoll back the worker with `make rollback`.")
+        env = dict(os.environ, HOME=home, USERPROFILE=home)
+        env.pop("MEMORY_SERVER_URL", None)
+        env.pop("CLAUDE_MEMORY_METRICS", None)
+        for prompt in ("rollback the deploy worker", "hi"):
+            proc = subprocess.run([sys.executable, str(HOOKS_DIR / "memory_search.py")],
+                                  input=json.dumps({"session_id": "s1", "prompt": prompt}).encode(),
+                                  capture_output=True, env=env, timeout=30)
+        records = self.hm.load_records(os.path.join(home, ".claude", "metrics", "hooks.jsonl"))
+        self.assertEqual([r["exit"] for r in records], ["injected", "short_prompt"])
+        first = records[0]
+        self.assertEqual((first["hook"], first["event"]), ("memory_search", "UserPromptSubmit"))
+        self.assertGreater(first["bytes"], 0)
+        self.assertEqual(records[1]["bytes"], len(proc.stdout))
+        self.assertGreater(first["ms"], 0)
+
+
+class TestHookProfile(TestCase):
+    """Tests for hook_profile.py — opt-in per-run profiles and the merge report."""
+
+    def setUp(self):
+        import importlib
+        import hook_profile
+        importlib.reload(hook_profile)
+        self.hp = hook_profile
+        self.tmpdir = tempfile.mkdtemp()
+        hook_profile.PROFILES_DIR = self.tmpdir
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, lines):
+        with open(os.path.join(self.tmpdir, name), "w") as f:
+            f.write("".join(f"{k} {n}\n" for k, n in lines))
+
+    def test_off_unless_requested(self):
+        with patch.dict(os.environ, {"CLAUDE_MEMORY_PROFILE": ""}):
+            self.assertIsNone(self.hp.mode())
+            self.hp.start("stop_hook")
+        self.assertIsNone(self.hp._active)
+        with patch.dict(os.environ, {"CLAUDE_MEMORY_PROFILE": "1"}):
+            self.assertEqual(self.hp.mode(), "cprofile")
+
+    def test_sampler_records_python_stacks(self):
+        import signal
+        if not hasattr(signal, "setitimer"):
+            self.skipTest("SIGPROF sampler needs POSIX")
+        sampler = self.hp.Sampler(0.001)
+        sampler.start()
+        try:
+            deadline = time.process_time() + 0.2
+            while time.process_time() < deadline and not sampler.stacks:
+                sum(i * i for i in range(1000))
+        finally:
+            sampler.stop()
+        self.assertTrue(any("test_hooks:test_sampler_records_python_stacks" in k for k in sampler.stacks))
+
+    def test_merge_and_focus_split(self):
+        self._write("stop_hook-00000000000000000001-1.stacks", [
+            ("stop_hook:main;stop_hook:_run;stop_hook:score_category;re:findall", 6),
+            ("stop_hook:main;stop_hook:_run;json:loads", 2)])
+        self._write("stop_hook-00000000000000000002-2.stacks", [
+            ("stop_hook:main;stop_hook:_run;stop_hook:score_category;re:findall", 2)])
+        self._write("memory_search-00000000000000000003-3.stacks", [("memory_search:main", 5)])
+        stacks = self.hp.load_stacks(self.hp.captures("stop_hook"))
+        self.assertEqual(sum(stacks.values()), 10)
+        own, cumulative, split = self.hp.stack_report(stacks, focus="stop_hook._run")
+        self.assertEqual(own[0], ("re:findall", 8))
+        self.assertEqual(dict(cumulative)["stop_hook:_run"], 10)
+        self.assertEqual(split, [("stop_hook:score_category", 8), ("json:loads", 2)])
+        self.assertIn("80.0%", self.hp.format_stack_report(stacks, focus="stop_hook._run"))
+
+    def test_prune_keeps_newest(self):
+        for i in range(5):
+            self._write(f"post_tool_use-{i:020d}-{i}.stacks", [("post_tool_use:main", 1)])
+        self.hp.prune(self.tmpdir, keep=2)
+        self.assertEqual([os.path.basename(p)[-10:] for p in self.hp.captures()], ["3-3.stacks", "4-4.stacks"])
+
+    def test_hook_run_writes_cprofile_capture(self):
+        import subprocess
+        home = os.path.join(self.tmpdir, "home")
+        os.makedirs(home)
+        env = dict(os.environ, HOME=home, USERPROFILE=home, CLAUDE_MEMORY_PROFILE="cprofile")
+        subprocess.run([sys.executable, str(HOOKS_DIR / "post_tool_use.py")],
+                       input=json.dumps({"tool_name": "Read", "tool_input": {"file_path": "/x.py"}}).encode(),
+                       capture_output=True, env=env, timeout=30)
+        paths = self.hp.captures("post_tool_use", os.path.join(home, ".claude", "profiles"))
+        self.assertEqual(len(paths), 1)
+        self.assertTrue(paths[0].endswith(".prof"))
+        self.assertIn("update_attention", self.hp.format_pstats_report(paths, focus="post_tool_use.main"))
+
+
+class TestTranscriptTail(TestCase):
+    """Tests for transcript_tail.py — reverse-seek JSONL tail reader."""
+
+    def setUp(self):
+        import importlib
+        import transcript_tail
+        importlib.reload(transcript_tail)
+        self.tt = transcript_tail
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "t.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _full_parse(self):
+        entries = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
+    def test_matches_full_parse_for_any_block_size(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            for i in range(50):
+                f.write(json.dumps({"i": i, "text": "é" * (i % 7) + "x" * (i * 3)}) + "\n")
+                if i % 9 == 0:
+                    f.write("\n{not json\n")
+            f.write('{"i": "partial"')  # half-written last line
+        full = self._full_parse()
+        for block_size in (1, 7, 64, 4096):
+            for n in (1, 5, 30, 100):
+                self.assertEqual(self.tt.read_tail(self.path, n, block_size), full[-n:], (block_size, n))
+
+    def test_reads_only_the_end(self):
+        line = json.dumps({"pad": "x" * 1000}) + "\n"
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(line * 5000)
+        reads = []
+
+        class Tracked:
+            def __init__(self, f):
+                self.f = f
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self.f.close()
+
+            def seek(self, *args):
+                return self.f.seek(*args)
+
+            def read(self, size):
+                reads.append(size)
+                return self.f.read(size)
+
+        with patch.object(self.tt, "open", create=True, new=lambda *a, **k: Tracked(open(*a, **k))):
+            tail = self.tt.read_tail(self.path, 3, block_size=4096)
+        self.assertEqual(tail, [{"pad": "x" * 1000}] * 3)
+        self.assertEqual(reads, [4096])
+
+    def test_byte_range_and_line_end(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            for i in range(10):
+                f.write(json.dumps({"i": i}) + "\n")
+            offset = f.tell()
+            for i in range(10, 13):
+                f.write(json.dumps({"i": i}) + "\n")
+            f.write('{"i": 13')
+        end = self.tt.line_end(self.path, block_size=5)
+        self.assertEqual(end, os.path.getsize(self.path) - len('{"i": 13'))
+        self.assertEqual(self.tt.read_tail(self.path, 10, 4, start=offset, end=end), [{"i": 10}, {"i": 11}, {"i": 12}])
+        self.assertEqual(self.tt.read_tail(self.path, 2, end=offset), [{"i": 8}, {"i": 9}])
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("}")  # last line complete, newline not written yet
+        self.assertEqual(self.tt.line_end(self.path), os.path.getsize(self.path))
+        self.assertEqual(self.tt.fingerprint(self.path, offset), self.tt.fingerprint(self.path, offset))
+        self.assertNotEqual(self.tt.fingerprint(self.path, offset), self.tt.fingerprint(self.path, end))
+
+    def test_missing_or_empty(self):
+        self.assertEqual(self.tt.read_tail(os.path.join(self.tmpdir, "none.jsonl"), 5), [])
+        open(self.path, "w").close()
+        self.assertEqual(self.tt.read_tail(self.path, 5), [])
+        self.assertEqual(self.tt.read_tail(self.path, 0), [])
+
+
+class TestSignalScan(TestCase):
+    """Tests for signal_scan.py — one scan serving every category's score and snippet."""
+
+    def setUp(self):
+        import importlib
+        import signal_scan
+        import stop_hook
+        importlib.reload(signal_scan)
+        self.ss = signal_scan
+        self.sh = stop_hook
+
+    def _assert_same(self, text, table=None):
+        table = table or self.sh.CATEGORY_SIGNALS
+        scan = self.ss.SignalScanner(table).scan(text)
+        self.assertIsNotNone(scan)
+        for cat, signals in table.items():
+            self.assertEqual(self.sh.score_category(text, cat, signals, scan),
+                             self.sh.score_category(text, cat, signals), (cat, text))
+            for max_chars in (800, 60):
+                self.assertEqual(self.sh.extract_relevant_snippet(text, cat, signals, max_chars, scan=scan),
+                                 self.sh.extract_relevant_snippet(text, cat, signals, max_chars), (cat, text))
+
+    def test_matches_per_category_code(self):
+        import random
+        rnd = random.Random(7)
+        words = ["the", "code", "it", "we", "Fixed", "OVER", "TODO", "fixfixed", "overover",
+                 "decided to use", "the fix was", "don't use", "i like ", "come back to", "never"]
+        for signals in self.sh.CATEGORY_SIGNALS.values():
+            words += signals["keywords"]
+        for _ in range(200):
+            text = "".join(rnd.choice(words) + rnd.choice(["", " ", ".  ", "\n", "\n\n", "! "])
+                           for _ in range(rnd.randint(0, 60)))
+            self._assert_same(text)
+
+    def test_match_across_sentence_boundary(self):
+        # "don't\n\navoid" crosses into the next sentence, hiding its own "avoid caching"
+        text = "We don't\n\navoid caching here. We never\n\nchanged it."
+        self._assert_same(text)
+        scan = self.ss.SignalScanner(self.sh.CATEGORY_SIGNALS).scan(text)
+        self.assertIn("avoid caching here.", scan.snippet("constraint"))
+
+    def test_overlapping_and_duplicate_signals(self):
+        table = {"c": {"keywords": ["aa", "aa", "a a"], "patterns": [r"a\s*a", r"a+"], "min_score": 1},
+                 "d": {"keywords": ["aa"], "patterns": [r"a+"], "min_score": 1}}
+        for text in ("aaaa a. aa", "a\n\na aaa", "aaa. a", ""):
+            self._assert_same(text, table)
+
+    def test_falls_back_when_not_exact(self):
+        scanner = self.ss.SignalScanner(self.sh.CATEGORY_SIGNALS)
+        self.assertIsNone(scanner.scan("İstanbul: we decided to use it because it works."))
+        self.assertIsNone(self.ss.SignalScanner({"c": {"keywords": [], "patterns": [r"\bfix"]}}).scan("fix"))
+        self.assertIsNone(self.ss.SignalScanner({"c": {"keywords": [], "patterns": [r"x*"]}}).scan("abc"))
+
+    def test_snippet_budget_breaks_at_first_overflow(self):
+        table = {"c": {"keywords": ["fix"], "patterns": [r"here\s+is"], "min_score": 1}}
+        # Ties keep text order; "Fix one." would fit but ranks after one that does not
+        text = "Fix one. " + "The fix here is long. " * 3 + "Fix two. fix three."
+        for np in (self.ss.np, None):
+            with patch.object(self.ss, "np", np):
+                scan = self.ss.SignalScanner(table).scan(text)
+                self.assertEqual(scan.snippet("c", 40), "The fix here is long.")
+                self.assertEqual(scan.snippet("c", 10), "")
+                self.assertEqual(scan.snippet("c", 200), self.sh.extract_relevant_snippet(text, "c", table["c"], 200))
+
+    def test_numpy_scores_match_plain_sums(self):
+        if self.ss.np is None:
+            self.skipTest("numpy not installed")
+        text = "We decided to use X over Y because it works. The fix was simple.\nTODO: revisit later! Never do that."
+        matrix = self.ss.SignalScanner(self.sh.CATEGORY_SIGNALS).scan(text).sentence_scores()
+        with patch.object(self.ss, "np", None):
+            scanner = self.ss.SignalScanner(self.sh.CATEGORY_SIGNALS)
+            plain = scanner.scan(text).sentence_scores()
+        self.assertEqual(matrix.shape, (4, len(self.sh.CATEGORY_SIGNALS)))
+        self.assertEqual(matrix.T.tolist(), plain)
+
+    def test_automaton_keywords_match_find(self):
+        if self.ss.ahocorasick is None:
+            self.skipTest("pyahocorasick not installed")
+        scanner = self.ss.SignalScanner(self.sh.CATEGORY_SIGNALS)
+        text = "the fix was a workaround; fixed it, todo: fix fixfix. " * 5
+        found = scanner.keyword_hits(text)
+        scanner.automaton = None
+        self.assertEqual(found, scanner.keyword_hits(text))
+
+
 class TestStopHook(TestCase):
     """Tests for stop_hook.py — 6-category taxonomy + dedup."""
 
@@ -175,8 +2426,14 @@ class TestStopHook(TestCase):
         stop_hook.HASH_FILE = self.hash_file
         stop_hook.PATTERN_FILE = self.pattern_file
         stop_hook.FILE_TRACKING = self.tracking_file
+        stop_hook.CURSOR_FILE = Path(self.tmpdir) / "transcript_cursors.json"
         return stop_hook
 
+    def _append_turn(self, path, n, start=0):
+        with open(path, "a", encoding="utf-8") as f:
+            for i in range(start, start + n):
+                f.write(json.dumps({"type": "user", "message": {"role": "user", "content": f"turn {i}"}}) + "\n")
+
     def test_content_hash_deterministic(self):
         sh = self._import_stop()
         h1 = sh.content_hash("Hello World")
@@ -299,6 +2556,69 @@ class TestStopHook(TestCase):
         snippet = sh.extract_relevant_snippet(text, "decision", signals)
         self.assertIn("decided", snippet.lower())
 
+    def _texts(self, entries):
+        return [e["message"]["content"] for e in entries]
+
+    def test_cursor_limits_analysis_to_new_entries(self):
+        sh = self._import_stop()
+        transcript = os.path.join(self.tmpdir, "t.jsonl")
+        self._append_turn(transcript, 50)
+        entries, new, cursor = sh.extract_new_entries(transcript, None)
+        self.assertEqual((new, cursor["entries"]), (30, 30))
+        self.assertEqual(self._texts(entries)[0], "turn 20")
+        self._append_turn(transcript, 3, start=50)
+        entries, new, cursor = sh.extract_new_entries(transcript, cursor)
+        self.assertEqual(new, 3)
+        self.assertEqual(self._texts(entries), [f"turn {i}" for i in range(46, 53)])
+        self.assertEqual(cursor["offset"], os.path.getsize(transcript))
+        self.assertEqual(sh.extract_new_entries(transcript, cursor)[:2], ([], 0))
+
+    def test_summary_covers_transcript_tail_not_just_turn(self):
+        sh = self._import_stop()
+        transcript = os.path.join(self.tmpdir, "t.jsonl")
+        self._append_turn(transcript, 50)
+        payload = json.dumps({"session_id": "s1", "transcript_path": transcript, "stop_reason": "end_turn"})
+        summarized = []
+        for start, n in ((0, 0), (50, 3)):
+            self._append_turn(transcript, n, start=start)
+            with patch("sys.stdin", StringIO(payload)), \
+                    patch.object(sh, "build_session_summary", side_effect=lambda e, f: summarized.append(e) or ""):
+                with self.assertRaises(SystemExit):
+                    sh._run()
+        # Second Stop analyzed 3 new entries, but summarized the last 30
+        self.assertEqual([len(e) for e in summarized], [30, 30])
+        self.assertEqual(self._texts(summarized[1])[0], "turn 23")
+        self.assertEqual(self._texts(summarized[1])[-1], "turn 52")
+
+    def test_rewritten_transcript_resets_cursor(self):
+        sh = self._import_stop()
+        transcript = os.path.join(self.tmpdir, "t.jsonl")
+        self._append_turn(transcript, 5)
+        _, _, cursor = sh.extract_new_entries(transcript, None)
+        os.remove(transcript)
+        self._append_turn(transcript, 8, start=100)
+        entries, new, _ = sh.extract_new_entries(transcript, cursor)
+        self.assertEqual(new, 8)
+        self.assertEqual(self._texts(entries)[0], "turn 100")
+
+    def test_second_stop_without_new_turn_saves_nothing(self):
+        sh = self._import_stop()
+        transcript = os.path.join(self.tmpdir, "t.jsonl")
+        with open(transcript, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "assistant", "message": {"role": "assistant", "content": (
+                "We decided to use PostgreSQL instead of MySQL because the rationale is better JSON support "
+                "and the trade-off is acceptable for this architecture.")}}) + "\n")
+        payload = json.dumps({"session_id": "s1", "transcript_path": transcript, "stop_reason": "end_turn"})
+        saved = []
+        for _ in range(2):
+            with patch("sys.stdin", StringIO(payload)), \
+                    patch.object(sh, "save_memory", side_effect=lambda cat, *a: saved.append(cat)):
+                with self.assertRaises(SystemExit):
+                    sh._run()
+        self.assertIn("decision", saved)
+        self.assertEqual(len(saved), len(set(saved)))
+        self.assertEqual(load_state(sh.CURSOR_FILE)["s1"]["offset"], os.path.getsize(transcript))
+
 
 class TestPostToolUse(TestCase):
     """Tests for post_tool_use.py — file tracking + attention + co-activation."""
@@ -319,13 +2639,15 @@ class TestPostToolUse(TestCase):
         post_tool_use.FILE_TRACKING = self.tracking_file
         post_tool_use.ATTN_STATE = self.attn_state_file
         post_tool_use.COACTIVATION_LOG = self.coact_file
+        post_tool_use.COACTIVATION_GRAPH = Path(self.tmpdir) / "coactivation_graph.json"
+        post_tool_use.PREFETCH_FILE = Path(self.tmpdir) / "memory_prefetch.json"
         return post_tool_use
 
     def test_update_attention_creates_hot_entry(self):
         ptu = self._import_ptu()
         now = time.time()
         ptu.update_attention("/path/to/file.py", now)
-        state = json.loads(self.attn_state_file.read_text())
+        state = load_state(self.attn_state_file)
         self.assertEqual(state["scores"]["/path/to/file.py"]["score"], 1.0)
 
     def test_coactivation_creates_pair(self):
@@ -335,7 +2657,7 @@ class TestPostToolUse(TestCase):
         with open(self.tracking_file, "w") as f:
             f.write(json.dumps({"timestamp": now - 30, "tool": "Read", "file_path": "/a.py"}) + "\n")
         ptu.update_coactivation("/b.py", now)
-        pairs = json.loads(self.coact_file.read_text())
+        pairs = load_state(self.coact_file)
         self.assertEqual(len(pairs), 1)
         key = list(pairs.keys())[0]
         self.assertEqual(pairs[key]["count"], 1)
@@ -466,11 +2788,8 @@ class TestSessionEnd(TestCase):
         files_before = list(self.session_dir.glob("session_*.json"))
         self.assertEqual(len(files_before), 25)
 
-        # Pruning should keep last 20 — call the pruning logic directly
-        session_files = sorted(self.session_dir.glob("session_*.json"))
-        if len(session_files) > 20:
-            for old_file in session_files[:-20]:
-                old_file.unlink()
+        # Pruning should keep last 20
+        se.prune_session_files()
 
         files_after = list(self.session_dir.glob("session_*.json"))
         self.assertEqual(len(files_after), 20)
@@ -491,7 +2810,7 @@ class TestAtomicWrites(TestCase):
         importlib.reload(stop_hook)
         path = Path(self.tmpdir) / "test.json"
         stop_hook.save_json_file(path, {"key": "value"})
-        data = json.loads(path.read_text())
+        data = load_state(path)
         self.assertEqual(data["key"], "value")
 
     def test_atomic_save_no_leftover_tmp(self):
@@ -555,6 +2874,8 @@ class TestIntegration(TestCase):
         post_tool_use.ATTN_STATE = attn_file
         post_tool_use.FILE_TRACKING = Path(self.tmpdir) / "tracking.jsonl"
         post_tool_use.COACTIVATION_LOG = Path(self.tmpdir) / "coact.json"
+        post_tool_use.COACTIVATION_GRAPH = Path(self.tmpdir) / "coact_graph.json"
+        post_tool_use.PREFETCH_FILE = Path(self.tmpdir) / "memory_prefetch.json"
         post_tool_use.update_attention("test-file.md", time.time())
 
         # MemorySearch reads it